@@ -1,4 +1,5 @@
-import os, pickle, json, sys, logging, subprocess
+import os, pickle, json, sys, logging, subprocess, copy, math, time, random, hashlib, datetime, shutil
+from collections import Counter
 
 def detect_gpu_vendor():
     vendors = []
@@ -55,29 +56,99 @@ if SITE_PACKAGES not in sys.path:
 # Now app.py can import torch, torchvision, torchaudio, etc.
 try:
     import torch
+    TORCH_AVAILABLE = True
     logging.info(f"Torch found! Version: {torch.__version__}")
 except ImportError:
+    TORCH_AVAILABLE = False
     logging.error("Torch not found. Make sure GPU installer ran successfully.")
 
 import numpy as np
 from sklearn.preprocessing import LabelEncoder
-from transformers import AutoTokenizer, AutoModelForSequenceClassification, Trainer, TrainingArguments, TrainerCallback
-from datasets import Dataset
+if TORCH_AVAILABLE:
+    from transformers import AutoTokenizer, AutoModelForSequenceClassification, Trainer, TrainingArguments, TrainerCallback, DataCollatorWithPadding, EarlyStoppingCallback
+    from transformers.trainer_utils import get_last_checkpoint
+    try:
+        from peft import LoraConfig, get_peft_model
+        PEFT_AVAILABLE = True
+    except ImportError:
+        PEFT_AVAILABLE = False
+    from datasets import Dataset
+else:
+    # Without torch only the TF-IDF backend is usable.
+    TrainerCallback = object
+    PEFT_AVAILABLE = False
 import ctypes
 from utils import prevent_sleep, allow_sleep
+from training_cache import TrainingCache, fingerprint, tokenizer_signature
+from metrics import REGISTRY, track_job
+
+CHECKPOINTS_DIR = "checkpoints"
 
 class CancellationCallback(TrainerCallback):
+    # Stops after the current step and checkpoints it, so the next run resumes instead of starting over.
     def __init__(self, cancel_flag_func):
         self.cancel_flag_func = cancel_flag_func
     def on_step_end(self, args, state, control, **kwargs):
         if self.cancel_flag_func():
-            control.should_early_stop = True
+            control.should_training_stop = True
             control.should_save = True
 
-# Device selection update for CUDA support:
-import torch
-import logging
+class TimeBudgetCallback(TrainerCallback):
+    """Stops training (with a checkpoint) once max_seconds of wall-clock time have been spent."""
+    def __init__(self, max_seconds):
+        self.max_seconds = max_seconds
+        self.expired = False
+        self._start = None
+    def on_train_begin(self, args, state, control, **kwargs):
+        self._start = time.perf_counter()
+    def on_step_end(self, args, state, control, **kwargs):
+        if self._start is not None and time.perf_counter() - self._start >= self.max_seconds:
+            self.expired = True
+            control.should_training_stop = True
+            control.should_save = True
 
+class ThroughputCallback(TrainerCallback):
+    """Reports training samples/sec for every epoch."""
+    def __init__(self, num_samples, report=logging.info):
+        self.num_samples = num_samples
+        self.report = report
+        self.epoch_stats = []
+        self._epoch_start = None
+    def on_epoch_begin(self, args, state, control, **kwargs):
+        self._epoch_start = time.perf_counter()
+    def on_epoch_end(self, args, state, control, **kwargs):
+        if self._epoch_start is None:
+            return
+        elapsed = time.perf_counter() - self._epoch_start
+        rate = self.num_samples / elapsed if elapsed > 0 else 0.0
+        self.epoch_stats.append({"epoch": state.epoch, "seconds": elapsed, "samples_per_sec": rate})
+        REGISTRY.inc("training_epochs_total")
+        REGISTRY.set("training_samples_per_second", rate)
+        self.report(f"Epoch {state.epoch:.0f}: {self.num_samples} samples in {elapsed:.1f}s ({rate:.1f} samples/sec)")
+
+def cpu_supports_bf16():
+    # bf16 autocast only pays off on CPUs with native bf16 instructions (AVX512-BF16 or AMX).
+    try:
+        with open("/proc/cpuinfo", "r") as f:
+            flags = f.read()
+    except OSError:
+        return False
+    return "avx512_bf16" in flags or "amx_bf16" in flags
+
+def _training_arguments(**kwargs):
+    # Some TrainingArguments names changed between transformers releases; map to what this install accepts.
+    fields = TrainingArguments.__dataclass_fields__
+    if "evaluation_strategy" in kwargs and "evaluation_strategy" not in fields:
+        kwargs["eval_strategy"] = kwargs.pop("evaluation_strategy")
+    if "group_by_length" in kwargs and "group_by_length" not in fields:
+        if kwargs.pop("group_by_length"):
+            kwargs["train_sampling_strategy"] = "group_by_length"
+    for key in [k for k in kwargs if k not in fields]:
+        logging.debug(f"TrainingArguments has no '{key}' in this transformers version; ignoring it.")
+        kwargs.pop(key)
+    return TrainingArguments(**kwargs)
+
+# Device selection update for CUDA support:
 def get_device():
     """Detects the best available device for computation (CUDA, DirectML, ROCm, or CPU)."""
     if torch.cuda.is_available():
@@ -101,7 +172,107 @@ def get_device():
     logging.info("⚠ No GPU detected. Falling back to CPU.")
     return torch.device("cpu")
 
-device = get_device()
+device = get_device() if TORCH_AVAILABLE else None
+
+BASE_MODEL = "microsoft/codebert-base"
+LABELS_FILE = "labels.json"
+TRAINING_EXAMPLES_FILE = "training_examples.json"
+ARTIFACT_MANIFEST = "artifact.json"
+ARTIFACT_FORMAT_VERSION = 1
+AI_BACKENDS = ("transformer", "tfidf")
+INFERENCE_BACKENDS = ("eager", "torchscript", "onnx")
+EXPORT_INFO_FILE = "export.json"
+EXPORT_FILES = ("model.torchscript.pt", "model.onnx", "model.int8.onnx")
+TRAINING_STRATEGIES = ("full", "head_only", "lora")
+DEFAULT_LEARNING_RATES = {"full": 5e-5, "head_only": 1e-3, "lora": 3e-4}
+
+if TORCH_AVAILABLE:
+    class _LogitsModule(torch.nn.Module):
+        # Plain (input_ids, attention_mask) -> logits signature for tracing/ONNX export.
+        def __init__(self, model):
+            super().__init__()
+            self.model = model
+        def forward(self, input_ids, attention_mask):
+            return self.model(input_ids=input_ids, attention_mask=attention_mask, return_dict=False)[0]
+
+def _extend_classifier_head(model, num_labels):
+    """Grows the classification head to num_labels outputs, keeping the rows of existing labels."""
+    parent = model.classifier
+    attr = "out_proj" if hasattr(parent, "out_proj") else None
+    head = getattr(parent, attr) if attr else parent
+    old_labels = head.out_features
+    if num_labels <= old_labels:
+        return
+    new_head = torch.nn.Linear(head.in_features, num_labels).to(head.weight.device, head.weight.dtype)
+    with torch.no_grad():
+        new_head.weight.normal_(0.0, getattr(model.config, "initializer_range", 0.02))
+        new_head.bias.zero_()
+        new_head.weight[:old_labels] = head.weight
+        new_head.bias[:old_labels] = head.bias
+    if attr:
+        setattr(parent, attr, new_head)
+    else:
+        model.classifier = new_head
+    model.config.num_labels = num_labels
+    model.num_labels = num_labels
+
+def _classifier_reads_hidden_states(model):
+    # RoBERTa-style heads (CodeBERT) take the encoder's hidden states directly, so cached features can feed them.
+    return hasattr(getattr(model, "classifier", None), "out_proj")
+
+def _file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def write_artifact_manifest(artifact_dir, **info):
+    """Records format version, metadata and a checksum of every top-level file in a model artifact."""
+    files = {}
+    for name in sorted(os.listdir(artifact_dir)):
+        path = os.path.join(artifact_dir, name)
+        if name != ARTIFACT_MANIFEST and os.path.isfile(path):
+            files[name] = _file_sha256(path)
+    manifest = {"format_version": ARTIFACT_FORMAT_VERSION,
+                "created": datetime.datetime.now().isoformat(timespec="seconds"),
+                "files": files}
+    manifest.update(info)
+    with open(os.path.join(artifact_dir, ARTIFACT_MANIFEST), "w", encoding="utf-8") as f:
+        json.dump(manifest, f, indent=4)
+    return manifest
+
+def validate_artifact(artifact_dir, verify_checksums=True):
+    """Checks a model artifact without loading the model. Returns a list of problems (empty if valid)."""
+    manifest_file = os.path.join(artifact_dir, ARTIFACT_MANIFEST)
+    if not os.path.isfile(manifest_file):
+        return [f"Missing {ARTIFACT_MANIFEST}"]
+    try:
+        with open(manifest_file, "r", encoding="utf-8") as f:
+            manifest = json.load(f)
+    except ValueError as e:
+        return [f"Unreadable {ARTIFACT_MANIFEST}: {e}"]
+    problems = []
+    if manifest.get("format_version") != ARTIFACT_FORMAT_VERSION:
+        problems.append(f"Unsupported artifact format version {manifest.get('format_version')}")
+    files = manifest.get("files", {})
+    for required in ("config.json", LABELS_FILE):
+        if required not in files:
+            problems.append(f"Manifest does not list {required}")
+    if not any(name.endswith(".safetensors") for name in files):
+        problems.append("Manifest lists no safetensors weights")
+    for name, checksum in files.items():
+        path = os.path.join(artifact_dir, name)
+        if not os.path.isfile(path):
+            problems.append(f"Missing file {name}")
+        elif verify_checksums and _file_sha256(path) != checksum:
+            problems.append(f"Checksum mismatch for {name}")
+    if not problems:
+        with open(os.path.join(artifact_dir, LABELS_FILE), "r", encoding="utf-8") as f:
+            num_labels = len(json.load(f))
+        if manifest.get("num_labels") != num_labels:
+            problems.append(f"Manifest expects {manifest.get('num_labels')} labels, {LABELS_FILE} has {num_labels}")
+    return problems
 
 def build_training_dataset(guidebook, dictionary=None):
     def recursive_collect(data, current_path, texts, labels):
@@ -121,106 +292,607 @@ def build_training_dataset(guidebook, dictionary=None):
     return texts, labels
 
 class TransformerAIModel:
-    def __init__(self):
-        # Use CodeBERT instead of DistilBert
-        self.tokenizer = AutoTokenizer.from_pretrained("microsoft/codebert-base")
+    model_dir = "transformer_model"
+
+    def __init__(self, inference_backend="eager"):
+        self._tokenizer = None
         self.model = None
         self.label_encoder = LabelEncoder()
+        self.labels = []  # Label for each classifier output id.
         self.is_trained = False
         self.device = device
         self.cancelled = False  # Added cancellation flag
-
-    def train(self, texts, labels, output_dir="transformer_model", epochs=2, progress_callback=None):
-
+        self.max_length = 256
+        # Requested backend; only switched to once an exported artifact has been loaded.
+        self.requested_backend = inference_backend
+        self.inference_backend = "eager"
+        self._runtime = None
+        self.load_time = None
+
+    @property
+    def tokenizer(self):
+        # Fetched lazily: a loaded artifact brings its own tokenizer, so the hub is only hit for training.
+        if self._tokenizer is None:
+            # Use CodeBERT instead of DistilBert
+            self._tokenizer = AutoTokenizer.from_pretrained(BASE_MODEL)
+        return self._tokenizer
+
+    def _load_previous_training(self, output_dir):
+        # Returns (labels, examples) of the model previously trained into output_dir, or None.
+        labels_file = os.path.join(output_dir, LABELS_FILE)
+        examples_file = os.path.join(output_dir, TRAINING_EXAMPLES_FILE)
+        if not (os.path.exists(labels_file) and os.path.exists(examples_file)
+                and os.path.exists(os.path.join(output_dir, "config.json"))):
+            return None
+        with open(labels_file, "r", encoding="utf-8") as f:
+            old_labels = json.load(f)
+        with open(examples_file, "r", encoding="utf-8") as f:
+            old_examples = [tuple(example) for example in json.load(f)]
+        return old_labels, old_examples
+
+    @track_job("train")
+    def train(self, texts, labels, output_dir="transformer_model", epochs=2, progress_callback=None,
+              batch_size=8, gradient_accumulation_steps=1, group_by_length=True, bf16="auto", log_callback=None,
+              mode="full", replay_ratio=1.0, cache_dir=None, time_budget_minutes=0, early_stopping_patience=3,
+              checkpoint_steps=50, resume=True, strategy="full", learning_rate=None, lora_rank=8):
+        """
+        mode="full" fine-tunes a fresh BASE_MODEL on every example. mode="incremental" warm-starts from the
+        model previously trained into output_dir: existing label ids are kept, the head grows for new labels,
+        and only new/changed examples plus replay_ratio old examples per new one are trained on.
+        With cache_dir set, the tokenized dataset is reused by later runs on the same examples and tokenizer.
+
+        Checkpoints are written every checkpoint_steps under output_dir/checkpoints/<run fingerprint>. A run
+        that was cancelled, crashed or hit time_budget_minutes resumes from its latest checkpoint when trained
+        again on the same examples. Training stops early after early_stopping_patience evaluations without
+        an eval loss improvement (0 disables), and the best checkpoint is kept.
+
+        strategy="head_only" freezes the encoder and trains only the classifier, on encoder features computed
+        once per run. strategy="lora" trains low-rank adapters (needs peft) and merges them into the weights.
+        """
         prevent_sleep()
+        report = log_callback or logging.info
 
         # Reset cancellation flag.
         self.cancelled = False
 
+        examples = list(zip(texts, labels))
+        previous = self._load_previous_training(output_dir) if mode == "incremental" else None
+        if mode == "incremental" and previous is None:
+            report("No previous model to warm-start from; running full training.")
+        # Checkpoints only resume a run over the same examples, labels and step layout. The key leaves out
+        # anything a budget-stopped run rewrites in output_dir (the saved labels and weights), so it stays
+        # the same when that run is trained again.
+        run_key = fingerprint([list(example) for example in examples], sorted(set(labels)),
+                              "incremental" if previous is not None else "full", strategy, replay_ratio,
+                              batch_size, gradient_accumulation_steps)
+        # A resumed run must see the same replay sample, eval split and batch order as its checkpoint.
+        seed = int(run_key[:8], 16)
+        if previous is not None:
+            old_labels, old_examples = previous
+            known = set(old_examples)
+            changed = [ex for ex in examples if ex not in known]
+            unchanged = [ex for ex in examples if ex in known]
+            replay = random.Random(seed).sample(unchanged, min(len(unchanged), int(math.ceil(len(changed) * replay_ratio))))
+            self.labels = old_labels + sorted(set(labels) - set(old_labels))
+            self._tokenizer = AutoTokenizer.from_pretrained(output_dir)
+            self.model = AutoModelForSequenceClassification.from_pretrained(output_dir)
+            _extend_classifier_head(self.model, len(self.labels))
+            report(f"Incremental training: {len(changed)} new/changed examples, {len(replay)} replayed, "
+                   f"{len(self.labels) - len(old_labels)} new labels.")
+            train_examples = changed + replay
+        else:
+            self.labels = sorted(set(labels))
+            # Instantiate CodeBERT for sequence classification.
+            self.model = AutoModelForSequenceClassification.from_pretrained(BASE_MODEL, num_labels=len(self.labels))
+            train_examples = examples
         self.label_encoder.fit(labels)
-        int_labels = self.label_encoder.transform(labels)
-        dataset = Dataset.from_dict({"text": texts, "label": int_labels})
-        def tokenize_function(examples):
-            return self.tokenizer(examples["text"], truncation=True, padding="max_length", max_length=256)  # increased max_length
-        tokenized_dataset = dataset.map(tokenize_function, batched=True)
-        tokenized_dataset = tokenized_dataset.train_test_split(test_size=0.1)
-        num_labels = len(self.label_encoder.classes_)
-        # Instantiate CodeBERT for sequence classification.
-        self.model = AutoModelForSequenceClassification.from_pretrained("microsoft/codebert-base", num_labels=num_labels)
+        REGISTRY.set("training_examples", len(train_examples))
+        label_ids = {label: i for i, label in enumerate(self.labels)}
+        self.model.config.id2label = {i: label for i, label in enumerate(self.labels)}
+        self.model.config.label2id = label_ids
         self.model.to(self.device)
-        training_arguments = TrainingArguments(
-            output_dir=output_dir,
+
+        if not train_examples:
+            report("No new or changed training examples; keeping the previous model.")
+            self._finish_training(output_dir, examples)
+            if progress_callback:
+                progress_callback(100)
+            allow_sleep()
+            return
+
+        if strategy == "lora" and not PEFT_AVAILABLE:
+            logging.warning("peft is not installed; LoRA training falls back to the classification head only.")
+            report("peft is not installed (see requirements.txt); training the classification head only instead of LoRA adapters.")
+            strategy = "head_only"
+        learning_rate = learning_rate or DEFAULT_LEARNING_RATES.get(strategy, 5e-5)
+        if strategy == "head_only" and _classifier_reads_hidden_states(self.model):
+            self._train_head_only(train_examples, label_ids, epochs, batch_size, learning_rate, progress_callback, report)
+            if self.cancelled:
+                report("Training cancelled; keeping the previous model.")
+                allow_sleep()
+                return
+            self._finish_training(output_dir, examples)
+            logging.info(f"Transformer AI model head trained with {len(train_examples)} examples.")
+            allow_sleep()
+            return
+        if strategy == "head_only":
+            # This head needs the full forward pass; still skip encoder gradients.
+            for param in self.model.base_model.parameters():
+                param.requires_grad = False
+        elif strategy == "lora":
+            self.model = get_peft_model(self.model, LoraConfig(task_type="SEQ_CLS", r=lora_rank, lora_alpha=2 * lora_rank,
+                                                               lora_dropout=0.1))
+        checkpoint_dir = os.path.join(output_dir, CHECKPOINTS_DIR, run_key[:16])
+        tokenized_dataset = self._tokenized_dataset(train_examples, label_ids, cache_dir, report)
+        # Tiny incremental runs are not worth holding examples back for evaluation.
+        if len(tokenized_dataset) >= 10:
+            tokenized_dataset = tokenized_dataset.train_test_split(test_size=0.1, seed=seed)
+        else:
+            tokenized_dataset = {"train": tokenized_dataset, "test": None}
+        on_cpu = getattr(self.device, "type", None) == "cpu"
+        if bf16 == "auto":
+            bf16 = on_cpu and cpu_supports_bf16()
+        throughput = ThroughputCallback(len(tokenized_dataset["train"]), report=log_callback or logging.info)
+        evaluate = tokenized_dataset["test"] is not None
+        early_stopping = evaluate and early_stopping_patience > 0
+        training_arguments = _training_arguments(
+            output_dir=checkpoint_dir,
             num_train_epochs=epochs,
-            per_device_train_batch_size=8,
-            per_device_eval_batch_size=8,
-            evaluation_strategy="epoch",
+            learning_rate=learning_rate,
+            seed=seed,
+            per_device_train_batch_size=batch_size,
+            per_device_eval_batch_size=batch_size,
+            gradient_accumulation_steps=gradient_accumulation_steps,
+            group_by_length=group_by_length,
+            bf16=bool(bf16),
+            use_cpu=on_cpu,
+            evaluation_strategy="steps" if evaluate else "no",
+            eval_steps=checkpoint_steps,
+            save_strategy="steps",
+            save_steps=checkpoint_steps,
+            save_total_limit=2,
+            load_best_model_at_end=early_stopping,
+            metric_for_best_model="eval_loss",
+            greater_is_better=False,
             logging_steps=10,
-            save_steps=50,
             disable_tqdm=True,
             logging_dir="./logs"
         )
-        # Add the cancellation callback.
+        budget = TimeBudgetCallback(time_budget_minutes * 60) if time_budget_minutes else None
+        callbacks = [CancellationCallback(lambda: self.cancelled), throughput]
+        if budget:
+            callbacks.append(budget)
+        if early_stopping:
+            callbacks.append(EarlyStoppingCallback(early_stopping_patience=early_stopping_patience))
         trainer = Trainer(
             model=self.model,
             args=training_arguments,
             train_dataset=tokenized_dataset["train"],
             eval_dataset=tokenized_dataset["test"],
-            callbacks=[CancellationCallback(lambda: self.cancelled)]
+            data_collator=DataCollatorWithPadding(self.tokenizer),
+            callbacks=callbacks
         )
+        last_checkpoint = get_last_checkpoint(checkpoint_dir) if resume and os.path.isdir(checkpoint_dir) else None
+        if last_checkpoint:
+            report(f"Resuming training from {last_checkpoint}.")
         if progress_callback:
             progress_callback(10)
-        trainer.train()
+        trainer.train(resume_from_checkpoint=last_checkpoint)
+        # accelerate replaces forward() on the instance (autocast wrapper for bf16); restore the class method
+        # so later inference, export and tracing see a plain fp32 model.
+        for attr in ("forward", "_original_forward", "_is_accelerate_prepared"):
+            self.model.__dict__.pop(attr, None)
+        if strategy == "lora":
+            self.model = self.model.merge_and_unload()
         if self.cancelled:
-            raise Exception("Training cancelled by user.")
+            # Keep the previous artifact; the checkpoint lets the next run continue from here.
+            report(f"Training cancelled at step {trainer.state.global_step}; progress saved to {checkpoint_dir}.")
+            allow_sleep()
+            return
+        completed = not (budget and budget.expired)
+        if completed:
+            shutil.rmtree(os.path.join(output_dir, CHECKPOINTS_DIR), ignore_errors=True)
+        else:
+            report(f"Time budget of {time_budget_minutes} min reached at step {trainer.state.global_step}/"
+                   f"{trainer.state.max_steps}; saving the best model so far. Train again to continue.")
         if progress_callback:
             progress_callback(100)
-        self.model.save_pretrained(output_dir)
-        self.tokenizer.save_pretrained(output_dir)
-        self.is_trained = True
-        logging.info(f"Transformer AI model trained with {len(texts)} examples.")
+        self.training_stats = throughput.epoch_stats
+        # Examples are recorded only once training completes, so the next run still sees the same work to do.
+        self._finish_training(output_dir, examples if completed else None)
+        logging.info(f"Transformer AI model trained with {len(train_examples)} examples (bf16={bool(bf16)}).")
         logging.info("Training completed successfully.")
         allow_sleep()
 
+    def _train_head_only(self, train_examples, label_ids, epochs, batch_size, learning_rate, progress_callback=None,
+                         report=logging.info):
+        # The encoder runs once to produce CLS features; every epoch after that only touches the head.
+        encoder, head = self.model.base_model, self.model.classifier
+        encoder.eval()
+        texts = [t for t, _ in train_examples]
+        features = []
+        with torch.no_grad():
+            for start in range(0, len(texts), batch_size):
+                inputs = self.tokenizer(texts[start:start + batch_size], return_tensors="pt", truncation=True,
+                                        padding=True, max_length=self.max_length)
+                inputs = {k: v.to(self.device) for k, v in inputs.items()}
+                features.append(encoder(**inputs).last_hidden_state[:, 0, :])
+        features = torch.cat(features)
+        targets = torch.tensor([label_ids[l] for _, l in train_examples]).to(features.device)
+        report(f"Encoded {len(texts)} examples once; training the classification head only.")
+        if progress_callback:
+            progress_callback(10)
+        optimizer = torch.optim.AdamW(head.parameters(), lr=learning_rate)
+        head.train()
+        for epoch in range(epochs):
+            if self.cancelled:
+                break
+            start_time = time.perf_counter()
+            order = torch.randperm(len(targets)).to(features.device)
+            total_loss = 0.0
+            for start in range(0, len(order), batch_size):
+                batch = order[start:start + batch_size]
+                loss = torch.nn.functional.cross_entropy(head(features[batch].unsqueeze(1)), targets[batch])
+                optimizer.zero_grad()
+                loss.backward()
+                optimizer.step()
+                total_loss += loss.item() * len(batch)
+            elapsed = time.perf_counter() - start_time
+            REGISTRY.inc("training_epochs_total")
+            REGISTRY.set("training_samples_per_second", len(targets) / elapsed if elapsed > 0 else 0.0)
+            report(f"Epoch {epoch + 1}: loss {total_loss / len(targets):.4f}, {len(targets)} samples in {elapsed:.2f}s")
+            if progress_callback:
+                progress_callback(10 + int(90 * (epoch + 1) / epochs))
+        head.eval()
+
+    def _tokenized_dataset(self, train_examples, label_ids, cache_dir=None, report=logging.info):
+        cache = TrainingCache(cache_dir) if cache_dir else None
+        if cache is not None:
+            key = fingerprint([list(example) for example in train_examples], label_ids,
+                              tokenizer_signature(self.tokenizer), self.max_length)
+            tokenized_dataset = cache.load_dataset(key)
+            if tokenized_dataset is not None:
+                report(f"Using cached tokenized dataset ({len(tokenized_dataset)} examples).")
+                return tokenized_dataset
+        dataset = Dataset.from_dict({"text": [t for t, _ in train_examples], "label": [label_ids[l] for _, l in train_examples]})
+        # No padding here: the collator pads each batch to its own longest example.
+        def tokenize_function(examples):
+            return self.tokenizer(examples["text"], truncation=True, max_length=self.max_length)
+        tokenized_dataset = dataset.map(tokenize_function, batched=True, remove_columns=["text"])
+        if cache is not None:
+            try:
+                cache.save_dataset(key, tokenized_dataset)
+            except Exception as e:
+                logging.error(f"Error caching tokenized dataset: {e}")
+        return tokenized_dataset
+
+    def _finish_training(self, output_dir, examples):
+        # Label order and the examples trained on let the next incremental run keep ids stable.
+        # examples is None for a run stopped by its time budget: the model is saved, the examples are not.
+        os.makedirs(output_dir, exist_ok=True)
+        if examples is not None:
+            with open(os.path.join(output_dir, TRAINING_EXAMPLES_FILE), "w", encoding="utf-8") as f:
+                json.dump([list(example) for example in examples], f, ensure_ascii=False)
+        self.is_trained = True
+        self.inference_backend = "eager"
+        self._runtime = None
+        self.save(output_dir)
+
     def stop(self):
         self.cancelled = True
 
+    def _logits(self, texts, backend=None):
+        backend = backend or self.inference_backend
+        # TorchScript graphs are traced at a fixed sequence length; eager and ONNX take any length.
+        padding = "max_length" if backend == "torchscript" else True
+        inputs = self.tokenizer(list(texts), return_tensors="pt", truncation=True, padding=padding, max_length=self.max_length)
+        if backend == "onnx":
+            feed = {"input_ids": inputs["input_ids"].numpy(), "attention_mask": inputs["attention_mask"].numpy()}
+            return self._runtime.run(["logits"], feed)[0]
+        with torch.no_grad():
+            if backend == "torchscript":
+                logits = self._runtime(inputs["input_ids"], inputs["attention_mask"])
+            else:
+                inputs = {k: v.to(self.device) for k, v in inputs.items()}
+                self.model.eval()
+                logits = self.model(**inputs).logits
+        return logits.float().cpu().numpy()
+
+    def predict_batch(self, texts, backend=None):
+        if not self.is_trained or self.model is None:
+            raise ValueError("Model is not trained.")
+        if not texts:
+            return []
+        logits = self._logits(texts, backend)
+        probs = torch.softmax(torch.from_numpy(logits), dim=1).numpy()
+        pred_idx = np.argmax(probs, axis=1)
+        pred_labels = [self.labels[i] for i in pred_idx]
+        return [(label, float(p[i])) for label, p, i in zip(pred_labels, probs, pred_idx)]
+
     def predict(self, text):
+        return self.predict_batch([text])[0]
+
+    def export(self, output_dir, backend="torchscript", quantize=True, sample_texts=None, min_agreement=0.95):
+        """
+        Exports an optimized CPU inference artifact (TorchScript or ONNX, optionally with dynamic
+        int8 quantization) into output_dir and switches to it if its predictions agree with the
+        fp32 model on sample_texts at least min_agreement of the time. Returns the agreement.
+        """
         if not self.is_trained or self.model is None:
             raise ValueError("Model is not trained.")
-        inputs = self.tokenizer(text, return_tensors="pt", truncation=True, padding="max_length", max_length=256)  # increased max_length
-        inputs = {k: v.to(self.device) for k, v in inputs.items()}
-        self.model.eval()
-        with torch.no_grad():
-            outputs = self.model(**inputs)
-        probs = torch.softmax(outputs.logits, dim=1)[0].cpu().numpy()
-        confidence = float(np.max(probs))
-        pred_idx = int(np.argmax(probs))
-        pred_label = self.label_encoder.inverse_transform([pred_idx])[0]
-        return pred_label, confidence
-
-    def save(self, filename):
+        if backend not in INFERENCE_BACKENDS or backend == "eager":
+            raise ValueError(f"Unsupported export backend: {backend}")
+        os.makedirs(output_dir, exist_ok=True)
+        cpu_model = copy.deepcopy(self.model).to("cpu").eval()
+        example = self.tokenizer(["example"], return_tensors="pt", truncation=True, padding="max_length", max_length=self.max_length)
+        example_args = (example["input_ids"], example["attention_mask"])
+        if backend == "torchscript":
+            if quantize:
+                cpu_model = torch.quantization.quantize_dynamic(cpu_model, {torch.nn.Linear}, dtype=torch.qint8)
+            with torch.no_grad():
+                traced = torch.jit.trace(_LogitsModule(cpu_model), example_args, strict=False)
+            filename = "model.torchscript.pt"
+            torch.jit.save(traced, os.path.join(output_dir, filename))
+        else:
+            filename = "model.onnx"
+            torch.onnx.export(_LogitsModule(cpu_model), example_args, os.path.join(output_dir, filename),
+                              input_names=["input_ids", "attention_mask"], output_names=["logits"],
+                              dynamic_axes={"input_ids": {0: "batch", 1: "sequence"},
+                                            "attention_mask": {0: "batch", 1: "sequence"},
+                                            "logits": {0: "batch"}},
+                              opset_version=17, dynamo=False)
+            if quantize:
+                from onnxruntime.quantization import quantize_dynamic, QuantType
+                quantized_name = "model.int8.onnx"
+                quantize_dynamic(os.path.join(output_dir, filename), os.path.join(output_dir, quantized_name), weight_type=QuantType.QInt8)
+                filename = quantized_name
+        self._load_runtime(backend, os.path.join(output_dir, filename))
+
+        sample_texts = list(sample_texts or [])[:256]
+        agreement = 1.0
+        if sample_texts:
+            reference = [label for label, _ in self.predict_batch(sample_texts, backend="eager")]
+            exported = [label for label, _ in self.predict_batch(sample_texts, backend=backend)]
+            agreement = sum(a == b for a, b in zip(reference, exported)) / len(sample_texts)
+        accepted = agreement >= min_agreement
+        with open(os.path.join(output_dir, EXPORT_INFO_FILE), "w", encoding="utf-8") as f:
+            json.dump({"backend": backend, "file": filename, "quantized": quantize,
+                       "agreement": agreement, "min_agreement": min_agreement, "accepted": accepted}, f, indent=4)
+        if os.path.isfile(os.path.join(output_dir, ARTIFACT_MANIFEST)):
+            self._write_manifest(output_dir)
+        if accepted:
+            self.inference_backend = backend
+            logging.info(f"Exported {backend} model to {output_dir} (agreement with fp32: {agreement:.2%}).")
+        else:
+            self.inference_backend = "eager"
+            self._runtime = None
+            logging.warning(f"Exported {backend} model agrees with fp32 on only {agreement:.2%} of samples "
+                            f"(< {min_agreement:.2%}); keeping eager inference.")
+        return agreement
+
+    def _load_runtime(self, backend, path):
+        if backend == "torchscript":
+            self._runtime = torch.jit.load(path, map_location="cpu")
+            self._runtime.eval()
+        elif backend == "onnx":
+            import onnxruntime
+            self._runtime = onnxruntime.InferenceSession(path, providers=["CPUExecutionProvider"])
+
+    def use_inference_backend(self, backend, export_dir):
+        """Switches predict() to a previously exported artifact in export_dir, if one was accepted."""
+        if backend == "eager":
+            self.inference_backend, self._runtime = "eager", None
+            return True
+        info_file = os.path.join(export_dir, EXPORT_INFO_FILE)
+        if not os.path.exists(info_file):
+            logging.warning(f"No exported model in {export_dir}; using eager inference.")
+            return False
+        with open(info_file, "r", encoding="utf-8") as f:
+            info = json.load(f)
+        if info.get("backend") != backend or not info.get("accepted", False):
+            logging.warning(f"Exported model in {export_dir} is not an accepted {backend} artifact; using eager inference.")
+            return False
+        try:
+            self._load_runtime(backend, os.path.join(export_dir, info["file"]))
+            width = self._logits(["example"], backend).shape[1]
+            if width != len(self.labels):
+                self._runtime = None
+                logging.warning(f"Exported model in {export_dir} has {width} outputs but the model has "
+                                f"{len(self.labels)} labels; it is stale. Using eager inference.")
+                return False
+        except ImportError as e:
+            logging.warning(f"{backend} inference needs a package that is not installed ({e}); "
+                            f"install onnxruntime from requirements.txt. Using eager inference.")
+            return False
+        except Exception as e:
+            logging.error(f"Error loading {backend} model from {export_dir}: {e}")
+            return False
+        self.inference_backend = backend
+        logging.info(f"Using {backend} inference backend from {export_dir}")
+        return True
+
+    def _write_manifest(self, artifact_dir):
+        return write_artifact_manifest(artifact_dir, base_model=BASE_MODEL, num_labels=len(self.labels),
+                                       max_length=self.max_length)
+
+    def save(self, artifact_dir):
+        """
+        Writes a self-contained artifact directory: safetensors weights, config, tokenizer,
+        labels.json and an artifact.json manifest with checksums.
+        """
         if self.model is None:
             raise ValueError("No model to save.")
-        temp_dir = "temp_transformer_model"
-        self.model.save_pretrained(temp_dir)
-        self.tokenizer.save_pretrained(temp_dir)
-        data = {"model_dir": temp_dir, "label_encoder": self.label_encoder}
-        with open(filename, "wb") as f:
-            pickle.dump(data, f)
-        logging.info(f"Transformer model saved to {filename}")
-
-    def load(self, filename):
-        if os.path.exists(filename):
-            with open(filename, "rb") as f:
+        os.makedirs(artifact_dir, exist_ok=True)
+        try:
+            self.model.save_pretrained(artifact_dir, safe_serialization=True)
+        except TypeError:
+            # Newer transformers always write safetensors and dropped the argument.
+            self.model.save_pretrained(artifact_dir)
+        self.tokenizer.save_pretrained(artifact_dir)
+        with open(os.path.join(artifact_dir, LABELS_FILE), "w", encoding="utf-8") as f:
+            json.dump(self.labels, f, ensure_ascii=False)
+        # An export of the weights this save replaces would keep serving them; export again after saving.
+        for name in (EXPORT_INFO_FILE,) + EXPORT_FILES:
+            if os.path.exists(os.path.join(artifact_dir, name)):
+                os.remove(os.path.join(artifact_dir, name))
+        self._write_manifest(artifact_dir)
+        logging.info(f"Transformer model saved to {artifact_dir}")
+
+    def load(self, path, verify=False):
+        """Loads an artifact directory written by save() (or a legacy pickle). Records load_time in seconds."""
+        start = time.perf_counter()
+        if os.path.isdir(path):
+            problems = validate_artifact(path, verify_checksums=verify)
+            if problems:
+                logging.error(f"Invalid model artifact {path}: {'; '.join(problems)}")
+                return False
+            with open(os.path.join(path, LABELS_FILE), "r", encoding="utf-8") as f:
+                self.labels = json.load(f)
+            self.label_encoder = LabelEncoder().fit(self.labels)
+            self._tokenizer = AutoTokenizer.from_pretrained(path)
+            # safetensors weights are memory-mapped rather than read and unpickled.
+            self.model = AutoModelForSequenceClassification.from_pretrained(path)
+            model_dir = path
+        elif os.path.isfile(path):
+            with open(path, "rb") as f:
                 data = pickle.load(f)
             self.label_encoder = data["label_encoder"]
-            self.model = AutoModelForSequenceClassification.from_pretrained(data["model_dir"])
-            self.model.to(self.device)
+            self.labels = list(data.get("labels") or self.label_encoder.classes_)
+            model_dir = data["model_dir"]
+            self.model = AutoModelForSequenceClassification.from_pretrained(model_dir)
+        else:
+            return False
+        self.model.to(self.device)
+        self.model.eval()
+        self.is_trained = True
+        if self.requested_backend != "eager":
+            self.use_inference_backend(self.requested_backend, model_dir)
+        self.load_time = time.perf_counter() - start
+        logging.info(f"Transformer model loaded from {path} in {self.load_time:.2f}s")
+        return True
+
+class TfidfAIModel:
+    """Character n-gram TF-IDF + linear classifier. Trains in seconds and does not need torch."""
+    model_dir = "tfidf_model"
+    model_file = "model.pkl"
+
+    def __init__(self, ngram_range=(2, 5)):
+        self.ngram_range = ngram_range
+        self.vectorizer = None
+        self.classifier = None
+        self.is_trained = False
+        self.cancelled = False
+        self._fast = None
+
+    @track_job("train")
+    def train(self, texts, labels, output_dir="tfidf_model", epochs=None, progress_callback=None, **kwargs):
+        # epochs and the transformer batching options are accepted for interface compatibility; the solver runs to convergence.
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.linear_model import LogisticRegression
+        self.cancelled = False
+        if len(set(labels)) < 2:
+            raise ValueError("At least two distinct labels are needed to train the TF-IDF model.")
+        if progress_callback:
+            progress_callback(10)
+        self.vectorizer = TfidfVectorizer(analyzer="char_wb", ngram_range=self.ngram_range, lowercase=True,
+                                          sublinear_tf=True, dtype=np.float32)
+        features = self.vectorizer.fit_transform(texts)
+        if self.cancelled:
+            raise Exception("Training cancelled by user.")
+        if progress_callback:
+            progress_callback(40)
+        self.classifier = LogisticRegression(C=10.0, max_iter=1000)
+        self.classifier.fit(features, labels)
+        self.is_trained = True
+        self._fast = None
+        self.save(output_dir)
+        if progress_callback:
+            progress_callback(100)
+        logging.info(f"TF-IDF AI model trained with {len(texts)} examples.")
+
+    def stop(self):
+        self.cancelled = True
+
+    def _decision(self, text):
+        # Same maths as vectorizer.transform + decision_function, minus sklearn's per-call validation
+        # overhead, which dominates for single short texts.
+        if self._fast is None:
+            self._fast = (self.vectorizer.build_analyzer(), self.vectorizer.vocabulary_,
+                          self.vectorizer.idf_.astype(np.float32),
+                          np.ascontiguousarray(self.classifier.coef_.T, dtype=np.float32),
+                          self.classifier.intercept_.astype(np.float32))
+        analyzer, vocabulary, idf, weights, intercept = self._fast
+        rows, values = [], []
+        for gram, count in Counter(analyzer(text)).items():
+            j = vocabulary.get(gram)
+            if j is not None:
+                rows.append(j)
+                values.append((1.0 + math.log(count)) * idf[j])
+        if not rows:
+            return intercept.copy()
+        values = np.asarray(values, dtype=np.float32)
+        values /= np.linalg.norm(values)
+        return values @ weights[rows] + intercept
+
+    def predict_batch(self, texts):
+        if not self.is_trained:
+            raise ValueError("Model is not trained.")
+        results = []
+        for text in texts:
+            scores = self._decision(text)
+            if scores.shape[0] == 1:
+                # Binary logistic regression has a single decision column.
+                positive = 1.0 / (1.0 + math.exp(-float(scores[0])))
+                probs = np.array([1.0 - positive, positive])
+            else:
+                probs = np.exp(scores - scores.max())
+                probs /= probs.sum()
+            i = int(np.argmax(probs))
+            results.append((self.classifier.classes_[i], float(probs[i])))
+        return results
+
+    def predict(self, text):
+        return self.predict_batch([text])[0]
+
+    def save(self, path):
+        if not self.is_trained:
+            raise ValueError("No model to save.")
+        os.makedirs(path, exist_ok=True)
+        with open(os.path.join(path, self.model_file), "wb") as f:
+            pickle.dump({"vectorizer": self.vectorizer, "classifier": self.classifier}, f)
+        logging.info(f"TF-IDF model saved to {path}")
+
+    def load(self, path):
+        filename = os.path.join(path, self.model_file) if os.path.isdir(path) else path
+        if os.path.isfile(filename):
+            with open(filename, "rb") as f:
+                data = pickle.load(f)
+            self.vectorizer = data["vectorizer"]
+            self.classifier = data["classifier"]
             self.is_trained = True
-            logging.info(f"Transformer model loaded from {filename}")
+            self._fast = None
+            logging.info(f"TF-IDF model loaded from {filename}")
             return True
         return False
 
+def default_model_dir(backend="transformer"):
+    """Where the model create_ai_model(backend) returns is trained into and loaded from by default."""
+    if backend == "tfidf" or not TORCH_AVAILABLE:
+        return TfidfAIModel.model_dir
+    return TransformerAIModel.model_dir
+
+def create_ai_model(backend="transformer", **kwargs):
+    """Returns the AI model for the configured ai_backend, falling back to TF-IDF when torch is missing."""
+    if backend not in AI_BACKENDS:
+        logging.warning(f"Unknown AI backend '{backend}'; using transformer.")
+        backend = "transformer"
+    if backend == "transformer" and not TORCH_AVAILABLE:
+        logging.warning("Torch is not available; falling back to the TF-IDF AI backend.")
+        backend = "tfidf"
+    if backend == "tfidf":
+        return TfidfAIModel()
+    return TransformerAIModel(**kwargs)
+
 if __name__ == "__main__":
     import sys
     from PySide6.QtWidgets import QApplication
@@ -238,8 +910,7 @@ if __name__ == "__main__":
     model.train(texts, labels, epochs=5)  # Increase epochs as needed
     pred, conf = model.predict("Organic Chemistry reaction mechanisms")
     logging.info("Prediction: " + str(pred) + " Confidence: " + str(conf))
-    model.save("transformer_ai_model.pkl")
     new_model = TransformerAIModel()
-    new_model.load("transformer_ai_model.pkl")
+    new_model.load(model.model_dir)
     pred2, conf2 = new_model.predict("Quantum mechanics introduction")
     logging.info("Reloaded prediction: " + str(pred2) + " Confidence: " + str(conf2))
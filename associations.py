@@ -1,4 +1,5 @@
-import os, json, re, sys, utils, logging, subprocess, ctypes, shutil
+import os, json, re, sys, utils, logging, subprocess, ctypes, shutil, time
+from metrics import REGISTRY, track_job
 
 def detect_gpu_vendor():
     vendors = []
@@ -42,8 +43,11 @@ import transformers
 from transformers import pipeline
 transformers.logging.set_verbosity_error()
 from utils import prevent_sleep, allow_sleep
+from associations_store import read_associations, save_associations
+from inference_server import InferenceClient
 
 PARAPHRASER = None
+INFERENCE_CLIENT = None  # Set by use_inference_server when a running server hosts the paraphraser.
 
 def get_best_device():
     """Detects the best available device (CUDA, DirectML, ROCm, or CPU)."""
@@ -66,9 +70,37 @@ def get_best_device():
     logging.info("⚠ No GPU detected. Falling back to CPU.")
     return -1  # CPU mode
 
+def use_inference_server(settings):
+    """Routes paraphrasing through inference_server.py when settings enable it and the server is reachable."""
+    global INFERENCE_CLIENT
+    INFERENCE_CLIENT = None
+    if not settings or not settings.get("enabled", False):
+        return False
+    client = InferenceClient(settings.get("socket"), timeout=settings.get("timeout", 30))
+    if not client.is_available():
+        logging.warning(f"Inference server not reachable at {client.socket_path}. Loading the paraphraser locally.")
+        return False
+    logging.info(f"Using inference server at {client.socket_path} for paraphrasing.")
+    INFERENCE_CLIENT = client
+    return True
+
+def server_paraphraser(prompt, **options):
+    """Paraphrases on the inference server; takes and returns the same shapes as the local pipeline."""
+    global INFERENCE_CLIENT
+    if INFERENCE_CLIENT is not None:
+        try:
+            return [{"generated_text": text} for text in INFERENCE_CLIENT.paraphrase(prompt, **options)]
+        except OSError as e:
+            # Server went away mid-run; finish the run with a local paraphraser.
+            logging.error(f"Inference server error: {e}. Falling back to the local paraphraser.")
+            INFERENCE_CLIENT = None
+    return get_paraphraser()(prompt, **options)
+
 def get_paraphraser():
-    """Loads the T5 paraphrasing model on the best available device."""
+    """Returns the inference server's paraphraser when one is in use, else loads the T5 model on the best available device."""
     global PARAPHRASER
+    if INFERENCE_CLIENT is not None:
+        return server_paraphraser
     if PARAPHRASER is None:
         device = get_best_device()
         
@@ -135,6 +167,7 @@ def generate_synonyms(folder_name, base_keywords=None, max_synonyms=5):
         return list(dict.fromkeys(synonyms))[:max_synonyms]
     except Exception as e:
         logging.error(f"Error generating synonyms for '{folder_name}': {e}")
+        REGISTRY.inc("errors_total", job="associations", kind="synonyms")
         return []
 
 def enrich_structure_with_associations(structure, guidebook, progress_callback=None):
@@ -160,6 +193,7 @@ def enrich_structure_with_associations(structure, guidebook, progress_callback=N
             logging.error(f"Error generating synonyms for '{folder_info.get('name')}': {e}")
             generated_syns = []
         folder_info["associations"] = list(set(base_keywords + generated_syns))
+        REGISTRY.inc("association_folders_total")
         # Process children recursively
         children = folder_info.get("children", {})
         if isinstance(children, dict):
@@ -194,15 +228,20 @@ def deep_merge_associations(old_assoc, new_assoc):
             merged[key] = new_val
     return merged
 
-def generate_associations(dest_dir, guidebook_file, output_file="associations.json", update_mode="full", retain_old=False, progress_callback=None):
+@track_job("associations")
+def generate_associations(dest_dir, guidebook_file, output_file="associations.json", update_mode="full", retain_old=False, progress_callback=None, inference_server=None):
+    use_inference_server(inference_server)
     guidebook = load_guidebook(guidebook_file)
+    start = time.perf_counter()
     structure = scan_directory_structure(dest_dir, progress_callback)
+    REGISTRY.observe("stage_duration_seconds", time.perf_counter() - start, job="associations", stage="scan")
+    start = time.perf_counter()
     new_enriched = enrich_structure_with_associations(structure, guidebook, progress_callback)
+    REGISTRY.observe("stage_duration_seconds", time.perf_counter() - start, job="associations", stage="enrich")
 
     if update_mode == "incremental" and os.path.exists(output_file):
         try:
-            with open(output_file, "r", encoding="utf-8") as f:
-                old_assoc = json.load(f)
+            old_assoc = read_associations(output_file)
             if retain_old:
                 merged_assoc = deep_merge_associations(old_assoc, new_enriched)
             else:
@@ -215,8 +254,7 @@ def generate_associations(dest_dir, guidebook_file, output_file="associations.js
         associations = new_enriched
 
     try:
-        with open(output_file, "w", encoding="utf-8") as f:
-            json.dump(associations, f, indent=4, ensure_ascii=False)
+        save_associations(associations, output_file)  # JSON, or a compact store for a .sqlite/.db path.
         logging.info(f"Enriched associations generated and saved to {output_file}")
     except Exception as e:
         logging.error(f"Error saving associations: {e}")
@@ -231,6 +269,8 @@ if __name__ == "__main__":
     retain_old = True if retain_old_input.startswith("y") else False
     
     prevent_sleep()
-    associations = generate_associations(dest_dir, guidebook_file, output_file="associations.json", update_mode=update_mode, retain_old=retain_old)
+    from config import Config
+    associations = generate_associations(dest_dir, guidebook_file, output_file="associations.json", update_mode=update_mode, retain_old=retain_old,
+                                         inference_server=Config().get("inference_server"))
     logging.info(json.dumps(associations, indent=4, ensure_ascii=False))
     allow_sleep()
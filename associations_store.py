@@ -0,0 +1,191 @@
+"""
+Compact SQLite store for associations, for taxonomies too large to parse from JSON on every load.
+
+    python associations_store.py import associations.json associations.sqlite
+    python associations_store.py export associations.sqlite associations.json
+
+Folder nodes are stored one row each and read on first access. The keyword matcher's token and
+trigram postings are precomputed and looked up per term, so opening a store reads almost nothing.
+"""
+import os, sys, json, sqlite3, logging, threading
+from collections.abc import Mapping
+from utils import normalize, char_trigrams, KeywordIndex
+
+STORE_EXTENSIONS = (".sqlite", ".db")
+SCHEMA_VERSION = 1
+MMAP_SIZE = 256 * 1024 * 1024
+
+SCHEMA = """
+CREATE TABLE meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE TABLE folders (id INTEGER PRIMARY KEY, parent INTEGER, path TEXT NOT NULL UNIQUE, name TEXT NOT NULL, info TEXT NOT NULL);
+CREATE INDEX folders_parent ON folders (parent);
+CREATE TABLE token_postings (key TEXT PRIMARY KEY, folders TEXT NOT NULL) WITHOUT ROWID;
+CREATE TABLE trigram_postings (key TEXT PRIMARY KEY, folders TEXT NOT NULL) WITHOUT ROWID;
+"""
+
+def is_store_path(path):
+    return str(path).lower().endswith(STORE_EXTENSIONS)
+
+def write_store(associations, path):
+    """Writes an associations tree (the JSON format) to a new store, replacing path atomically."""
+    tmp_path = path + ".tmp"
+    if os.path.exists(tmp_path):
+        os.remove(tmp_path)
+    conn = sqlite3.connect(tmp_path)
+    try:
+        conn.execute("PRAGMA journal_mode = OFF")  # A fresh temp file: nothing to roll back to.
+        conn.executescript(SCHEMA)
+        next_id = 0
+        token_postings, trigram_postings = {}, {}
+        def add(nodes, parent, parent_path):
+            nonlocal next_id
+            for name, info in nodes.items():
+                info = info if isinstance(info, dict) else {}
+                next_id += 1
+                folder_id = next_id
+                path = f"{parent_path}/{name}" if parent_path else name
+                node = {k: v for k, v in info.items() if k != "children"}
+                conn.execute("INSERT INTO folders VALUES (?, ?, ?, ?, ?)",
+                             (folder_id, parent, path, name, json.dumps(node, ensure_ascii=False, separators=(",", ":"))))
+                if parent is None:
+                    # Same postings as KeywordIndex.build, which only indexes top-level folders.
+                    for kw in info.get("associations", []):
+                        kw = str(kw).lower()
+                        for token in set(normalize(kw)) | {kw}:
+                            token_postings.setdefault(token, set()).add(folder_id)
+                        for gram in char_trigrams(kw):
+                            trigram_postings.setdefault(gram, set()).add(folder_id)
+                children = info.get("children", {})
+                if isinstance(children, dict):
+                    add(children, folder_id, path)
+        add(associations, None, "")
+        for table, postings in (("token_postings", token_postings), ("trigram_postings", trigram_postings)):
+            conn.executemany(f"INSERT INTO {table} VALUES (?, ?)",
+                             ((key, ",".join(map(str, sorted(ids)))) for key, ids in postings.items()))
+        conn.executemany("INSERT INTO meta VALUES (?, ?)", [("schema_version", str(SCHEMA_VERSION)), ("folders", str(next_id))])
+        conn.commit()
+    finally:
+        conn.close()
+    os.replace(tmp_path, path)
+
+class AssociationsStore:
+    """Read-only access to a store. Safe to share between threads."""
+    def __init__(self, path):
+        self.path = path
+        self._conn = sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True, check_same_thread=False)
+        self._conn.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+        self._lock = threading.Lock()
+        version = int(self._query("SELECT value FROM meta WHERE key = 'schema_version'")[0][0])
+        if version != SCHEMA_VERSION:
+            raise ValueError(f"Unsupported associations store version {version} in {path}")
+
+    def _query(self, sql, params=()):
+        with self._lock:
+            return self._conn.execute(sql, params).fetchall()
+
+    def close(self):
+        self._conn.close()
+
+    def children(self, parent=None):
+        """[(id, name)] of the folders directly under parent (top level for None)."""
+        if parent is None:
+            return self._query("SELECT id, name FROM folders WHERE parent IS NULL ORDER BY id")
+        return self._query("SELECT id, name FROM folders WHERE parent = ? ORDER BY id", (parent,))
+
+    def node(self, folder_id):
+        return json.loads(self._query("SELECT info FROM folders WHERE id = ?", (folder_id,))[0][0])
+
+    def associations(self):
+        return LazyAssociations(self)
+
+    def keyword_index(self, max_posting_fraction=0.2):
+        """A KeywordIndex whose postings are read from the store as candidates() asks for them."""
+        index = KeywordIndex(max_posting_fraction=max_posting_fraction)
+        names = dict(self.children())
+        index.num_folders = len(names)
+        index.positions = {name: i for i, name in enumerate(names.values())}
+        index.token_postings = StorePostings(self, "token_postings", names)
+        index.trigram_postings = StorePostings(self, "trigram_postings", names)
+        return index
+
+    def to_dict(self, parent=None):
+        """The whole tree (or the subtree under parent) in the JSON format."""
+        tree = {}
+        for folder_id, name in self.children(parent):
+            node = self.node(folder_id)
+            node["children"] = self.to_dict(folder_id)
+            tree[name] = node
+        return tree
+
+class StorePostings:
+    """Read-through cache over one postings table, standing in for KeywordIndex's postings dicts."""
+    def __init__(self, store, table, names):
+        self.store = store
+        self.table = table
+        self.names = names
+        self._cache = {}
+
+    def get(self, key, default=None):
+        if key not in self._cache:
+            rows = self.store._query(f"SELECT folders FROM {self.table} WHERE key = ?", (key,))
+            self._cache[key] = {self.names[int(i)] for i in rows[0][0].split(",")} if rows else None
+        postings = self._cache[key]
+        return default if postings is None else postings
+
+class LazyAssociations(Mapping):
+    """Top-level associations backed by a store; each folder is read (with its subtree) on first access."""
+    def __init__(self, store):
+        self.store = store
+        self._ids = dict((name, folder_id) for folder_id, name in store.children())
+        self._cache = {}
+
+    def __getitem__(self, name):
+        node = self._cache.get(name)
+        if node is None:
+            folder_id = self._ids[name]
+            node = self.store.node(folder_id)
+            node["children"] = self.store.to_dict(folder_id)
+            self._cache[name] = node
+        return node
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __contains__(self, name):
+        return name in self._ids
+
+def read_associations(path):
+    """The full associations tree from a JSON file or a store."""
+    if is_store_path(path):
+        store = AssociationsStore(path)
+        try:
+            return store.to_dict()
+        finally:
+            store.close()
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+def save_associations(associations, path):
+    if is_store_path(path):
+        write_store(associations, path)
+    else:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(associations, f, indent=4, ensure_ascii=False)
+
+def open_associations(path):
+    """(associations mapping, keyword index or None) for sorting. Stores load lazily with precomputed postings."""
+    if is_store_path(path):
+        store = AssociationsStore(path)
+        return store.associations(), store.keyword_index()
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f), None
+
+if __name__ == "__main__":
+    if len(sys.argv) != 4 or sys.argv[1] not in ("import", "export"):
+        sys.exit("Usage: associations_store.py import|export SOURCE DESTINATION")
+    logging.basicConfig(level=logging.INFO)
+    save_associations(read_associations(sys.argv[2]), sys.argv[3])
+    logging.info(f"Associations written to {sys.argv[3]}")
@@ -0,0 +1,154 @@
+"""
+Synthetic source/destination trees for the AmazeSort benchmarks.
+
+    python benchmarks/generate_tree.py OUT_DIR --files 5000 --depth 3 --duplicate-rate 0.05 --pdf-share 0.1 --family-size 8
+"""
+import os, sys, json, random, argparse
+
+DEFAULT_VOCABULARY = {
+    "Physics": ["mechanics", "optics", "thermodynamics", "electrostatics", "magnetism", "waves", "kinematics", "gravitation"],
+    "Chemistry": ["organic", "inorganic", "polymers", "electrochemistry", "equilibrium", "kinetics", "solutions", "bonding"],
+    "Maths": ["algebra", "calculus", "geometry", "probability", "statistics", "trigonometry", "matrices", "vectors"],
+    "Biology": ["cells", "genetics", "ecology", "evolution", "physiology", "botany", "zoology", "microbes"],
+    "History": ["ancient", "medieval", "revolution", "empires", "colonial", "independence", "wars", "civilisation"],
+    "Geography": ["climate", "rivers", "mountains", "population", "resources", "agriculture", "maps", "oceans"],
+    "Computer Science": ["python", "algorithms", "networks", "databases", "recursion", "sorting", "compilers", "graphs"],
+    "English": ["poetry", "grammar", "novels", "drama", "essays", "comprehension", "vocabulary", "writing"],
+}
+NOISE_WORDS = ["notes", "final", "draft", "scan", "copy", "summary", "worksheet", "revision", "homework", "slides"]
+
+def minimal_pdf(text):
+    """A small valid single-page PDF whose text PyPDF2 can extract."""
+    text = text.replace("\\", "\\\\").replace("(", "\\(").replace(")", "\\)")
+    stream = f"BT /F1 12 Tf 72 720 Td ({text}) Tj ET"
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>",
+               "<< /Type /Pages /Kids [3 0 R] /Count 1 >>",
+               "<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents 4 0 R "
+               "/Resources << /Font << /F1 5 0 R >> >> >>",
+               f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream",
+               "<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>"]
+    out = "%PDF-1.4\n"
+    offsets = []
+    for number, body in enumerate(objects, 1):
+        offsets.append(len(out))
+        out += f"{number} 0 obj\n{body}\nendobj\n"
+    xref = len(out)
+    out += f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n"
+    out += "".join(f"{offset:010d} 00000 n \n" for offset in offsets)
+    out += f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n"
+    return out.encode("latin-1")
+
+def typo(word, rng):
+    """Drops, doubles or swaps one inner character, like a hand-typed file name."""
+    if len(word) < 5:
+        return word
+    i = rng.randint(1, len(word) - 3)
+    kind = rng.randrange(3)
+    if kind == 0:
+        return word[:i] + word[i + 1:]
+    if kind == 1:
+        return word[:i] + word[i] + word[i:]
+    return word[:i] + word[i + 1] + word[i] + word[i + 2:]
+
+def file_stem(words, rng):
+    """One variation of a shared name stem: a version suffix, an extra noise word or a typo."""
+    words = list(words)
+    if rng.random() < 0.3:
+        words.append(f"v{rng.randint(1, 5)}")
+    if rng.random() < 0.15:
+        words.append(rng.choice(NOISE_WORDS))
+    if rng.random() < 0.15:
+        i = rng.randrange(len(words))
+        words[i] = typo(words[i], rng)
+    return "_".join(words)
+
+def generate_tree(root, num_files=1000, depth=2, branching=4, vocabulary=None, duplicate_rate=0.05, pdf_share=0.1, seed=0,
+                  family_size=8):
+    """
+    Creates root/dst (one top-level folder per subject, topic subfolders down to `depth` levels),
+    root/src (num_files files spread over `depth` levels of subfolders) and root/associations.json
+    in the format written by associations.generate_associations. Returns a summary dict.
+    File names are drawn from num_files / family_size shared stems of subject keywords and a noise
+    word, each varied by version suffixes, extra noise words and typos, so they form families of
+    exact and near-matching names; duplicate_rate of the files repeat an earlier file's content
+    under a new name.
+    """
+    rng = random.Random(seed)
+    vocabulary = vocabulary or DEFAULT_VOCABULARY
+    src, dst = os.path.join(root, "src"), os.path.join(root, "dst")
+    os.makedirs(src, exist_ok=True)
+    os.makedirs(dst, exist_ok=True)
+
+    folder_count = 0
+    def build_folder(parent, name, keywords, level):
+        nonlocal folder_count
+        path = os.path.join(parent, name)
+        os.makedirs(path, exist_ok=True)
+        folder_count += 1
+        node = {"name": name, "path": path, "associations": list(keywords), "children": {}}
+        if level < depth:
+            for topic in rng.sample(keywords, min(branching, len(keywords))):
+                related = [topic] + rng.sample(keywords, min(2, len(keywords)))
+                node["children"][topic.title()] = build_folder(path, topic.title(), list(dict.fromkeys(related)), level + 1)
+        return node
+    associations = {subject: build_folder(dst, subject, [subject.lower()] + keywords, 1)
+                    for subject, keywords in vocabulary.items()}
+
+    source_dirs = [src]
+    for level in range(1, depth):
+        source_dirs += [os.path.join(src, *[f"batch{rng.randint(1, branching)}" for _ in range(level)]) for _ in range(branching)]
+    for path in source_dirs:
+        os.makedirs(path, exist_ok=True)
+
+    stems = []  # (subject, words) shared by a family of file names.
+    for _ in range(max(1, num_files // max(1, family_size))):
+        subject = rng.choice(list(vocabulary))
+        stems.append((subject, rng.sample(vocabulary[subject], min(2, len(vocabulary[subject]))) + [rng.choice(NOISE_WORDS)]))
+
+    written = []  # (extension, content) of original files, for duplicates.
+    duplicates = pdfs = 0
+    for i in range(num_files):
+        subject, words = rng.choice(stems)
+        stem = file_stem(words, rng) + f"_{i}"
+        if written and rng.random() < duplicate_rate:
+            extension, content = rng.choice(written)
+            duplicates += 1
+        else:
+            text = f"{subject} {' '.join(words)} document {i}"
+            if rng.random() < pdf_share:
+                extension, content = ".pdf", minimal_pdf(text)
+                pdfs += 1
+            else:
+                extension, content = ".txt", text.encode("utf-8")
+            written.append((extension, content))
+        with open(os.path.join(rng.choice(source_dirs), stem + extension), "wb") as f:
+            f.write(content)
+
+    associations_file = os.path.join(root, "associations.json")
+    with open(associations_file, "w", encoding="utf-8") as f:
+        json.dump(associations, f, indent=2)
+    return {"src": src, "dst": dst, "associations_file": associations_file, "files": num_files,
+            "duplicates": duplicates, "pdfs": pdfs, "folders": folder_count,
+            "params": {"num_files": num_files, "depth": depth, "branching": branching, "subjects": len(vocabulary),
+                       "duplicate_rate": duplicate_rate, "pdf_share": pdf_share, "seed": seed, "family_size": family_size}}
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate a synthetic AmazeSort source/destination tree.")
+    parser.add_argument("root", help="Directory to create the tree in.")
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--branching", type=int, default=4)
+    parser.add_argument("--vocabulary", help="JSON file mapping subject names to keyword lists.")
+    parser.add_argument("--duplicate-rate", type=float, default=0.05)
+    parser.add_argument("--pdf-share", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--family-size", type=int, default=8, help="Average number of file names sharing a stem.")
+    args = parser.parse_args()
+    vocabulary = None
+    if args.vocabulary:
+        with open(args.vocabulary, "r", encoding="utf-8") as f:
+            vocabulary = json.load(f)
+    summary = generate_tree(args.root, args.files, args.depth, args.branching, vocabulary,
+                            args.duplicate_rate, args.pdf_share, args.seed, args.family_size)
+    json.dump(summary, sys.stdout, indent=2)
+    print()
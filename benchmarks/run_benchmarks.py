@@ -0,0 +1,218 @@
+"""
+AmazeSort benchmark suite. Generates a synthetic tree, times the core stages and writes JSON results.
+
+    python benchmarks/run_benchmarks.py --files 2000 --output results.json
+    python benchmarks/run_benchmarks.py --files 2000 --output new.json --compare results.json
+
+With --compare, benchmarks whose median time grew by more than --tolerance are reported as
+regressions and the exit status is 1.
+"""
+import os, sys, io, json, time, copy, shutil, zlib, platform, argparse, tempfile, statistics, subprocess, contextlib, datetime
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCH_DIR))
+
+from generate_tree import generate_tree
+from utils import cluster_files, improved_score, is_duplicate, normalize, TermTable
+from associations import scan_directory_structure
+from config import DEFAULT_CONFIG
+from file_sorter import FileSorter
+
+class StubModel:
+    """Stands in for the AI model: a deterministic label per text after an optional fixed latency."""
+    is_trained = True
+
+    def __init__(self, labels, latency=0.0, confidence=0.9):
+        self.labels = list(labels)
+        self.latency = latency
+        self.confidence = confidence
+
+    def predict_batch(self, texts):
+        if self.latency:
+            time.sleep(self.latency * len(texts))
+        if not self.labels:
+            return [("General", 0.0) for _ in texts]
+        return [(self.labels[zlib.crc32(text.encode("utf-8")) % len(self.labels)], self.confidence) for text in texts]
+
+    def predict(self, text):
+        return self.predict_batch([text])[0]
+
+def list_files(root):
+    return [(os.path.join(dirpath, f), f) for dirpath, _, files in os.walk(root) for f in files]
+
+def measure(run, repeats, setup=None):
+    """
+    Times run(state) `repeats` times; setup() (untimed) provides a fresh state for each repetition.
+    Returns the timings and the last run's return value.
+    """
+    timings = []
+    result = None
+    for _ in range(repeats):
+        state = setup() if setup else None
+        start = time.perf_counter()
+        result = run(state)
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+def bench_cluster_files(ctx, similarity):
+    files = list_files(ctx["tree"]["src"])
+    def run(_):
+        clusters = cluster_files(files, ctx["args"].cluster_threshold, similarity)
+        return {"clusters": len(clusters), "largest_cluster": max(map(len, clusters.values()), default=0)}
+    return len(files), run, None
+
+def bench_improved_score(ctx, memoized):
+    with open(ctx["tree"]["associations_file"], "r", encoding="utf-8") as f:
+        keyword_lists = [info.get("associations", []) for info in json.load(f).values()]
+    names = [name for _, name in list_files(ctx["tree"]["src"])[:500]]
+    def run(_):
+        terms = TermTable() if memoized else None
+        for name in names:
+            file_terms = terms.split(name) if memoized else normalize(name)
+            for keywords in keyword_lists:
+                if memoized:
+                    improved_score(file_terms, keywords, terms.match_score)
+                else:
+                    improved_score(file_terms, keywords)
+    return len(names) * len(keyword_lists), run, None
+
+def bench_is_duplicate(ctx):
+    files = [path for path, _ in list_files(ctx["tree"]["src"])]
+    def run(_):
+        hash_cache = {}
+        for path in files:
+            is_duplicate(path, hash_cache)
+    return len(files), run, None
+
+def count_folders(tree):
+    return sum(1 + count_folders(node["children"]) for node in tree.values())
+
+def bench_scan_directory_structure(ctx):
+    return ctx["tree"]["folders"], lambda _: {"folders": count_folders(scan_directory_structure(ctx["tree"]["dst"]))}, None
+
+def bench_sort_files(ctx, with_model):
+    # sort_files moves files, so every repetition sorts a fresh copy of the generated tree.
+    args, tree = ctx["args"], ctx["tree"]
+    with open(tree["associations_file"], "r", encoding="utf-8") as f:
+        labels = list(json.load(f))
+    def setup():
+        run_dir = tempfile.mkdtemp(dir=ctx["workdir"])
+        shutil.copytree(tree["src"], os.path.join(run_dir, "src"))
+        shutil.copytree(tree["dst"], os.path.join(run_dir, "dst"))
+        config = copy.deepcopy(DEFAULT_CONFIG)
+        config.update({"source_dirs": [os.path.join(run_dir, "src")], "dest_heads": [os.path.join(run_dir, "dst")],
+                       "cluster_threshold": args.cluster_threshold})
+        if not with_model:
+            # Rule-only scores stay well below the default threshold; accept every decision so files are still moved.
+            config["method_strengths"] = dict(config["method_strengths"], ai_based=0.0)
+            config["score_threshold"] = 0
+        with contextlib.redirect_stdout(io.StringIO()):
+            sorter = FileSorter(config)
+            sorter.load_associations(tree["associations_file"])
+        sorter.ai_model = StubModel(labels if with_model else [], latency=args.stub_latency_ms / 1000.0)
+        return run_dir, sorter
+    def run(state):
+        run_dir, sorter = state
+        cwd = os.getcwd()
+        os.chdir(run_dir)  # sort_files writes its log to the working directory.
+        try:
+            with contextlib.redirect_stdout(io.StringIO()):
+                log = sorter.sort_files()
+        finally:
+            os.chdir(cwd)
+        # Decision counts make behaviour changes visible next to timing changes.
+        return {key: len(entries) for key, entries in log.items() if isinstance(entries, list)}
+    return tree["files"], run, setup
+
+BENCHMARKS = {
+    "cluster_files_exact": lambda ctx: bench_cluster_files(ctx, 1.0),
+    "cluster_files_near": lambda ctx: bench_cluster_files(ctx, 0.8),
+    "improved_score": lambda ctx: bench_improved_score(ctx, memoized=False),
+    "improved_score_memoized": lambda ctx: bench_improved_score(ctx, memoized=True),
+    "is_duplicate": bench_is_duplicate,
+    "scan_directory_structure": bench_scan_directory_structure,
+    "sort_files_rule_only": lambda ctx: bench_sort_files(ctx, with_model=False),
+    "sort_files_stub_model": lambda ctx: bench_sort_files(ctx, with_model=True),
+}
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=os.path.dirname(BENCH_DIR),
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def compare(results, baseline, tolerance):
+    """Prints current vs baseline medians; returns the names of benchmarks that slowed down beyond tolerance."""
+    regressions = []
+    print(f"{'benchmark':<28}{'baseline':>12}{'current':>12}{'ratio':>8}")
+    for name, current in results["benchmarks"].items():
+        old = baseline.get("benchmarks", {}).get(name)
+        if not old:
+            print(f"{name:<28}{'-':>12}{current['median_s']:>12.4f}{'new':>8}")
+            continue
+        ratio = current["median_s"] / old["median_s"] if old["median_s"] else float("inf")
+        flag = ""
+        if ratio > 1 + tolerance:
+            regressions.append(name)
+            flag = "  REGRESSION"
+        print(f"{name:<28}{old['median_s']:>12.4f}{current['median_s']:>12.4f}{ratio:>8.2f}{flag}")
+    return regressions
+
+def main():
+    parser = argparse.ArgumentParser(description="Run the AmazeSort benchmark suite.")
+    parser.add_argument("--files", type=int, default=1000)
+    parser.add_argument("--depth", type=int, default=2)
+    parser.add_argument("--branching", type=int, default=4)
+    parser.add_argument("--duplicate-rate", type=float, default=0.05)
+    parser.add_argument("--pdf-share", type=float, default=0.1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--family-size", type=int, default=8, help="Average number of generated file names sharing a stem.")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--cluster-threshold", type=int, default=DEFAULT_CONFIG["cluster_threshold"])
+    parser.add_argument("--stub-latency-ms", type=float, default=0.0, help="Simulated AI inference time per text.")
+    parser.add_argument("--only", nargs="+", choices=sorted(BENCHMARKS), help="Run only these benchmarks.")
+    parser.add_argument("--output", default="benchmark_results.json")
+    parser.add_argument("--compare", help="Earlier results JSON to compare against.")
+    parser.add_argument("--tolerance", type=float, default=0.10, help="Allowed median slowdown before flagging a regression.")
+    parser.add_argument("--keep", action="store_true", help="Keep the generated tree.")
+    args = parser.parse_args()
+
+    workdir = tempfile.mkdtemp(prefix="amazesort-bench-")
+    try:
+        tree = generate_tree(os.path.join(workdir, "tree"), args.files, args.depth, args.branching,
+                             duplicate_rate=args.duplicate_rate, pdf_share=args.pdf_share, seed=args.seed,
+                             family_size=args.family_size)
+        ctx = {"args": args, "tree": tree, "workdir": workdir}
+        results = {"meta": {"timestamp": datetime.datetime.now().isoformat(timespec="seconds"),
+                            "git_commit": git_commit(), "python": platform.python_version(),
+                            "platform": platform.platform(), "repeats": args.repeats,
+                            "tree": tree["params"], "stub_latency_ms": args.stub_latency_ms},
+                   "benchmarks": {}}
+        for name in args.only or BENCHMARKS:
+            items, run, setup = BENCHMARKS[name](ctx)
+            timings, outcome = measure(run, args.repeats, setup)
+            median = statistics.median(timings)
+            results["benchmarks"][name] = {"items": items, "min_s": min(timings), "median_s": median,
+                                           "mean_s": statistics.mean(timings),
+                                           "items_per_s": items / median if median else None}
+            if outcome is not None:
+                results["benchmarks"][name]["outcome"] = outcome  # Small JSON-safe summaries only.
+            print(f"{name:<28}{median:>10.4f}s  ({items} items)")
+    finally:
+        if args.keep:
+            print(f"Generated tree kept in {workdir}")
+        else:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=4)
+    print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare, "r", encoding="utf-8") as f:
+            baseline = json.load(f)
+        if compare(results, baseline, args.tolerance):
+            sys.exit(1)
+
+if __name__ == "__main__":
+    main()
@@ -1,4 +1,4 @@
-import json, os, sys
+import json, os, sys, tempfile
 
 if getattr(sys, 'frozen', False):  
     base_dir = os.path.dirname(sys.executable)  # Running as an .exe
@@ -10,21 +10,36 @@ CONFIG_FILE = os.path.join(base_dir, "sorter_config.json")
 
 GUIDEBOOK_FILE = os.path.join(base_dir, "syllabus.json")
 ASSOCIATIONS_FILE = os.path.join(base_dir, "associations.json")
+INFERENCE_SOCKET = os.path.join(tempfile.gettempdir(), "amazesort-inference.sock")
 
 DEFAULT_CONFIG = {
     "source_dirs": [],
     "dest_heads": [],
+    "min_free_space_mb": 512,                  # Free space a destination head keeps before others are preferred.
     "score_threshold": 40,
-    "cluster_threshold": 3,
+    "cluster_threshold": 3,                    # Smaller name families are sorted file by file.
+    "cluster_similarity": 0.8,                 # Jaccard similarity of name trigrams for near-match families; 1.0 = exact only.
     "ai_confidence_threshold": 0.7,
+    "decision_mode": "weighted",               # "weighted" runs every scorer; "cascade" stops at the first confident one.
+    "cascade_margin": 15,                      # Lead over the runner-up a cascade tier needs to decide on its own.
+    "rule_candidate_top_k": 50,                # Folders fully scored per cluster after keyword-index pruning.
+    "profile": False,                          # Run sorts under cProfile; stats go next to file_sorting_log.json.
     "method_strengths": {
          "rule_based": 0.3,
          "hybrid": 0.5,
-         "ai_based": 0.2
+         "ai_based": 0.2,
+         "embedding": 0.4
+    },
+    "embedding_index": {
+         "enabled": False,                     # Route clusters by nearest folder embedding (no retraining needed).
+         "model": "sentence-transformers/all-MiniLM-L6-v2",
+         "index_file": os.path.join(base_dir, "folder_embeddings.npz"),
+         "batch_size": 32
     },
     "duplicate_handling": {
-         "skip_duplicates": True,
-         "rename_duplicates": False
+         "skip_duplicates": True,              # Leave files whose content was already seen this run; off sorts them like any file.
+         "rename_duplicates": False,           # On a name collision at the destination, move as "name (1).ext".
+         "overwrite_existing": False           # Otherwise overwrite the existing file; with both off, skip the file.
     },
     "ui": {
          "theme": "fluent",
@@ -34,6 +49,59 @@ DEFAULT_CONFIG = {
          "window_height": 700,
          "layout": "grid"
     },
+    "ai_backend": "transformer",               # Options: "transformer" (CodeBERT) or "tfidf" (fast, no torch needed)
+    "ai_model_path": "",                       # Trained model to load for sorting; empty uses the backend's default.
+    "ai_inference": {
+         "backend": "eager",                   # Options: "eager", "torchscript" or "onnx"
+         "quantize": True,                     # Dynamic int8 quantization of the exported model.
+         "min_agreement": 0.95,                # Exported model must match fp32 predictions this often.
+         "export_after_training": False,
+         "batch_size": 64                      # Texts per forward pass; bounds memory for large classify() batches.
+    },
+    "hot_reload": {
+         "enabled": False,                     # Reload associations, model and settings when their files change; applied when the next run starts.
+         "interval": 2.0                       # Seconds between checks of the watched files.
+    },
+    "io_scheduler": {
+         "hdd_concurrency": 1,                 # Concurrent reads/moves per spinning disk.
+         "ssd_concurrency": 8,                 # ... per SSD/NVMe device.
+         "default_concurrency": 4,             # ... per device whose type is unknown (network shares, non-Linux).
+         "prefetch_clusters": 32               # Clusters whose PDF text is read ahead in weighted mode.
+    },
+    "memory": {
+         "budget_mb": 0,                       # Heap budget for sort runs (tracemalloc); 0 disables accounting.
+         "high_water": 0.8,                    # Fraction of the budget at which log entries are spilled to disk.
+         "check_every": 64,                    # Clusters between budget checks.
+         "trace": False,                       # Report per-stage peaks even without a budget.
+         "snapshot_file": ""                   # Write the top allocation sites here at the end of a run.
+    },
+    "metrics": {
+         "enabled": False,                     # Prometheus metrics for sort, training and association jobs.
+         "textfile": os.path.join(base_dir, "amazesort.prom"),  # Point at node_exporter's textfile collector directory.
+         "interval": 15,                       # Seconds between textfile writes.
+         "http_port": 0                        # Also serve /metrics on 127.0.0.1:<port>; 0 disables.
+    },
+    "inference_server": {
+         "enabled": False,                     # Use a running inference_server.py instead of loading the model here.
+         "socket": INFERENCE_SOCKET,
+         "timeout": 30
+    },
+    "training": {
+         "mode": "full",                       # "full" retrains from the base model; "incremental" warm-starts from the last model.
+         "strategy": "full",                   # "full", "head_only" (frozen encoder, fast on CPU) or "lora" (needs peft).
+         "lora_rank": 8,
+         "replay_ratio": 1.0,                  # Incremental mode: old examples replayed per new/changed example.
+         "epochs": 5,
+         "batch_size": 8,
+         "gradient_accumulation_steps": 1,
+         "group_by_length": True,              # Batch similar-length examples together to minimise padding.
+         "bf16": "auto",                       # True, False or "auto" (bf16 autocast on CPUs with AVX512-BF16/AMX).
+         "time_budget_minutes": 0,             # Stop (keeping the best model) after this long; 0 means no limit.
+         "early_stopping_patience": 3,         # Evaluations without eval-loss improvement before stopping; 0 disables.
+         "checkpoint_steps": 50,               # Evaluate and checkpoint this often; interrupted runs resume from here.
+         "resume": True,
+         "cache_dir": os.path.join(base_dir, "training_cache")  # Built and tokenized examples reused across runs; empty disables.
+    },
     "guidebook_file": GUIDEBOOK_FILE,      # Path to your user-supplied guidebook JSON.
     "associations_file": ASSOCIATIONS_FILE ,# Path where enriched associations will be stored.
     "association_update_mode": "full",         # Options: "full" or "incremental"
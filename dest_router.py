@@ -0,0 +1,197 @@
+import os, shutil, queue, logging, threading, contextlib
+
+MB = 1024 * 1024
+
+class VolumeMover:
+    """Moves files onto one volume from a fixed number of worker threads (one for a spinning disk)."""
+    def __init__(self, name="mover", timer=None, threads=1):
+        self.timer = timer
+        self.queue = queue.Queue()
+        self.pending = 0
+        self.pending_bytes = 0
+        self._lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._run, name=f"{name}-{i}", daemon=True) for i in range(threads)]
+        for thread in self._threads:
+            thread.start()
+
+    def submit(self, src, dst, size, on_done):
+        # on_done(src, dst, size, error) runs on the mover thread; error is None on success.
+        with self._lock:
+            self.pending += 1
+            self.pending_bytes += size
+        self.queue.put((src, dst, size, on_done))
+
+    def cancel(self):
+        """Drops queued moves and stops the workers once their current move is done, without waiting."""
+        while True:
+            try:
+                job = self.queue.get_nowait()
+            except queue.Empty:
+                break
+            if job is not None:
+                with self._lock:
+                    self.pending -= 1
+                    self.pending_bytes -= job[2]
+        for _ in self._threads:
+            self.queue.put(None)
+
+    def close(self):
+        for _ in self._threads:
+            self.queue.put(None)
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while True:
+            job = self.queue.get()
+            if job is None:
+                return
+            src, dst, size, on_done = job
+            error = None
+            try:
+                with self.timer.time("move") if self.timer else contextlib.nullcontext():
+                    shutil.move(src, dst)
+            except Exception as e:
+                error = e
+            with self._lock:
+                self.pending -= 1
+                self.pending_bytes -= size
+            try:
+                on_done(src, dst, size, error)
+            except Exception as e:
+                logging.error(f"Error recording move of {src}: {e}")
+
+class DirectoryListing:
+    """
+    Per-run cache of directory listings. The source walk keeps the stat of every file it finds, so sizing,
+    device grouping and moves reuse it. Each destination folder is listed (or created) once, and names
+    are reserved in memory as moves are planned, so name collisions are resolved without a stat per file.
+    """
+    def __init__(self):
+        self._names = {}  # folder -> normcased names present or already planned
+        self.sources = {}  # source path -> os.stat_result taken during the walk
+
+    def walk(self, root):
+        """Yields (path, name) for the files under root in os.walk order, recording each file's stat."""
+        try:
+            with os.scandir(root) as it:
+                entries = list(it)
+        except OSError as e:
+            logging.error(f"Error listing {root}: {e}")
+            return
+        subdirs = []
+        for entry in entries:
+            try:
+                is_dir = entry.is_dir()
+            except OSError:
+                is_dir = False
+            if is_dir:
+                if not entry.is_symlink():  # Like os.walk, symlinked folders are not followed.
+                    subdirs.append(entry.path)
+                continue
+            try:
+                self.sources[entry.path] = entry.stat()
+            except OSError:
+                pass  # A broken link; anything that needs its stat will fail on it as before.
+            yield entry.path, entry.name
+        for subdir in subdirs:
+            yield from self.walk(subdir)
+
+    def stat(self, path):
+        st = self.sources.get(path)
+        return st if st is not None else os.stat(path)
+
+    def ensure(self, folder):
+        names = self._names.get(folder)
+        if names is None:
+            os.makedirs(folder, exist_ok=True)
+            names = self._names[folder] = {os.path.normcase(name) for name in os.listdir(folder)}
+        return names
+
+    def resolve(self, folder, filename, policy="skip"):
+        """Destination path for filename in folder under policy skip/rename/overwrite; None to skip it."""
+        names = self.ensure(folder)
+        key = os.path.normcase(filename)
+        if key not in names or policy == "overwrite":
+            names.add(key)
+            return os.path.join(folder, filename)
+        if policy != "rename":
+            return None
+        stem, ext = os.path.splitext(filename)
+        i = 1
+        while os.path.normcase(f"{stem} ({i}){ext}") in names:
+            i += 1
+        filename = f"{stem} ({i}){ext}"
+        names.add(os.path.normcase(filename))
+        return os.path.join(folder, filename)
+
+class DestinationRouter:
+    """
+    Picks a destination head for each folder and hands the moves to a VolumeMover per target volume.
+    Heads that already contain the folder are preferred; among them, the head whose volume has the
+    least queued bytes relative to its free space wins. Heads that would drop below reserve_mb of
+    free space are only used when every candidate would.
+    """
+    def __init__(self, heads, reserve_mb=512, timer=None, scheduler=None):
+        self.reserve = reserve_mb * MB
+        self.timer = timer
+        self.scheduler = scheduler  # IOScheduler deciding how many movers each volume gets.
+        self.volumes = {}  # head -> st_dev
+        self.free = {}  # st_dev -> free bytes at run start, minus bytes routed onto the volume since.
+        self.movers = {}  # st_dev -> VolumeMover
+        self._has_folder = {}
+        for head in heads:
+            try:
+                device = os.stat(head).st_dev
+                self.free.setdefault(device, shutil.disk_usage(head).free)
+                self.volumes[head] = device
+            except OSError as e:
+                logging.error(f"Skipping destination head {head}: {e}")
+
+    def has_folder(self, head, folder):
+        key = (head, folder)
+        if key not in self._has_folder:
+            self._has_folder[key] = os.path.isdir(os.path.join(head, folder))
+        return self._has_folder[key]
+
+    def _load(self, head, size):
+        device = self.volumes[head]
+        free = self.free[device] - size
+        mover = self.movers.get(device)
+        queued = mover.pending_bytes if mover else 0
+        return (free < self.reserve, (queued + size) / max(free, 1))
+
+    def route(self, folder, size=0):
+        if not self.volumes:
+            raise ValueError("No usable destination heads configured.")
+        heads = [head for head in self.volumes if self.has_folder(head, folder)] or list(self.volumes)
+        head = min(heads, key=lambda h: self._load(h, size))
+        self._has_folder[(head, folder)] = True  # The caller creates it before moving.
+        return head
+
+    def move(self, head, src, dst, size, on_done, src_device=None):
+        device = self.volumes[head]
+        try:
+            if (src_device if src_device is not None else os.stat(src).st_dev) != device:
+                self.free[device] -= size  # Same-volume moves are renames and use no space.
+        except OSError:
+            pass
+        mover = self.movers.get(device)
+        if mover is None:
+            threads = self.scheduler.concurrency(device) if self.scheduler else 1
+            mover = self.movers[device] = VolumeMover(name=f"mover-{device}", timer=self.timer, threads=threads)
+        mover.submit(src, dst, size, on_done)
+
+    def pending(self):
+        return sum(mover.pending for mover in self.movers.values())
+
+    def cancel(self):
+        for mover in self.movers.values():
+            mover.cancel()
+        self.movers = {}
+
+    def close(self):
+        """Waits for every queued move to finish."""
+        for mover in self.movers.values():
+            mover.close()
+        self.movers = {}
@@ -0,0 +1,139 @@
+import os, json, hashlib, logging
+import numpy as np
+
+DEFAULT_EMBEDDING_MODEL = "sentence-transformers/all-MiniLM-L6-v2"
+
+def flatten_folders(associations, parent=""):
+    """Yields (folder path, text) for every folder in an associations tree."""
+    for name, info in associations.items():
+        path = f"{parent}/{name}" if parent else name
+        info = info if isinstance(info, dict) else {}
+        keywords = [str(k) for k in info.get("associations", [])]
+        yield path, " ".join([name] + keywords)
+        children = info.get("children", {})
+        if isinstance(children, dict):
+            yield from flatten_folders(children, path)
+
+def text_fingerprint(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+class TextEmbedder:
+    """Mean-pooled, L2-normalised sentence embeddings from a Hugging Face encoder."""
+    def __init__(self, model_name=DEFAULT_EMBEDDING_MODEL, batch_size=32, max_length=64):
+        import torch
+        from transformers import AutoTokenizer, AutoModel
+        self.torch = torch
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
+        self.tokenizer = AutoTokenizer.from_pretrained(model_name)
+        self.model = AutoModel.from_pretrained(model_name).to(self.device)
+        self.model.eval()
+
+    def encode(self, texts):
+        torch = self.torch
+        chunks = []
+        for start in range(0, len(texts), self.batch_size):
+            batch = texts[start:start + self.batch_size]
+            inputs = self.tokenizer(batch, return_tensors="pt", truncation=True, padding=True, max_length=self.max_length)
+            inputs = {k: v.to(self.device) for k, v in inputs.items()}
+            with torch.no_grad():
+                hidden = self.model(**inputs).last_hidden_state
+            mask = inputs["attention_mask"].unsqueeze(-1).to(hidden.dtype)
+            pooled = (hidden * mask).sum(dim=1) / mask.sum(dim=1).clamp(min=1e-9)
+            chunks.append(torch.nn.functional.normalize(pooled, dim=1).cpu().numpy().astype(np.float32))
+        if not chunks:
+            return np.zeros((0, 0), dtype=np.float32)
+        return np.vstack(chunks)
+
+class FolderEmbeddingIndex:
+    """Persisted matrix of folder embeddings for nearest-neighbour destination lookup.
+
+    Rows are only re-embedded when a folder's name/associations text changes, so
+    new folders become routable as soon as associations are reloaded.
+    """
+    def __init__(self, index_file="folder_embeddings.npz", model_name=DEFAULT_EMBEDDING_MODEL, batch_size=32, embedder=None):
+        self.index_file = index_file
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self._embedder = embedder
+        self.folders = []
+        self.fingerprints = []
+        self.matrix = np.zeros((0, 0), dtype=np.float32)
+
+    @property
+    def embedder(self):
+        if self._embedder is None:
+            self._embedder = TextEmbedder(self.model_name, batch_size=self.batch_size)
+        return self._embedder
+
+    def __len__(self):
+        return len(self.folders)
+
+    def load(self):
+        if not os.path.exists(self.index_file):
+            return False
+        try:
+            with np.load(self.index_file, allow_pickle=False) as data:
+                meta = json.loads(str(data["meta"]))
+                if meta.get("model_name") != self.model_name:
+                    logging.info(f"Embedding index {self.index_file} was built with another model. Rebuilding.")
+                    return False
+                self.matrix = data["matrix"].astype(np.float32)
+            self.folders = meta["folders"]
+            self.fingerprints = meta["fingerprints"]
+            logging.info(f"Folder embedding index loaded from {self.index_file} ({len(self.folders)} folders)")
+            return True
+        except Exception as e:
+            logging.error(f"Error loading embedding index {self.index_file}: {e}")
+            return False
+
+    def save(self):
+        meta = {"model_name": self.model_name, "folders": self.folders, "fingerprints": self.fingerprints}
+        tmp_file = self.index_file + ".tmp.npz"
+        np.savez(tmp_file, matrix=self.matrix, meta=np.array(json.dumps(meta)))
+        os.replace(tmp_file, self.index_file)
+
+    def update(self, associations):
+        """Re-embeds new or changed folders, drops removed ones, and saves if anything changed."""
+        current = dict(flatten_folders(associations))
+        known = {folder: (row, fp) for row, (folder, fp) in enumerate(zip(self.folders, self.fingerprints))}
+        folders, fingerprints, reuse_rows, stale = [], [], [], []
+        for folder, text in current.items():
+            fp = text_fingerprint(text)
+            folders.append(folder)
+            fingerprints.append(fp)
+            row, old_fp = known.get(folder, (None, None))
+            if row is not None and old_fp == fp:
+                reuse_rows.append(row)
+            else:
+                reuse_rows.append(None)
+                stale.append(len(folders) - 1)
+        if not stale and len(folders) == len(self.folders):
+            return 0
+        fresh = self.embedder.encode([current[folders[i]] for i in stale]) if stale else None
+        dim = fresh.shape[1] if fresh is not None and fresh.size else self.matrix.shape[1]
+        matrix = np.zeros((len(folders), dim), dtype=np.float32)
+        for i, row in enumerate(reuse_rows):
+            if row is not None:
+                matrix[i] = self.matrix[row]
+        for j, i in enumerate(stale):
+            matrix[i] = fresh[j]
+        self.folders, self.fingerprints, self.matrix = folders, fingerprints, matrix
+        self.save()
+        logging.info(f"Folder embedding index updated: {len(stale)} re-embedded, {len(folders)} total")
+        return len(stale)
+
+    def query(self, texts, top_k=1):
+        """Returns, for each text, the top_k (folder, cosine similarity) pairs."""
+        if not texts or not self.folders:
+            return [[] for _ in texts]
+        sims = self.embedder.encode(list(texts)) @ self.matrix.T
+        top_k = min(top_k, len(self.folders))
+        top = np.argpartition(-sims, top_k - 1, axis=1)[:, :top_k]
+        results = []
+        for row, cols in zip(sims, top):
+            cols = cols[np.argsort(-row[cols])]
+            results.append([(self.folders[c], float(row[c])) for c in cols])
+        return results
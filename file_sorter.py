@@ -1,55 +1,214 @@
-import os, shutil, time, traceback, json, subprocess
-from utils import normalize, improved_score, extract_pdf_text, cluster_files, is_duplicate
-from ai_model import TransformerAIModel
+import os, copy, shutil, time, traceback, json, subprocess, cProfile, argparse, functools, asyncio
+from utils import normalize, improved_score, extract_pdf_text, cluster_files, is_duplicate, compute_file_hash, KeywordIndex, TermTable, StageTimer
+from ai_model import create_ai_model
+from inference_server import InferenceClient
+from embedding_index import FolderEmbeddingIndex, DEFAULT_EMBEDDING_MODEL
 from config import Config
+from metrics import REGISTRY, track_job, start_metrics_exporter
+from memory_budget import MemoryBudget, LogSpill
+from dest_router import DestinationRouter, DirectoryListing
+from io_scheduler import IOScheduler
+from hot_reload import SnapshotManager
+from associations_store import open_associations
 from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+
+SORT_LOG_FILE = "file_sorting_log.json"
+PROFILE_FILE = "file_sorting_profile.prof"
+SPILL_KEYS = ("Predictions", "Sorted", "Unsorted", "Duplicates")
+CLASSIFY_TERM_LIMIT = 200000  # Distinct filenames, and term/keyword match scores, classify() memoizes before starting over.
+EMBEDDING_QUERY_CHUNK = 1024  # Clusters embedded per index query; bounds the embedding and similarity matrices.
+RUNTIME_SETTINGS = ("source_dirs", "dest_heads")  # Also set directly on the sorter (by the UI); kept over config reloads.
 
 class FileSorter:
     def __init__(self, config: Config):
+        self.apply_settings(config)
+        self.associations = {}
+        self.keyword_index = None
+        self.terms = TermTable()  # Filename terms and fuzzy match scores, rebuilt for every run.
+        self.timings = StageTimer()  # Per-stage latencies of the current run.
+        self.memory = MemoryBudget()  # Heap accounting of the current run; inactive unless configured.
+        self.spill = None
+        self.io = None
+        self._pdf_text = {}  # filepath -> Future of its extracted text, for clusters about to be scored.
+        self.embedding_index = None
+        self._skip_embeddings = False  # Set for the rest of a run once the batched index query fails.
+        self.syllabus = {}  # Initialize an empty guidebook
+        self.ai_backend = config.get("ai_backend", "transformer")
+        self.ai_model = create_ai_model(self.ai_backend, inference_backend=config.get("ai_inference", {}).get("backend", "eager"))
+        server_settings = config.get("inference_server", {})
+        self.inference_client = None
+        if server_settings.get("enabled", False):
+            self.inference_client = InferenceClient(server_settings.get("socket"), timeout=server_settings.get("timeout", 30))
+        self.operation_history = deque(maxlen=100)  # Track last 100 operations
+        self.snapshots = None
+        self.snapshot_version = None
+        self._pinned = {}  # part ("associations" / "ai_model") -> snapshot version the sorter's copy is as new as
+        reload_settings = config.get("hot_reload", {})
+        self._config_snapshot = None  # Snapshot whose config file contents the sorter's settings reflect.
+        if reload_settings.get("enabled", False):
+            self.snapshots = SnapshotManager(config.config_file, interval=reload_settings.get("interval", 2.0)).start()
+            self._config_snapshot = self.snapshots.current
+
+    def apply_settings(self, config):
         self.config = config
         self.source_dirs = config.get("source_dirs", [])
         self.dest_heads = config.get("dest_heads", [])
+        self.min_free_space_mb = config.get("min_free_space_mb", 512)
         self.score_threshold = config.get("score_threshold", 40)
         self.cluster_threshold = config.get("cluster_threshold", 3)
+        self.cluster_similarity = config.get("cluster_similarity", 0.8)
         self.method_strengths = config.get("method_strengths", {"rule_based": 0.3, "hybrid": 0.5, "ai_based": 0.2})
         self.duplicate_handling = config.get("duplicate_handling", {"skip_duplicates": True, "rename_duplicates": False})
-        self.associations = {}
-        self.syllabus = {}  # Initialize an empty guidebook
-        self.ai_model = TransformerAIModel()
-        self.operation_history = deque(maxlen=100)  # Track last 100 operations
+        # What to do when the destination already has a file of the same name.
+        if self.duplicate_handling.get("rename_duplicates", False):
+            self.name_collisions = "rename"
+        elif self.duplicate_handling.get("overwrite_existing", False):
+            self.name_collisions = "overwrite"
+        else:
+            self.name_collisions = "skip"
+        self.rule_candidate_top_k = config.get("rule_candidate_top_k", 50)
+        self.decision_mode = config.get("decision_mode", "weighted")
+        self.cascade_margin = config.get("cascade_margin", 15)
+        self.ai_confidence_threshold = config.get("ai_confidence_threshold", 0.7)
+        self.ai_batch_size = max(1, config.get("ai_inference", {}).get("batch_size", 64))
+        self.memory_settings = config.get("memory", {})
+        self.io_settings = config.get("io_scheduler", {})
+        self.embedding_settings = config.get("embedding_index", {})
+
+    def pin_snapshot(self):
+        """
+        Switches to the newest hot-reload snapshot, if there is one the sorter is not using yet. Called
+        when a run or classify batch starts, so a run keeps the version it started with to the end.
+        A part the caller loaded explicitly is kept until a newer snapshot than the one current at load
+        time arrives. Config file edits are merged in by _reload_settings.
+        """
+        snapshot = self.snapshots.current if self.snapshots is not None else None
+        if snapshot is None or snapshot.version == self.snapshot_version:
+            return
+        self._reload_settings(snapshot)
+        if self._pinned.get("associations") != snapshot.version:
+            self.associations = snapshot.associations
+            self.keyword_index = snapshot.keyword_index
+            self.embedding_index = snapshot.embedding_index
+        if self._pinned.get("ai_model") != snapshot.version:
+            self.ai_model = snapshot.ai_model
+            self.ai_backend = snapshot.config.get("ai_backend", "transformer")
+        self._pinned = {"associations": snapshot.version, "ai_model": snapshot.version}
+        self.snapshot_version = snapshot.version
+
+    def _reload_settings(self, snapshot):
+        # Only the keys the file changed are taken over, so values set at runtime (on the sorter's Config,
+        # like --profile, or on the sorter, like the UI's source_dirs/dest_heads) win over the file.
+        base = self._config_snapshot
+        self._config_snapshot = snapshot
+        if base is not None and base.stamps["config"] == snapshot.stamps["config"]:
+            return
+        changed = {key: value for key, value in snapshot.config.settings.items()
+                   if base is None or base.config.get(key) != value}
+        if not changed:
+            return
+        runtime = {name: getattr(self, name) for name in RUNTIME_SETTINGS if getattr(self, name) != self.config.get(name, [])}
+        for key, value in changed.items():
+            self.config.set(key, copy.deepcopy(value))
+        self.apply_settings(self.config)
+        for name, value in runtime.items():
+            setattr(self, name, value)
+        print(f"Settings reloaded from {self.config.config_file}: {', '.join(sorted(changed))}")
+
+    def _loaded(self, part):
+        # An explicit load is as new as the current snapshot, so pinning does not replace it with that version.
+        snapshot = self.snapshots.current if self.snapshots is not None else None
+        if snapshot is not None:
+            self._pinned[part] = snapshot.version
 
     def set_syllabus(self, syllabus):
         self.syllabus = syllabus
 
     def load_associations(self, associations_file):
+        keyword_index = None
         if os.path.exists(associations_file):
-            with open(associations_file, "r", encoding="utf-8") as f:
-                self.associations = json.load(f)
+            self.associations, keyword_index = open_associations(associations_file)
             print("Associations loaded from", associations_file)
         else:
             print("Associations file not found. Using empty associations.")
             self.associations = {}
+        self.keyword_index = keyword_index or KeywordIndex(self.associations)
+        if self.embedding_settings.get("enabled", False):
+            self.update_embedding_index()
+        self._loaded("associations")
+
+    def update_embedding_index(self):
+        settings = self.embedding_settings
+        try:
+            if self.embedding_index is None:
+                self.embedding_index = FolderEmbeddingIndex(index_file=settings.get("index_file", "folder_embeddings.npz"),
+                                                            model_name=settings.get("model", DEFAULT_EMBEDDING_MODEL),
+                                                            batch_size=settings.get("batch_size", 32))
+                self.embedding_index.load()
+            self.embedding_index.update(self.associations)
+        except Exception as e:
+            print(f"Error building folder embedding index: {e}")
+            self.embedding_index = None
+
+    def load_ai_model(self, model_path=None):
+        if self.inference_client is not None:
+            if self.inference_client.is_available():
+                print("Using inference server at", self.inference_client.socket_path)
+                return True
+            print(f"Inference server not reachable at {self.inference_client.socket_path}. Loading the AI model locally.")
+            self.inference_client = None
+        model_path = model_path or self.config.get("ai_model_path") or self.ai_model.model_dir
+        snapshot = self.snapshots.current if self.snapshots is not None else None
+        if (snapshot is not None and snapshot.ai_model.is_trained and type(snapshot.ai_model) is type(self.ai_model)
+                and os.path.abspath(snapshot.paths["model"]) == os.path.abspath(model_path)):
+            # The snapshot already holds this model; share it rather than loading a second copy.
+            self.ai_model = snapshot.ai_model
+            self._loaded("ai_model")
+            print("AI model loaded from", model_path)
+            return True
+        try:
+            if self.ai_model.load(model_path):
+                self._loaded("ai_model")
+                print("AI model loaded from", model_path)
+                if getattr(self.ai_model, "load_time", None) is not None:
+                    REGISTRY.set("model_load_seconds", self.ai_model.load_time, backend=self.ai_backend)
+                return True
+        except Exception as e:
+            print(f"Error loading AI model from {model_path}: {e}")
+            return False
+        print("No trained AI model found. AI-based scoring is disabled until the model is trained.")
+        return False
 
     def _get_duplicate_cache(self):
         return {}
 
-    def score_rule_based(self, cluster):
-        all_terms = []
-        for filepath, filename in cluster:
-            all_terms.extend(normalize(filename))
-        best_dest = "General"
-        best_score = 0
+    def rank_rule_based(self, all_terms, label="Rule-based"):
+        # Returns [(folder, score)] sorted best first, plus the scoring steps.
+        ranked = []
         steps = []
         if self.associations:
-            # For each top-level key in associations, compute a score.
-            for folder, info in self.associations.items():
-                keywords = info.get("associations", [])
-                score = improved_score(all_terms, keywords)
-                steps.append(f"Rule-based: Folder '{folder}' score {score:.2f} using keywords {keywords}")
-                if score > best_score:
-                    best_score = score
-                    best_dest = folder
-        return best_dest, best_score, steps
+            folders = list(self.associations)
+            # Only fully score the folders the keyword index considers plausible.
+            if self.keyword_index is not None and len(folders) > self.rule_candidate_top_k:
+                folders = self.keyword_index.candidates(all_terms, self.rule_candidate_top_k)
+                steps.append(f"{label}: Keyword index narrowed {len(self.associations)} folders to {len(folders)} candidates")
+            # For each candidate top-level key in associations, compute a score.
+            with self.timings.time("fuzzy_scoring"):
+                for folder in folders:
+                    keywords = self.associations[folder].get("associations", [])
+                    score = improved_score(all_terms, keywords, self.terms.match_score)
+                    steps.append(f"{label}: Folder '{folder}' score {score:.2f} using keywords {keywords}")
+                    ranked.append((folder, score))
+        ranked.sort(key=lambda item: item[1], reverse=True)
+        return ranked, steps
+
+    def score_rule_based(self, cluster):
+        all_terms = self.terms.cluster_terms(cluster)
+        ranked, steps = self.rank_rule_based(all_terms)
+        if ranked and ranked[0][1] > 0:
+            return ranked[0][0], ranked[0][1], steps
+        return "General", 0, steps
 
     def score_hybrid(self, cluster):
         dest, score, steps = self.score_rule_based(cluster)
@@ -58,95 +217,507 @@ class FileSorter:
         steps.append(f"Hybrid: Added bonus of {bonus} to rule-based score, new score {score:.2f}")
         return dest, score, steps
 
-    def score_ai_based(self, cluster):
-        all_terms = []
-        for filepath, filename in cluster:
-            all_terms.extend(normalize(filename))
-        pdf_text = " ".join(extract_pdf_text(fp) for fp, _ in cluster)
-        combined_text = " ".join(all_terms) + " " + pdf_text
+    def _extract_cluster_text(self, cluster):
+        with self.timings.time("pdf_extraction"), self.memory.stage("pdf_extraction"):
+            return " ".join(self._pdf_text.pop(fp).result() if fp in self._pdf_text else extract_pdf_text(fp)
+                            for fp, _ in cluster)
+
+    def _prefetch_pdf_text(self, clusters, stats=None):
+        paths = [fp for cluster in clusters for fp, _ in cluster if fp.lower().endswith(".pdf")]
+        self._pdf_text.update(self.io.submit(extract_pdf_text, paths, stats))
+
+    def _ai_text(self, cluster, pdf_text):
+        return " ".join(self.terms.cluster_terms(cluster)) + " " + pdf_text
+
+    def score_ai_based(self, cluster, pdf_text=None, prediction=None):
+        # prediction is a (label, confidence) already computed in a batch, or the exception that batch raised.
+        if pdf_text is None:
+            pdf_text = self._extract_cluster_text(cluster)
         try:
-            dest, conf = self.ai_model.predict(combined_text)
+            if isinstance(prediction, Exception):
+                raise prediction
+            dest, conf = prediction if prediction is not None else self._ai_predict(self._ai_text(cluster, pdf_text))
             steps = [f"AI-based: Predicted destination '{dest}' with confidence {conf:.2f}"]
             return dest, conf * 100, steps
         except Exception as e:
             return "General", 0, [f"AI-based: Error during prediction: {e}"]
 
-    def _get_destination_for_cluster(self, cluster, log):
+    def _ai_predict(self, text):
+        return self._ai_predict_batch([text])[0]
+
+    def _ai_predict_batch(self, texts):
+        # Chunked so a large batch (classify) is never tokenized and run through the model in one pass.
+        predictions = []
+        for start in range(0, len(texts), self.ai_batch_size):
+            predictions += self._ai_predict_chunk(texts[start:start + self.ai_batch_size])
+        return predictions
+
+    def _ai_predict_chunk(self, texts):
+        with self.timings.time("ai_inference"):
+            if self.inference_client is not None:
+                try:
+                    return self.inference_client.predict_batch(texts)
+                except OSError as e:
+                    # Server went away mid-run; finish the run with a local model.
+                    print(f"Inference server error: {e}. Falling back to the local AI model.")
+                    self.inference_client = None
+                    self.load_ai_model()
+            return self.ai_model.predict_batch(texts)
+
+    def _cluster_text(self, cluster):
+        all_terms = self.terms.cluster_terms(cluster)
+        return " ".join(all_terms)
+
+    def _embedding_hits(self, clusters):
+        # Top folders for every cluster from batched index queries. If a query fails, the embedding scorer
+        # is skipped for the rest of the run instead of re-querying (and failing) once per cluster.
+        self._skip_embeddings = False
+        if self.embedding_index is None or not clusters:
+            return [None] * len(clusters)
+        try:
+            hits = []
+            for i in range(0, len(clusters), EMBEDDING_QUERY_CHUNK):
+                chunk = clusters[i:i + EMBEDDING_QUERY_CHUNK]
+                hits += self.embedding_index.query([self._cluster_text(c) for c in chunk], top_k=2)
+            return hits
+        except Exception:
+            self._skip_embeddings = True
+            print("Error querying folder embedding index; skipping embedding scoring for this run.")
+            raise
+
+    def score_embedding_based(self, cluster, hit=None):
+        # hit is a precomputed [(folder, similarity)] list from a batched index query.
+        if hit is None:
+            hit = self.embedding_index.query([self._cluster_text(cluster)])[0]
+        if not hit:
+            return "General", 0, ["Embedding: No folders in embedding index"]
+        dest, similarity = hit[0]
+        return dest, similarity * 100, [f"Embedding: Nearest folder '{dest}' with similarity {similarity:.2f}"]
+
+    def _get_destination_for_cluster(self, cluster, log, embedding_hit=None, pdf_text=None, ai_prediction=None):
+        # pdf_text and ai_prediction may be supplied by batching callers; otherwise they are computed here.
+        if self.decision_mode == "cascade":
+            return self._cascade_destination_for_cluster(cluster, log, embedding_hit, pdf_text, ai_prediction)
         log = log
         rule_dest, rule_score, rule_steps = self.score_rule_based(cluster)
         hybrid_dest, hybrid_score, hybrid_steps = self.score_hybrid(cluster)
-        ai_dest, ai_score, ai_steps = self.score_ai_based(cluster)
+        ai_dest, ai_score, ai_steps = self.score_ai_based(cluster, pdf_text, ai_prediction)
         weights = self.method_strengths
         weighted_rule = rule_score * weights.get("rule_based", 0)
         weighted_hybrid = hybrid_score * weights.get("hybrid", 0)
         weighted_ai = ai_score * weights.get("ai_based", 0)
         scores = {"rule": weighted_rule, "hybrid": weighted_hybrid, "ai": weighted_ai}
+        predictions = {"rule-based": {"destination": rule_dest,"score": rule_score, "steps": rule_steps}, "hybrid": {"destination": hybrid_dest,"score": hybrid_score, "steps": hybrid_steps}}
+        if self.embedding_index is not None and not self._skip_embeddings:
+            emb_dest, emb_score, emb_steps = self.score_embedding_based(cluster, embedding_hit)
+            scores["embedding"] = emb_score * weights.get("embedding", 0)
+            predictions["embedding"] = {"destination": emb_dest, "score": emb_score, "steps": emb_steps}
         for filepath, filename in cluster:
-            log["Predictions"].append({"file" : filepath, "predictions": {"rule-based": {"destination": rule_dest,"score": rule_score, "steps": rule_steps}, "hybrid": {"destination": hybrid_dest,"score": hybrid_score, "steps": hybrid_steps}}, "ai": {"destination": ai_dest,"score": ai_score, "steps": ai_steps} })
+            log["Predictions"].append({"file" : filepath, "predictions": predictions, "ai": {"destination": ai_dest,"score": ai_score, "steps": ai_steps} })
         best_method = max(scores, key=scores.get)
         if best_method == "rule":
             return rule_dest, rule_score, rule_steps, "rule", log
         elif best_method == "hybrid":
             return hybrid_dest, hybrid_score, hybrid_steps, "hybrid", log
+        elif best_method == "embedding":
+            return emb_dest, emb_score, emb_steps, "embedding", log
         else:
             return ai_dest, ai_score, ai_steps, "AI", log
 
-    def shift_folders(self, dest_base, dest_folder):
-        final_path = os.path.join(dest_base, dest_folder)
-        if not os.path.exists(final_path):
-            os.makedirs(final_path)
-        return final_path
+    def _cascade_destination_for_cluster(self, cluster, log, embedding_hit=None, pdf_text=None, ai_prediction=None):
+        """
+        Runs the scorers cheapest first and stops at the first tier that is confident:
+        its best score clears score_threshold and beats the runner-up by cascade_margin
+        (for the AI tier, confidence must reach ai_confidence_threshold). PDF extraction
+        and the AI model only run for clusters the cheaper tiers could not settle.
+        """
+        file_terms = self.terms.cluster_terms(cluster)
+        predictions = {}
+        candidates = {}
+
+        def margin_of(ranked):
+            if not ranked:
+                return 0
+            return ranked[0][1] - (ranked[1][1] if len(ranked) > 1 else 0)
+
+        def confident(ranked):
+            return bool(ranked) and ranked[0][1] >= self.score_threshold and margin_of(ranked) >= self.cascade_margin
+
+        def record(tier, ranked, steps):
+            dest, score = ranked[0] if ranked and ranked[0][1] > 0 else ("General", 0)
+            steps = steps + [f"Cascade: Tier '{tier}' best '{dest}' score {score:.2f}, margin {margin_of(ranked):.2f}"]
+            predictions[tier] = {"destination": dest, "score": score, "steps": steps}
+            candidates[tier] = (dest, score, steps)
+
+        def decide(tier):
+            for filepath, filename in cluster:
+                log["Predictions"].append({"file": filepath, "decided_by": tier, "predictions": predictions})
+            dest, score, steps = candidates[tier]
+            return dest, score, steps, tier, log
+
+        # Tier 1: fuzzy keyword matching on file names only.
+        ranked, steps = self.rank_rule_based(file_terms)
+        record("rule", ranked, steps)
+        if confident(ranked):
+            return decide("rule")
 
+        # Tier 2: nearest folder embedding (precomputed in one batch per run).
+        if self.embedding_index is not None and not self._skip_embeddings:
+            hit = embedding_hit if embedding_hit is not None else self.embedding_index.query([" ".join(file_terms)], top_k=2)[0]
+            ranked = [(folder, similarity * 100) for folder, similarity in hit]
+            record("embedding", ranked, [f"Embedding: Nearest folders {ranked}"])
+            if confident(ranked):
+                return decide("embedding")
+
+        # Tier 3: keyword matching with PDF text added. Only ambiguous clusters pay for extraction.
+        if pdf_text is None:
+            pdf_text = self._extract_cluster_text(cluster)
+        if pdf_text.strip():
+            ranked, steps = self.rank_rule_based(file_terms + list(set(normalize(pdf_text))), label="Rule-based+PDF")
+            record("rule+pdf", ranked, steps)
+            if confident(ranked):
+                return decide("rule+pdf")
+
+        # Tier 4: the AI model on file names plus PDF text.
+        ai_dest, ai_score, ai_steps = self.score_ai_based(cluster, pdf_text, ai_prediction)
+        record("AI", [(ai_dest, ai_score)], ai_steps)
+        if ai_score >= self.ai_confidence_threshold * 100 and ai_score >= self.score_threshold:
+            return decide("AI")
+
+        # No tier was confident: fall back to the weighted comparison over every tier that ran.
+        weight_keys = {"rule": "rule_based", "rule+pdf": "rule_based", "embedding": "embedding", "AI": "ai_based"}
+        weighted = {tier: candidates[tier][1] * self.method_strengths.get(weight_keys[tier], 0) for tier in candidates}
+        best_tier = max(weighted, key=weighted.get)
+        candidates["weighted"] = candidates[best_tier]
+        predictions["weighted"] = {"destination": candidates[best_tier][0], "score": candidates[best_tier][1], "steps": [f"Cascade: No confident tier; weighted choice from '{best_tier}'"]}
+        return decide("weighted")
+
+    def classify(self, records, explain=False):
+        """
+        Decides destinations for a batch of files without moving, creating or writing anything.
+        records are file paths, or (filename, text) pairs whose text (possibly None) stands in for the
+        file's contents so nothing is read from disk. Returns one dict per record with the destination
+        folder (relative to a destination head), score, deciding method, and whether the score clears
+        score_threshold; with explain, also the scoring steps.
+        Embedding lookups and, in weighted mode, AI predictions run once for the whole batch. Not meant
+        to run concurrently with sort_files on the same sorter.
+        """
+        self.pin_snapshot()
+        if len(self.terms) > CLASSIFY_TERM_LIMIT:
+            self.terms = TermTable()
+        self.terms.max_matches = CLASSIFY_TERM_LIMIT
+        self.timings = StageTimer()
+        clusters, texts = [], []
+        for record in records:
+            if isinstance(record, (tuple, list)):
+                name, text = record[0], (record[1] if len(record) > 1 else None)
+                clusters.append([(name, os.path.basename(name))])
+                texts.append(text or "")
+            else:
+                clusters.append([(record, os.path.basename(record))])
+                texts.append(None)  # Read from the file when a scorer needs it.
+        try:
+            with self.timings.time("embedding"):
+                embedding_hits = self._embedding_hits(clusters)
+        except Exception as e:
+            print(f"Error querying folder embedding index: {e}")
+            embedding_hits = [None] * len(clusters)
+        ai_predictions = [None] * len(clusters)
+        if self.decision_mode != "cascade" and clusters:
+            # Weighted mode scores every record with the AI model, so it gets one batched call.
+            texts = [self._extract_cluster_text(c) if text is None else text for c, text in zip(clusters, texts)]
+            try:
+                ai_predictions = self._ai_predict_batch([self._ai_text(c, text) for c, text in zip(clusters, texts)])
+            except Exception as e:
+                ai_predictions = [e] * len(clusters)
+        log = {"Predictions": []}
+        results = []
+        for cluster, text, hit, prediction in zip(clusters, texts, embedding_hits, ai_predictions):
+            try:
+                with self.timings.time("decide"):
+                    folder, score, steps, method, _ = self._get_destination_for_cluster(cluster, log, hit, text, prediction)
+            except Exception as e:
+                folder, score, steps, method = "General", 0, [f"Error: {e}"], "error"
+            log["Predictions"].clear()
+            result = {"file": cluster[0][0], "folder": folder, "score": score, "method": method,
+                      "sortable": score >= self.score_threshold}
+            if explain:
+                result["steps"] = steps
+            results.append(result)
+        return results
+
+    @track_job("sort")
     def sort_files(self, progress_callback=None):
+        """
+        Sorts every source file and writes the run log (with per-stage "Timings") to file_sorting_log.json.
+        With the "profile" setting on, the run is wrapped in cProfile and the stats are saved next to the log.
+        """
+        start = time.perf_counter()
+        self.pin_snapshot()
+        self.timings = StageTimer()
+        settings = self.memory_settings
+        self.memory = MemoryBudget(settings.get("budget_mb", 0), settings.get("high_water", 0.8), settings.get("trace", False))
+        self.spill = LogSpill(os.path.splitext(SORT_LOG_FILE)[0])
+        self.spill.discard(SPILL_KEYS)  # Spill files of an earlier run.
+        self.memory.start()
+        try:
+            if self.config.get("profile", False):
+                profiler = cProfile.Profile()
+                log = profiler.runcall(self._sort_files, progress_callback)
+                profiler.dump_stats(PROFILE_FILE)
+                log["Profile"] = os.path.abspath(PROFILE_FILE)
+                print("Profile written to", log["Profile"])
+            else:
+                log = self._sort_files(progress_callback)
+            if self.memory.enabled:
+                self._report_memory(log)
+        finally:
+            self.memory.stop()
+        log["Timings"] = {"total_s": round(time.perf_counter() - start, 6), "stages": self.timings.summary()}
+        if self.snapshot_version is not None:
+            log["Snapshot"] = self.snapshot_version
+        for stage, samples in self.timings.samples.items():
+            REGISTRY.observe("stage_duration_seconds", sum(samples), count=len(samples), job="sort", stage=stage)
+        for stage, stats in log["Timings"]["stages"].items():
+            print(f"{stage}: {stats['count']} calls, {stats['total_s']:.3f}s total, "
+                  f"p50 {stats['p50_ms']:.2f}ms, p95 {stats['p95_ms']:.2f}ms, max {stats['max_ms']:.2f}ms")
+        with open(SORT_LOG_FILE, "w") as f:
+            json.dump(log, f, indent=4)
+        return log
+
+    def _report_memory(self, log):
+        log["Memory"] = self.memory.summary()
+        log["Memory"]["spilled"] = self.spill.summary()
+        if self.memory_settings.get("snapshot_file"):
+            log["Memory"]["snapshot"] = self.memory.snapshot(self.memory_settings["snapshot_file"])
+        for stage, peak in self.memory.peaks.items():
+            REGISTRY.set("memory_peak_bytes", peak, job="sort", stage=stage)
+            print(f"{stage}: peak traced memory {peak / (1024 * 1024):.1f} MB")
+
+    def _cluster_size(self, cluster, listing):
+        size = 0
+        for filepath, _ in cluster:
+            try:
+                size += listing.stat(filepath).st_size
+            except OSError:
+                pass
+        return size
+
+    def _record_move(self, log, filename, method, method_steps, filepath, destination_path, size, error, notify=None):
+        # Called on a mover thread once the file has been moved (or failed to).
+        if error is not None:
+            trace = "".join(traceback.format_exception(type(error), error, error.__traceback__))
+            log["Errors"].append({"move_error": str(error), "file": filepath, "trace": trace})
+            REGISTRY.inc("files_processed_total", outcome="error")
+            REGISTRY.inc("errors_total", job="sort", kind="move")
+        else:
+            REGISTRY.inc("files_processed_total", outcome="sorted")
+            REGISTRY.inc("bytes_processed_total", size)
+            self.operation_history.append(("move", (filepath, destination_path)))  # Log operation
+            log["Sorted"].append({"file": filename, "source": filepath, "destination": destination_path,
+                                  "method": method, "detail": f"Matched via {method_steps}"})
+        if notify:
+            notify({"event": "move", "file": filename, "source": filepath, "destination": destination_path,
+                    "method": method, "error": str(error) if error is not None else None})
+
+    def _relieve_memory(self, log):
+        # Near the budget: move finished log entries to disk and drop memoized match scores.
+        self.spill.spill(log, SPILL_KEYS)
+        self.terms.clear_matches()
+        if self.memory.near_limit() and not self.memory.warned:
+            self.memory.warned = True
+            print(f"Memory still near the budget after spilling ({self.memory.current() / (1024 * 1024):.1f} MB traced).")
+
+    def _sort_files(self, progress_callback=None):
         log = {"Sorted": [], "Unsorted": [], "Duplicates": [], "Errors": [], "Predictions": []}
-        hash_cache = self._get_duplicate_cache()
-        all_files = []
-        for src in self.source_dirs:
-            for root, _, files in os.walk(src):
-                for f in files:
-                    all_files.append((os.path.join(root, f), f))
-        clusters = cluster_files(all_files)
-        clusters_list = list(clusters.values())
-        total_clusters = len(clusters_list)
-        method = ""
+        run = self._prepare_run(log)
+        total_clusters = len(run["clusters"])
+        check_every = self.memory_settings.get("check_every", 64)
         if progress_callback:
             progress_callback(0)
-        for idx, cluster in enumerate(clusters_list):
+        for idx in range(total_clusters):
+            if idx % check_every == 0 and self.memory.near_limit():
+                self._relieve_memory(log)
             try:
-                dest_folder, score, method_steps, method, log = self._get_destination_for_cluster(cluster, log)
-                final_dest = self.shift_folders(self.dest_heads[0], dest_folder)
-                for filepath, filename in cluster:
-                    dup, dup_path = is_duplicate(filepath, hash_cache)
-                    destination_path = os.path.join(final_dest, filename)
-                    if dup:
-                        log["Duplicates"].append({"file": filename, "source": filepath, "duplicate_of": dup_path})
-                        continue
-                    if score < self.score_threshold:
-                        log["Unsorted"].append({"file": filename, "source": filepath, "reason": f"Low score: {score:.2f}", "predicted destination": destination_path})
-                        print(f"Skipped '{filename}' due to low score: {score:.2f}; predicted destination was '{destination_path}'")
-                        continue
-                    try:
-                        shutil.move(filepath, destination_path)
-                        self.operation_history.append(("move", (filepath, destination_path)))  # Log operation
-                        log["Sorted"].append({"file": filename, "source": filepath, "destination": destination_path,
-                                               "detail": f"Matched via {method_steps}"})
-                    except Exception as move_err:
-                        log["Errors"].append({"move_error": str(move_err), "file": filepath, "trace": traceback.format_exc()})
+                decision, head, moves = self._plan_cluster(idx, run, log)
+                for filepath, filename, destination_path in moves:
+                    self._submit_move(run, log, decision, head, filepath, filename, destination_path)
             except Exception as cluster_err:
                 log["Errors"].append({"cluster_error": str(cluster_err), "trace": traceback.format_exc()})
+                REGISTRY.inc("errors_total", job="sort", kind="cluster")
             if progress_callback and total_clusters:
                 progress = int(((idx+1) / total_clusters) * 100)
                 progress_callback(progress)
-        with open("file_sorting_log.json", "w") as f:
-            json.dump(log, f, indent=4)
+        REGISTRY.set("queue_depth", 0, queue="sort_clusters")
+        with self.timings.time("move_drain"):
+            run["router"].close()
+        self._finish_run(run)
         return log
 
+    def _prepare_run(self, log):
+        """Walks, clusters, embeds and hashes the source files; returns the state the cluster loop works from."""
+        self.terms = TermTable()
+        # Source stats are taken once here; destination folders are listed on their first move.
+        listing = DirectoryListing()
+        all_files = []
+        with self.timings.time("walk"), self.memory.stage("walk"):
+            for src in self.source_dirs:
+                all_files.extend(listing.walk(src))
+        REGISTRY.inc("files_discovered_total", len(all_files))
+        with self.timings.time("cluster"), self.memory.stage("cluster"):
+            clusters = cluster_files(all_files, self.cluster_threshold, self.cluster_similarity, terms=self.terms)
+        clusters_list = list(clusters.values())
+        total_clusters = len(clusters_list)
+        # Embed all cluster texts in batches up front; each cluster then only needs a row lookup.
+        try:
+            with self.timings.time("embedding"), self.memory.stage("embedding"):
+                embedding_hits = self._embedding_hits(clusters_list)
+        except Exception as e:
+            log["Errors"].append({"embedding_error": str(e), "trace": traceback.format_exc()})
+            REGISTRY.inc("errors_total", job="sort", kind="embedding")
+            embedding_hits = [None] * total_clusters
+        settings = self.io_settings
+        self.io = IOScheduler(settings.get("hdd_concurrency", 1), settings.get("ssd_concurrency", 8), settings.get("default_concurrency", 4))
+        self._pdf_text = {}
+        # Hash every file up front, device by device, instead of one at a time in cluster order.
+        with self.timings.time("hashing"), self.memory.stage("hashing"):
+            file_hashes = self.io.map(compute_file_hash, [fp for fp, _ in all_files], listing.sources)
+        return {"clusters": clusters_list, "embedding_hits": embedding_hits, "file_hashes": file_hashes,
+                "hash_cache": self._get_duplicate_cache(), "listing": listing,
+                # Weighted mode reads every PDF, so their text is read ahead a window of clusters at a time.
+                "prefetch": settings.get("prefetch_clusters", 32) if self.decision_mode != "cascade" else 0,
+                # Mover threads per destination volume; moves overlap with deciding the next clusters.
+                "router": DestinationRouter(self.dest_heads, self.min_free_space_mb, timer=self.timings, scheduler=self.io)}
+
+    def _plan_cluster(self, idx, run, log):
+        """
+        Decides the destination of cluster idx and records its duplicate and low-score files.
+        Returns the decision, the chosen destination head and the (filepath, filename, destination) moves to make.
+        """
+        clusters = run["clusters"]
+        cluster = clusters[idx]
+        REGISTRY.set("queue_depth", len(clusters) - idx, queue="sort_clusters")
+        prefetch = run["prefetch"]
+        if prefetch and idx % prefetch == 0:
+            self._prefetch_pdf_text(clusters[idx:idx + prefetch], run["listing"].sources)
+        with self.timings.time("decide"), self.memory.stage("decide"):
+            dest_folder, score, method_steps, method, log = self._get_destination_for_cluster(cluster, log, run["embedding_hits"][idx])
+        REGISTRY.inc("decisions_total", method=method)
+        head = run["router"].route(dest_folder, self._cluster_size(cluster, run["listing"]))
+        final_dest = os.path.join(head, dest_folder)
+        decision = {"event": "decision", "files": [filepath for filepath, _ in cluster], "folder": dest_folder,
+                    "destination": final_dest, "score": score, "method": method, "steps": method_steps,
+                    "duplicates": [], "unsorted": []}
+        moves = []
+        for filepath, filename in cluster:
+            dup, dup_path = is_duplicate(filepath, run["hash_cache"], run["file_hashes"].get(filepath))
+            destination_path = os.path.join(final_dest, filename)
+            # With skip_duplicates off, a duplicate is sorted like any other file, name collisions included.
+            if dup and self.duplicate_handling.get("skip_duplicates", True):
+                log["Duplicates"].append({"file": filename, "source": filepath, "duplicate_of": dup_path})
+                REGISTRY.inc("duplicates_total")
+                REGISTRY.inc("files_processed_total", outcome="duplicate")
+                decision["duplicates"].append(filepath)
+                continue
+            if score < self.score_threshold:
+                log["Unsorted"].append({"file": filename, "source": filepath, "reason": f"Low score: {score:.2f}", "predicted destination": destination_path})
+                print(f"Skipped '{filename}' due to low score: {score:.2f}; predicted destination was '{destination_path}'")
+                REGISTRY.inc("files_processed_total", outcome="unsorted")
+                decision["unsorted"].append(filepath)
+                continue
+            # The folder is listed (and created) on its first move of the run; later names resolve in memory.
+            resolved_path = run["listing"].resolve(final_dest, filename, self.name_collisions)
+            if resolved_path is None:
+                log["Unsorted"].append({"file": filename, "source": filepath, "reason": "A file with this name already exists at the destination", "predicted destination": destination_path})
+                REGISTRY.inc("files_processed_total", outcome="collision")
+                decision["unsorted"].append(filepath)
+                continue
+            moves.append((filepath, filename, resolved_path))
+        return decision, head, moves
+
+    def _submit_move(self, run, log, decision, head, filepath, filename, destination_path, notify=None):
+        # The move is recorded (and notify called) exactly once, whether it fails here or on the mover.
+        record = functools.partial(self._record_move, log, filename, decision["method"], decision["steps"], notify=notify)
+        try:
+            st = run["listing"].stat(filepath)
+            run["router"].move(head, filepath, destination_path, st.st_size, record, src_device=st.st_dev)
+        except Exception as move_err:
+            record(filepath, destination_path, 0, move_err)
+
+    def _finish_run(self, run, wait=True):
+        self.io.close(wait=wait)
+        self._pdf_text = {}
+
+    async def sort_async(self, max_in_flight=64, executor=None):
+        """
+        Asyncio counterpart of sort_files: `async for event in sorter.sort_async(): ...`.
+        Blocking stages run in `executor` (by default a private single thread, which keeps decisions in
+        cluster order) and moves run on the per-volume movers. Yields a "decision" event per cluster, a
+        "move" event per file as it lands, "error" events, and finally a "done" event carrying the run log.
+        At most max_in_flight moves are queued at once. Cancelling the consuming task, or leaving the loop
+        early, drops the queued moves; moves already under way finish. No log file is written.
+        """
+        loop = asyncio.get_running_loop()
+        own_executor = executor is None
+        if own_executor:
+            executor = ThreadPoolExecutor(1, thread_name_prefix="sort-async")
+        completed = asyncio.Queue()
+        notify = lambda event: loop.call_soon_threadsafe(completed.put_nowait, event)
+        log = {"Sorted": [], "Unsorted": [], "Duplicates": [], "Errors": [], "Predictions": []}
+        self.pin_snapshot()
+        self.timings = StageTimer()
+        self.memory = MemoryBudget()
+        start = time.perf_counter()
+        run = None
+        outstanding = 0
+        try:
+            run = await loop.run_in_executor(executor, self._prepare_run, log)
+            for idx in range(len(run["clusters"])):
+                try:
+                    decision, head, moves = await loop.run_in_executor(executor, self._plan_cluster, idx, run, log)
+                except Exception as cluster_err:
+                    log["Errors"].append({"cluster_error": str(cluster_err), "trace": traceback.format_exc()})
+                    REGISTRY.inc("errors_total", job="sort", kind="cluster")
+                    yield {"event": "error", "files": [filepath for filepath, _ in run["clusters"][idx]], "error": str(cluster_err)}
+                    continue
+                yield decision
+                for filepath, filename, destination_path in moves:
+                    while outstanding >= max_in_flight:
+                        outstanding -= 1
+                        yield await completed.get()
+                    self._submit_move(run, log, decision, head, filepath, filename, destination_path, notify)
+                    outstanding += 1
+                while not completed.empty():
+                    outstanding -= 1
+                    yield completed.get_nowait()
+            while outstanding:
+                outstanding -= 1
+                yield await completed.get()
+            REGISTRY.set("queue_depth", 0, queue="sort_clusters")
+            log["Timings"] = {"total_s": round(time.perf_counter() - start, 6), "stages": self.timings.summary()}
+            yield {"event": "done", "log": log}
+        finally:
+            if run is not None:
+                run["router"].cancel()
+                self._finish_run(run, wait=False)
+            if own_executor:
+                executor.shutdown(wait=False, cancel_futures=True)
+
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Sort the configured source folders.")
+    parser.add_argument("--profile", action="store_true", help=f"Run under cProfile and write {PROFILE_FILE}.")
+    args = parser.parse_args()
     from config import Config
     config = Config()
+    if args.profile:
+        config.set("profile", True)
+    metrics_exporter = start_metrics_exporter(config.get("metrics", {}))
     sorter = FileSorter(config)
     associations_file = config.get("associations_file", "associations.json")
     sorter.load_associations(associations_file)
+    sorter.load_ai_model()
     log = sorter.sort_files()
     print("Sorting completed. Log:")
     print(json.dumps(log, indent=4))
+    if metrics_exporter:
+        metrics_exporter.stop()
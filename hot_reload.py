@@ -0,0 +1,132 @@
+import os, json, logging, threading
+from config import Config, ASSOCIATIONS_FILE
+from utils import KeywordIndex
+from associations_store import open_associations
+
+def file_stamp(path):
+    """(mtime_ns, size) of a file, or the newest of the files in a directory (model artifacts); None if missing."""
+    if not path or not os.path.exists(path):
+        return None
+    if not os.path.isdir(path):
+        st = os.stat(path)
+        return (st.st_mtime_ns, st.st_size)
+    stamps = [file_stamp(os.path.join(path, name)) for name in os.listdir(path)]
+    stamps = [stamp for stamp in stamps if stamp is not None]
+    return (max(stamp[0] for stamp in stamps), sum(stamp[1] for stamp in stamps)) if stamps else None
+
+class SorterSnapshot:
+    """One version of everything sorting decisions depend on. Never changed after it is built."""
+    def __init__(self, version, config, associations, keyword_index, embedding_index, ai_model, stamps, paths):
+        self.version = version
+        self.config = config
+        self.associations = associations
+        self.keyword_index = keyword_index
+        self.embedding_index = embedding_index
+        self.ai_model = ai_model
+        self.stamps = stamps
+        self.paths = paths  # {"associations": file, "model": path} the snapshot was loaded from
+
+class SnapshotManager:
+    """
+    Builds SorterSnapshots from the config file, the associations file and the AI model artifact, and
+    rebuilds them on a background thread when those change on disk. `current` is replaced by a single
+    assignment, so a reader always gets a complete version; FileSorter pins one for each run.
+    Unchanged parts (the AI model, the embedder and unchanged embedding rows) are carried over.
+    """
+    def __init__(self, config_file, associations_file=None, model_path=None, interval=2.0):
+        self.config_file = config_file
+        self.associations_file = associations_file
+        self.model_path = model_path
+        self.interval = interval
+        self.current = None
+        self._failed_stamps = None  # Files that failed to build are retried only once they change again.
+        self._stop = threading.Event()
+        self._thread = None
+
+    def _paths(self, config):
+        from ai_model import default_model_dir
+        associations_file = self.associations_file or config.get("associations_file", ASSOCIATIONS_FILE)
+        # Without ai_model_path the model lives in its backend's default directory; watch that one.
+        model_path = (self.model_path or config.get("ai_model_path")
+                      or default_model_dir(config.get("ai_backend", "transformer")))
+        return associations_file, model_path
+
+    def _stamps(self, config):
+        associations_file, model_path = self._paths(config)
+        return {"config": file_stamp(self.config_file), "associations": file_stamp(associations_file),
+                "model": file_stamp(model_path)}
+
+    def build(self, previous=None):
+        from ai_model import create_ai_model
+        if os.path.exists(self.config_file):
+            with open(self.config_file, "r") as f:
+                json.load(f)  # Config() falls back to defaults on a half-written file; raise instead and keep the old snapshot.
+        config = Config(self.config_file)
+        stamps = self._stamps(config)
+        associations_file, model_path = self._paths(config)
+        associations, keyword_index = {}, None
+        if os.path.exists(associations_file):
+            associations, keyword_index = open_associations(associations_file)
+        ai_backend = config.get("ai_backend", "transformer")
+        inference_backend = config.get("ai_inference", {}).get("backend", "eager")
+        if (previous is not None and previous.stamps["model"] == stamps["model"]
+                and previous.config.get("ai_backend", "transformer") == ai_backend
+                and previous.config.get("ai_inference", {}).get("backend", "eager") == inference_backend):
+            ai_model = previous.ai_model
+        else:
+            ai_model = create_ai_model(ai_backend, inference_backend=inference_backend)
+            if not ai_model.load(model_path):
+                logging.info("No trained AI model found for the new snapshot.")
+        return SorterSnapshot((previous.version + 1) if previous else 1, config, associations, keyword_index or KeywordIndex(associations),
+                              self._build_embedding_index(config, associations, previous), ai_model, stamps,
+                              {"associations": associations_file, "model": model_path})
+
+    def _build_embedding_index(self, config, associations, previous):
+        settings = config.get("embedding_index", {})
+        if not settings.get("enabled", False):
+            return None
+        from embedding_index import FolderEmbeddingIndex, DEFAULT_EMBEDDING_MODEL
+        old = previous.embedding_index if previous is not None else None
+        index = FolderEmbeddingIndex(index_file=settings.get("index_file", "folder_embeddings.npz"),
+                                     model_name=settings.get("model", DEFAULT_EMBEDDING_MODEL),
+                                     batch_size=settings.get("batch_size", 32))
+        if old is not None and old.model_name == index.model_name:
+            # update() replaces these rather than changing them, so the old snapshot keeps its own.
+            index._embedder = old._embedder
+            index.folders, index.fingerprints, index.matrix = old.folders, old.fingerprints, old.matrix
+        else:
+            index.load()
+        index.update(associations)
+        return index
+
+    def poll(self):
+        """Rebuilds and swaps in a new snapshot if any watched file changed. Returns True on a swap."""
+        current = self.current
+        stamps = None
+        try:
+            if current is not None:
+                stamps = self._stamps(current.config)
+                if stamps in (current.stamps, self._failed_stamps):
+                    return False
+            self.current = self.build(current)
+        except Exception as e:
+            self._failed_stamps = stamps
+            logging.error(f"Error rebuilding sorter snapshot; keeping version {current.version if current else None}: {e}")
+            return False
+        logging.info(f"Sorter snapshot version {self.current.version} loaded.")
+        return True
+
+    def start(self):
+        self.poll()  # The first snapshot is built before anyone needs it.
+        self._thread = threading.Thread(target=self._watch, name="snapshot-watcher", daemon=True)
+        self._thread.start()
+        return self
+
+    def _watch(self):
+        while not self._stop.wait(self.interval):
+            self.poll()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
@@ -0,0 +1,238 @@
+import os, sys, json, time, signal, socket, socketserver, threading, queue, logging, argparse
+from concurrent.futures import Future
+from config import INFERENCE_SOCKET
+from metrics import REGISTRY, MetricsExporter
+
+class MicroBatcher:
+    """
+    Coalesces concurrent requests into one handler call. A batch is dispatched when it
+    reaches max_batch items or when its first item has waited max_wait seconds.
+    """
+    def __init__(self, handler, max_batch=32, max_wait=0.01, name="batcher"):
+        self.handler = handler
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.queue = queue.Queue()
+        self.batches = 0
+        self.items = 0
+        self._thread = threading.Thread(target=self._run, name=name, daemon=True)
+        self._thread.start()
+
+    def submit(self, item):
+        future = Future()
+        self.queue.put((item, future))
+        return future
+
+    def close(self):
+        self.queue.put(None)
+        self._thread.join()
+
+    def _run(self):
+        while True:
+            first = self.queue.get()
+            if first is None:
+                return
+            batch = [first]
+            deadline = time.monotonic() + self.max_wait
+            while len(batch) < self.max_batch:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    entry = self.queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                if entry is None:
+                    self.queue.put(None)  # Finish this batch, then stop.
+                    break
+                batch.append(entry)
+            self.batches += 1
+            self.items += len(batch)
+            REGISTRY.inc("inference_batches_total", batcher=self._thread.name)
+            REGISTRY.inc("inference_requests_total", len(batch), batcher=self._thread.name)
+            REGISTRY.set("queue_depth", self.queue.qsize(), queue=self._thread.name)
+            try:
+                results = list(self.handler([item for item, _ in batch]))
+            except Exception as e:
+                results, error = [], e
+            else:
+                error = RuntimeError(f"{self._thread.name} returned {len(results)} results for {len(batch)} requests.")
+            for (_, future), result in zip(batch, results):
+                future.set_result(result)
+            for _, future in batch[len(results):]:  # Never leave a caller waiting on a short batch.
+                future.set_exception(error)
+
+class InferenceService:
+    """Hosts one AI model and (lazily) the T5 paraphraser for every client on this machine."""
+    def __init__(self, model_path=None, ai_backend="transformer", load_paraphraser=True, max_batch=32, max_wait=0.01):
+        from ai_model import create_ai_model
+        self.ai_model = create_ai_model(ai_backend)
+        model_path = model_path or self.ai_model.model_dir
+        if not self.ai_model.load(model_path):
+            raise RuntimeError(f"No trained AI model found at {model_path}")
+        self.load_paraphraser = load_paraphraser
+        self._paraphraser = None
+        self._paraphraser_lock = threading.Lock()
+        self.predict_batcher = MicroBatcher(self._predict_batch, max_batch, max_wait, name="predict-batcher")
+        self.paraphrase_batcher = MicroBatcher(self._paraphrase_batch, max_batch, max_wait, name="paraphrase-batcher")
+
+    @property
+    def paraphraser(self):
+        with self._paraphraser_lock:
+            if self._paraphraser is None:
+                if not self.load_paraphraser:
+                    raise RuntimeError("Paraphraser is disabled on this inference server.")
+                from associations import get_paraphraser
+                self._paraphraser = get_paraphraser()
+                if self._paraphraser is None:
+                    raise RuntimeError("Paraphraser model could not be loaded.")
+            return self._paraphraser
+
+    def _predict_batch(self, texts):
+        return [[label, conf] for label, conf in self.ai_model.predict_batch(texts)]
+
+    def _paraphrase_batch(self, items):
+        # Requests with the same generation options share a pipeline call.
+        groups = {}
+        for i, (prompt, options) in enumerate(items):
+            groups.setdefault(json.dumps(options, sort_keys=True), []).append((i, prompt))
+        results = [None] * len(items)
+        for key, members in groups.items():
+            outputs = self.paraphraser([prompt for _, prompt in members], **json.loads(key))
+            for (i, _), output in zip(members, outputs):
+                output = output if isinstance(output, list) else [output]
+                results[i] = [res.get("generated_text", "").strip() for res in output]
+        return results
+
+    def handle(self, request):
+        op = request.get("op")
+        if op == "ping":
+            return {"model_load_time": getattr(self.ai_model, "load_time", None),
+                    "queue_depth": self.predict_batcher.queue.qsize() + self.paraphrase_batcher.queue.qsize(),
+                    "predict_batches": self.predict_batcher.batches, "predict_items": self.predict_batcher.items}
+        if op == "predict":
+            futures = [self.predict_batcher.submit(str(text)) for text in request.get("texts", [])]
+            return [future.result() for future in futures]
+        if op == "paraphrase":
+            options = request.get("options", {})
+            futures = [self.paraphrase_batcher.submit((str(prompt), options)) for prompt in request.get("prompts", [])]
+            return [future.result() for future in futures]
+        raise ValueError(f"Unknown operation: {op}")
+
+class _RequestHandler(socketserver.StreamRequestHandler):
+    # One JSON request per line, one JSON response per line.
+    def handle(self):
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            try:
+                response = {"ok": True, "result": self.server.service.handle(json.loads(line))}
+            except Exception as e:
+                response = {"ok": False, "error": str(e)}
+            self.wfile.write((json.dumps(response) + "\n").encode("utf-8"))
+            self.wfile.flush()
+
+if hasattr(socketserver, "ThreadingUnixStreamServer"):
+    class InferenceServer(socketserver.ThreadingUnixStreamServer):
+        daemon_threads = True
+        request_queue_size = 128  # Many processes may connect at once during a run.
+
+        def __init__(self, socket_path, service):
+            if os.path.exists(socket_path):
+                if InferenceClient(socket_path, timeout=1).is_available():
+                    raise RuntimeError(f"An inference server is already listening on {socket_path}")
+                os.unlink(socket_path)  # Stale socket left by a crashed server.
+            self.service = service
+            super().__init__(socket_path, _RequestHandler)
+
+        def server_close(self):
+            super().server_close()
+            if os.path.exists(self.server_address):
+                os.unlink(self.server_address)
+
+class InferenceClient:
+    """Thread-safe client for a local inference server. Mirrors the predict API of the AI models."""
+    def __init__(self, socket_path=INFERENCE_SOCKET, timeout=30.0):
+        self.socket_path = socket_path
+        self.timeout = timeout
+        self._sock = None
+        self._reader = None
+        self._lock = threading.Lock()
+
+    def _connect(self):
+        if not hasattr(socket, "AF_UNIX"):
+            raise OSError("Unix sockets are not supported on this platform.")
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        sock.connect(self.socket_path)
+        sock.settimeout(self.timeout)
+        self._sock = sock
+        self._reader = sock.makefile("rb")
+
+    def close(self):
+        with self._lock:
+            if self._sock is not None:
+                self._reader.close()
+                self._sock.close()
+                self._sock = self._reader = None
+
+    def _call(self, request):
+        with self._lock:
+            try:
+                if self._sock is None:
+                    self._connect()
+                self._sock.sendall((json.dumps(request) + "\n").encode("utf-8"))
+                line = self._reader.readline()
+                if not line:
+                    raise ConnectionError("Inference server closed the connection.")
+            except OSError:
+                if self._sock is not None:
+                    self._sock.close()
+                self._sock = self._reader = None
+                raise
+        response = json.loads(line)
+        if not response.get("ok"):
+            raise RuntimeError(f"Inference server error: {response.get('error')}")
+        return response["result"]
+
+    def is_available(self):
+        try:
+            self._call({"op": "ping"})
+            return True
+        except (OSError, RuntimeError, ValueError):
+            return False
+
+    def predict_batch(self, texts):
+        return [tuple(result) for result in self._call({"op": "predict", "texts": list(texts)})]
+
+    def predict(self, text):
+        return self.predict_batch([text])[0]
+
+    def paraphrase(self, prompt, **options):
+        return self._call({"op": "paraphrase", "prompts": [prompt], "options": options})[0]
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Shared AmazeSort inference server (Unix socket).")
+    parser.add_argument("--socket", default=INFERENCE_SOCKET, help="Path of the Unix socket to listen on.")
+    parser.add_argument("--model", default=None, help="Trained model artifact to serve.")
+    parser.add_argument("--backend", default="transformer", help="AI backend: transformer or tfidf.")
+    parser.add_argument("--max-batch", type=int, default=32)
+    parser.add_argument("--max-wait-ms", type=float, default=10.0, help="Longest a request waits for its batch to fill.")
+    parser.add_argument("--no-paraphraser", action="store_true", help="Do not serve the T5 paraphraser.")
+    parser.add_argument("--metrics-port", type=int, default=0, help="Serve Prometheus metrics on this local port.")
+    parser.add_argument("--metrics-textfile", help="Write Prometheus metrics to this textfile-collector file.")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO)
+    if not hasattr(socketserver, "ThreadingUnixStreamServer"):
+        sys.exit("Unix sockets are not supported on this platform.")
+    service = InferenceService(args.model, args.backend, load_paraphraser=not args.no_paraphraser,
+                               max_batch=args.max_batch, max_wait=args.max_wait_ms / 1000.0)
+    if args.metrics_port or args.metrics_textfile:
+        MetricsExporter(textfile=args.metrics_textfile, http_port=args.metrics_port).start()
+    signal.signal(signal.SIGTERM, lambda signum, frame: sys.exit(0))  # Still removes the socket file.
+    with InferenceServer(args.socket, service) as server:
+        logging.info(f"Inference server listening on {args.socket}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
@@ -0,0 +1,93 @@
+import os, logging, threading
+from concurrent.futures import ThreadPoolExecutor
+
+def device_of(path):
+    try:
+        return os.stat(path).st_dev
+    except OSError:
+        return None
+
+def is_rotational(device):
+    """True for spinning disks, False for SSD/NVMe, None where the kernel does not say (non-Linux, network, tmpfs)."""
+    if device is None or not os.path.isdir("/sys/dev/block"):
+        return None
+    block = os.path.realpath(f"/sys/dev/block/{os.major(device)}:{os.minor(device)}")
+    # A partition's queue settings live in its parent disk's directory.
+    for candidate in (block, os.path.dirname(block)):
+        try:
+            with open(os.path.join(candidate, "queue", "rotational"), "r") as f:
+                return f.read().strip() == "1"
+        except OSError:
+            continue
+    return None
+
+class IOScheduler:
+    """
+    Runs per-file I/O (hashing, PDF reads) grouped by the device it touches. Each device gets its own
+    thread pool sized by its type, and on spinning disks requests are issued in directory/inode order
+    so reads stay close to sequential.
+    """
+    def __init__(self, hdd_concurrency=1, ssd_concurrency=8, default_concurrency=4):
+        self.limits = {True: hdd_concurrency, False: ssd_concurrency, None: default_concurrency}
+        self._rotational = {}
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def rotational(self, device):
+        if device not in self._rotational:
+            self._rotational[device] = is_rotational(device)
+        return self._rotational[device]
+
+    def concurrency(self, device):
+        return max(1, self.limits[self.rotational(device)])
+
+    def _pool(self, device):
+        with self._lock:
+            pool = self._pools.get(device)
+            if pool is None:
+                pool = self._pools[device] = ThreadPoolExecutor(self.concurrency(device), thread_name_prefix=f"io-{device}")
+            return pool
+
+    def group(self, paths, stats=None):
+        """{device: [paths]} with each group in the order its requests should be issued. stats: known {path: stat}."""
+        groups = {}
+        for path in paths:
+            try:
+                st = stats.get(path) if stats else None
+                if st is None:
+                    st = os.stat(path)
+                groups.setdefault(st.st_dev, []).append((os.path.dirname(path), st.st_ino, path))
+            except OSError:
+                groups.setdefault(None, []).append(("", 0, path))
+        ordered = {}
+        for device, entries in groups.items():
+            if device is not None and self.rotational(device) is not False:
+                entries.sort()
+            ordered[device] = [path for _, _, path in entries]
+        return ordered
+
+    def submit(self, func, paths, stats=None):
+        """Schedules func(path) for every path; returns {path: Future}."""
+        futures = {}
+        for device, group in self.group(paths, stats).items():
+            pool = self._pool(device)
+            for path in group:
+                futures[path] = pool.submit(func, path)
+        return futures
+
+    def map(self, func, paths, stats=None):
+        """{path: func(path)}; a path whose call raised maps to None."""
+        results = {}
+        for path, future in self.submit(func, paths, stats).items():
+            try:
+                results[path] = future.result()
+            except Exception as e:
+                logging.error(f"I/O error for {path}: {e}")
+                results[path] = None
+        return results
+
+    def close(self, wait=True):
+        with self._lock:
+            pools, self._pools = self._pools, {}
+        for pool in pools.values():
+            pool.shutdown(wait=wait, cancel_futures=not wait)
@@ -4,7 +4,9 @@ from PySide6.QtWidgets import QVBoxLayout, QGroupBox, QPushButton, QLabel, QProg
 from PySide6.QtGui import QAction, QTextCursor
 from config import Config
 from file_sorter import FileSorter
-from ai_model import TransformerAIModel
+from ai_model import create_ai_model
+from training_cache import TrainingCache, fingerprint, directory_signature
+from metrics import start_metrics_exporter
 from associations import generate_associations
 from associations import scan_directory_structure  # For completeness; used by worker threads
 import utils, traceback
@@ -95,13 +97,14 @@ class AssociationsWorker(QtCore.QThread):
     log_signal = QtCore.Signal(str)
     finished = QtCore.Signal(dict)  # Return associations dictionary
 
-    def __init__(self, dest_dir, guidebook_file, output_file, update_mode, retain_old, parent=None):
+    def __init__(self, dest_dir, guidebook_file, output_file, update_mode, retain_old, inference_server=None, parent=None):
         super().__init__(parent)
         self.dest_dir = dest_dir
         self.guidebook_file = guidebook_file
         self.output_file = output_file
         self.update_mode = update_mode
         self.retain_old = retain_old
+        self.inference_server = inference_server
         self._is_running = True
 
     def run(self):
@@ -114,7 +117,8 @@ class AssociationsWorker(QtCore.QThread):
             # Generate associations with progress callback.
             associations = generate_associations(self.dest_dir, self.guidebook_file, output_file=self.output_file,
                                                  update_mode=self.update_mode, retain_old=self.retain_old,
-                                                 progress_callback=self.progress_callback)
+                                                 progress_callback=self.progress_callback,
+                                                 inference_server=self.inference_server)
 
             self.log_signal.emit("Associations generation completed.")
             self.finished.emit(associations)
@@ -138,18 +142,21 @@ class TrainWorker(QtCore.QThread):
     log_signal = QtCore.Signal(str)
     finished = QtCore.Signal()
 
-    def __init__(self, guidebook, dest_dir, dictionary=None, parent=None):
+    def __init__(self, guidebook, dest_dir, dictionary=None, config=None, parent=None):
         """
         guidebook: A dictionary loaded from your guidebook file (e.g., syllabus.json)
         dest_dir: The root destination directory to scan recursively.
         dictionary: (Optional) A dictionary from extra training examples (e.g., dictionary.json)
+        config: (Optional) The app Config, used for training and export settings.
         """
         super().__init__(parent)
         self._is_running = True
         self.guidebook = guidebook or {}
         self.dest_dir = dest_dir
         self.dictionary = dictionary or {}
-        self.transformer_ai = TransformerAIModel()
+        self.config = config
+        backend = config.get("ai_backend", "transformer") if config else "transformer"
+        self.transformer_ai = create_ai_model(backend)
 
     def build_training_dataset(self):
         """
@@ -213,10 +220,28 @@ class TrainWorker(QtCore.QThread):
 
         return texts, labels
 
+    def load_training_dataset(self, cache_dir=None):
+        # Reuses the examples of an earlier run when the guidebook, dictionary and destination folders are unchanged.
+        if not cache_dir:
+            return self.build_training_dataset()
+        cache = TrainingCache(cache_dir)
+        key = fingerprint(self.guidebook, self.dictionary, directory_signature(self.dest_dir))
+        cached = cache.load_examples(key)
+        if cached is not None:
+            self.log_signal.emit("Inputs unchanged since the last run; using cached training examples.")
+            return cached
+        texts, labels = self.build_training_dataset()
+        try:
+            cache.save_examples(key, texts, labels)
+        except OSError as e:
+            self.log_signal.emit(f"Could not cache training examples: {e}")
+        return texts, labels
+
     def run(self):
         try:
+            training = dict(self.config.get("training", {})) if self.config else {}
             self.log_signal.emit("Building training dataset (recursively)...")
-            texts, labels = self.build_training_dataset()
+            texts, labels = self.load_training_dataset(training.get("cache_dir"))
             num_examples = len(texts)
             self.log_signal.emit(f"Training dataset built with {num_examples} examples.")
             if num_examples == 0:
@@ -230,17 +255,36 @@ class TrainWorker(QtCore.QThread):
                     mapped_val = int(val)
                     self.progress.emit(mapped_val)
                     self.log_signal.emit(f"Training progress: {val}%")
-            self.log_signal.emit("Starting transformer model training...")
-            # Increase epochs and adjust parameters as needed.
-            self.transformer_ai.train(texts, labels, output_dir="transformer_model", epochs=5, progress_callback=progress_callback)
-            self.log_signal.emit("Transformer model training completed.")
+            self.log_signal.emit("Starting AI model training...")
+            epochs = training.pop("epochs", 5)
+            self.transformer_ai.train(texts, labels, output_dir=self.transformer_ai.model_dir, epochs=epochs,
+                                      progress_callback=progress_callback, log_callback=self.log_signal.emit, **training)
+            if not self._is_running:
+                self.log_signal.emit("AI model training cancelled; it will resume from its last checkpoint next time.")
+                self.finished.emit()
+                return
+            self.log_signal.emit("AI model training completed.")
+            self.export_inference_model(texts)
         except Exception as e:
             err = traceback.format_exc()
             self.log_signal.emit(f"Training error: {e}\n{err}")
         self.finished.emit()
 
+    def export_inference_model(self, sample_texts):
+        inference = self.config.get("ai_inference", {}) if self.config else {}
+        backend = inference.get("backend", "eager")
+        if not inference.get("export_after_training", False) or backend == "eager" or not hasattr(self.transformer_ai, "export"):
+            return
+        self.log_signal.emit(f"Exporting optimized {backend} inference model...")
+        agreement = self.transformer_ai.export(self.transformer_ai.model_dir, backend=backend,
+                                               quantize=inference.get("quantize", True),
+                                               sample_texts=sample_texts,
+                                               min_agreement=inference.get("min_agreement", 0.95))
+        self.log_signal.emit(f"Exported {backend} model agrees with fp32 predictions on {agreement:.2%} of examples.")
+
     def stop(self):
         self._is_running = False
+        self.transformer_ai.stop()
 
 class SortWorker(QtCore.QThread):
     progress = QtCore.Signal(int)
@@ -265,6 +309,7 @@ class MainWindow(QtWidgets.QMainWindow):
         super().__init__()
         self.config = config
         self.sorter = FileSorter(self.config)
+        self.metrics_exporter = start_metrics_exporter(self.config.get("metrics", {}))
         self.setWindowTitle("AmazeSort : Python-based file sorter.")
         # Increase the default width to ensure the ribbon is fully visible.
         width = self.config.get("ui", {}).get("window_width", 1200)
@@ -600,7 +645,8 @@ class MainWindow(QtWidgets.QMainWindow):
         retain_old = self.config.get("retain_old_associations", True)
         dest_dir = self.sorter.dest_heads[0] if self.sorter.dest_heads else os.getcwd()
         # Start AssociationsWorker first.
-        self.assoc_worker = AssociationsWorker(dest_dir, guidebook_file, associations_file, update_mode, retain_old)
+        self.assoc_worker = AssociationsWorker(dest_dir, guidebook_file, associations_file, update_mode, retain_old,
+                                               self.config.get("inference_server"))
         self.assoc_worker.progress.connect(lambda p: self.progress_bar.setValue(p))
         self.assoc_worker.log_signal.connect(lambda msg: self.append_log(msg))
         self.assoc_worker.finished.connect(self.after_associations_generated)
@@ -613,7 +659,7 @@ class MainWindow(QtWidgets.QMainWindow):
         utils.prevent_sleep()
         self.log_text.append("Associations generation completed. Starting AI model training...")
         dest_dir = self.sorter.dest_heads[0] if self.sorter.dest_heads else os.getcwd()
-        self.train_worker = TrainWorker(self.sorter.syllabus, dest_dir)
+        self.train_worker = TrainWorker(self.sorter.syllabus, dest_dir, config=self.config)
         self.train_worker.progress.connect(lambda p: self.progress_bar.setValue(int(p)))
         self.train_worker.log_signal.connect(lambda msg: self.append_log(msg))
         self.train_worker.finished.connect(lambda: self.append_log("Training Completed!"))
@@ -627,6 +673,7 @@ class MainWindow(QtWidgets.QMainWindow):
         self.sorter.dest_heads = [self.dest_list.item(i).text() for i in range(self.dest_list.count())]
         associations_file = self.config.get("associations_file", "associations.json")
         self.sorter.load_associations(associations_file)
+        self.sorter.load_ai_model()
         # Create and start new SortWorker with the FileSorter connection.
         self.sort_worker = SortWorker(self.sorter)
         self.sort_worker.progress.connect(self.progress_bar.setValue)
@@ -669,6 +716,11 @@ class MainWindow(QtWidgets.QMainWindow):
         import webbrowser
         webbrowser.open("https://your-wiki-url.com")  # Replace with actual wiki URL
 
+    def closeEvent(self, event):
+        if self.metrics_exporter:
+            self.metrics_exporter.stop()
+        super().closeEvent(event)
+
 if __name__ == "__main__":
     app = QtWidgets.QApplication(sys.argv)
     style_sheet = """
@@ -0,0 +1,102 @@
+"""
+Heap accounting for sort runs. Uses tracemalloc, so it only counts Python allocations (file lists,
+clusters, the run log, extracted PDF text); model weights held by torch/numpy are mostly outside it.
+"""
+import os, json, logging, tracemalloc, contextlib
+
+MB = 1024 * 1024
+
+class MemoryBudget:
+    """
+    Tracks the traced heap against budget_mb and records the peak of each stage.
+    With budget_mb = 0 and trace off, every method is a cheap no-op.
+    """
+    def __init__(self, budget_mb=0, high_water=0.8, trace=False):
+        self.budget = int(budget_mb * MB)
+        self.high_water = high_water
+        self.enabled = bool(self.budget) or trace
+        self.peaks = {}
+        self.warned = False
+        self._stack = []  # Peak seen by each enclosing stage before its current child reset it.
+        self._started = False
+
+    def start(self):
+        if self.enabled and not tracemalloc.is_tracing():
+            tracemalloc.start()
+            self._started = True
+        self.peaks = {}
+        self._stack = []
+
+    def stop(self):
+        if self._started:
+            tracemalloc.stop()
+            self._started = False
+
+    def current(self):
+        return tracemalloc.get_traced_memory()[0] if self.enabled and tracemalloc.is_tracing() else 0
+
+    def near_limit(self):
+        return bool(self.budget) and self.current() >= self.budget * self.high_water
+
+    @contextlib.contextmanager
+    def stage(self, name):
+        if not (self.enabled and tracemalloc.is_tracing()):
+            yield
+            return
+        if self._stack:
+            self._stack[-1] = max(self._stack[-1], tracemalloc.get_traced_memory()[1])
+        self._stack.append(0)
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            peak = max(self._stack.pop(), tracemalloc.get_traced_memory()[1])
+            self.peaks[name] = max(self.peaks.get(name, 0), peak)
+
+    def summary(self):
+        return {"budget_mb": round(self.budget / MB, 1), "current_mb": round(self.current() / MB, 1),
+                "stage_peak_mb": {name: round(peak / MB, 1) for name, peak in self.peaks.items()}}
+
+    def snapshot(self, path, limit=30):
+        """Writes the source lines holding the most traced memory to a text file."""
+        if not tracemalloc.is_tracing():
+            return None
+        stats = tracemalloc.take_snapshot().statistics("lineno")
+        with open(path, "w", encoding="utf-8") as f:
+            f.write(f"Traced memory: {self.current() / MB:.1f} MB\n")
+            for stat in stats[:limit]:
+                f.write(f"{stat}\n")
+        return path
+
+class LogSpill:
+    """Appends run-log entries to JSON-lines files so the in-memory lists can be emptied."""
+    def __init__(self, base_path):
+        self.base_path = base_path
+        self.counts = {}
+
+    def path(self, key):
+        return f"{self.base_path}.{key.lower()}.jsonl"
+
+    def discard(self, keys):
+        for key in keys:
+            if os.path.exists(self.path(key)):
+                os.remove(self.path(key))
+
+    def spill(self, log, keys):
+        for key in keys:
+            entries = log.get(key)
+            if not entries:
+                continue
+            count = len(entries)  # Mover threads may append while this runs; later entries stay for the next spill.
+            try:
+                with open(self.path(key), "a", encoding="utf-8") as f:
+                    for entry in entries[:count]:
+                        f.write(json.dumps(entry, default=str) + "\n")
+            except OSError as e:
+                logging.error(f"Error spilling {key} log entries: {e}")
+                continue
+            self.counts[key] = self.counts.get(key, 0) + count
+            del entries[:count]
+
+    def summary(self):
+        return {key: {"file": os.path.abspath(self.path(key)), "entries": count} for key, count in self.counts.items()}
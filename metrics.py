@@ -0,0 +1,183 @@
+"""
+Prometheus-style metrics for sort, training and association jobs.
+
+Jobs update the process-wide REGISTRY. A MetricsExporter writes it periodically and atomically to a
+node_exporter textfile-collector file, and can also serve it on a local HTTP port.
+"""
+import os, time, logging, threading, functools
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+METRIC_PREFIX = "amazesort"
+METRIC_HELP = {
+    "job_running": "Whether the job is currently running.",
+    "job_duration_seconds": "Job run durations.",
+    "job_last_success_timestamp_seconds": "Unix time of the last successful run.",
+    "job_failures_total": "Job runs that raised an error.",
+    "stage_duration_seconds": "Time spent per pipeline stage.",
+    "files_discovered_total": "Files found in the source folders.",
+    "files_processed_total": "Files handled by sort runs, by outcome.",
+    "bytes_processed_total": "Bytes of files moved by sort runs.",
+    "duplicates_total": "Files skipped as duplicates.",
+    "decisions_total": "Cluster destination decisions, by deciding method.",
+    "errors_total": "Errors, by job and kind.",
+    "queue_depth": "Items waiting in a work queue.",
+    "model_load_seconds": "Time taken to load the AI model.",
+    "memory_peak_bytes": "Peak traced heap per stage of the latest run.",
+    "training_examples": "Examples used by the latest training run.",
+    "training_epochs_total": "Training epochs completed.",
+    "training_samples_per_second": "Training throughput of the latest epoch.",
+    "association_folders_total": "Folders enriched with associations.",
+    "inference_batches_total": "Micro-batches run by the inference server.",
+    "inference_requests_total": "Requests answered by the inference server.",
+}
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+class MetricsRegistry:
+    """Thread-safe counters, gauges and summaries (sum/count) keyed by name and labels."""
+    def __init__(self, prefix=METRIC_PREFIX):
+        self.prefix = prefix
+        self._lock = threading.Lock()
+        self._metrics = {}  # name -> [type, help, {sorted label items: value}]
+
+    def _series(self, name, kind, help_text):
+        metric = self._metrics.get(name)
+        if metric is None:
+            metric = self._metrics[name] = [kind, help_text or METRIC_HELP.get(name, ""), {}]
+        return metric[2]
+
+    def inc(self, name, value=1, help_text="", **labels):
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series(name, "counter", help_text)
+            series[key] = series.get(key, 0) + value
+
+    def set(self, name, value, help_text="", **labels):
+        with self._lock:
+            self._series(name, "gauge", help_text)[tuple(sorted(labels.items()))] = value
+
+    def observe(self, name, value, count=1, help_text="", **labels):
+        # `value` may be the sum of `count` observations, so a whole run's samples can be added at once.
+        key = tuple(sorted(labels.items()))
+        with self._lock:
+            series = self._series(name, "summary", help_text)
+            total, n = series.get(key, (0.0, 0))
+            series[key] = (total + value, n + count)
+
+    def render(self):
+        """The registry in the Prometheus text exposition format."""
+        lines = []
+        with self._lock:
+            for name, (kind, help_text, series) in sorted(self._metrics.items()):
+                full_name = f"{self.prefix}_{name}"
+                if help_text:
+                    lines.append(f"# HELP {full_name} {help_text}")
+                lines.append(f"# TYPE {full_name} {kind}")
+                for key, value in sorted(series.items()):
+                    labels = ",".join(f'{k}="{_escape(v)}"' for k, v in key)
+                    labels = "{" + labels + "}" if labels else ""
+                    if kind == "summary":
+                        lines.append(f"{full_name}_sum{labels} {value[0]}")
+                        lines.append(f"{full_name}_count{labels} {value[1]}")
+                    else:
+                        lines.append(f"{full_name}{labels} {value}")
+        return "\n".join(lines) + "\n"
+
+    def write_textfile(self, path):
+        # node_exporter may read at any moment: write a temp file in the same directory, then rename over.
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            f.write(self.render())
+        os.replace(tmp_path, path)
+
+REGISTRY = MetricsRegistry()
+
+def track_job(job, registry=REGISTRY):
+    """Decorator recording running state, duration, last success time and failures of a job function."""
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            registry.set("job_running", 1, job=job)
+            start = time.perf_counter()
+            try:
+                result = func(*args, **kwargs)
+            except Exception:
+                registry.inc("job_failures_total", job=job)
+                raise
+            else:
+                registry.set("job_last_success_timestamp_seconds", time.time(), job=job)
+                return result
+            finally:
+                registry.observe("job_duration_seconds", time.perf_counter() - start, job=job)
+                registry.set("job_running", 0, job=job)
+        return wrapper
+    return decorator
+
+class _MetricsHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        if self.path not in ("/", "/metrics"):
+            self.send_error(404)
+            return
+        body = self.server.registry.render().encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "text/plain; version=0.0.4; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        pass
+
+class MetricsExporter:
+    """Writes the registry to a textfile every `interval` seconds and optionally serves it over HTTP."""
+    def __init__(self, registry=REGISTRY, textfile=None, interval=15, http_port=0, http_host="127.0.0.1"):
+        self.registry = registry
+        self.textfile = textfile
+        self.interval = interval
+        self.http_port = http_port
+        self.http_host = http_host
+        self._stop = threading.Event()
+        self._thread = None
+        self._server = None
+
+    def start(self):
+        if self.textfile:
+            self._thread = threading.Thread(target=self._write_loop, name="metrics-writer", daemon=True)
+            self._thread.start()
+        if self.http_port:
+            self._server = ThreadingHTTPServer((self.http_host, self.http_port), _MetricsHandler)
+            self._server.registry = self.registry
+            threading.Thread(target=self._server.serve_forever, name="metrics-http", daemon=True).start()
+            logging.info(f"Serving metrics on http://{self.http_host}:{self.http_port}/metrics")
+        return self
+
+    def write(self):
+        try:
+            self.registry.write_textfile(self.textfile)
+        except OSError as e:
+            logging.error(f"Error writing metrics to {self.textfile}: {e}")
+
+    def _write_loop(self):
+        while not self._stop.wait(self.interval):
+            self.write()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread is not None:
+            self._thread.join()
+            self.write()  # Final values of a finished job.
+        if self._server is not None:
+            self._server.shutdown()
+            self._server.server_close()
+
+def start_metrics_exporter(settings):
+    """Starts an exporter from the "metrics" config section; returns None when metrics are disabled."""
+    if not settings or not settings.get("enabled", False):
+        return None
+    try:
+        return MetricsExporter(textfile=settings.get("textfile") or None, interval=settings.get("interval", 15),
+                               http_port=settings.get("http_port", 0), http_host=settings.get("http_host", "127.0.0.1")).start()
+    except OSError as e:
+        logging.error(f"Could not start metrics exporter: {e}")
+        return None
@@ -44,8 +44,11 @@ class SettingsDialog(QtWidgets.QDialog):
         self.skip_dup_checkbox.setChecked(dup_handling.get("skip_duplicates", True))
         self.rename_dup_checkbox = QtWidgets.QCheckBox("Rename duplicates")
         self.rename_dup_checkbox.setChecked(dup_handling.get("rename_duplicates", False))
+        self.overwrite_checkbox = QtWidgets.QCheckBox("Overwrite existing files with the same name")
+        self.overwrite_checkbox.setChecked(dup_handling.get("overwrite_existing", False))
         dedup_layout.addRow(self.skip_dup_checkbox)
         dedup_layout.addRow(self.rename_dup_checkbox)
+        dedup_layout.addRow(self.overwrite_checkbox)
         
         # Association update options
         assoc_group = QtWidgets.QGroupBox("Association Update Settings")
@@ -91,16 +94,20 @@ class SettingsDialog(QtWidgets.QDialog):
             self.config.set("score_threshold", float(self.score_threshold_edit.text()))
         except ValueError:
             pass
-        method_strengths = {
+        # Keep strengths for methods that have no field in this dialog (e.g. "embedding").
+        method_strengths = dict(self.config.get("method_strengths", {}))
+        method_strengths.update({
             "rule_based": float(self.rule_based_edit.text()),
             "hybrid": float(self.hybrid_edit.text()),
             "ai_based": float(self.ai_based_edit.text())
-        }
+        })
         self.config.set("method_strengths", method_strengths)
-        dup_settings = {
+        dup_settings = dict(self.config.get("duplicate_handling", {}))
+        dup_settings.update({
             "skip_duplicates": self.skip_dup_checkbox.isChecked(),
-            "rename_duplicates": self.rename_dup_checkbox.isChecked()
-        }
+            "rename_duplicates": self.rename_dup_checkbox.isChecked(),
+            "overwrite_existing": self.overwrite_checkbox.isChecked()
+        })
         self.config.set("duplicate_handling", dup_settings)
         self.config.set("association_update_mode", self.update_mode_combo.currentText())
         self.config.set("retain_old_associations", self.retain_old_checkbox.isChecked())
@@ -0,0 +1,22 @@
+import os, sys
+import pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+WORDS = ["physics", "mechanics", "maths", "algebra", "chemistry", "organic", "notes", "sheet", "week"]
+
+@pytest.fixture
+def tiny_base_model(tmp_path, monkeypatch):
+    transformers = pytest.importorskip("transformers")
+    import ai_model
+    # A few-kilobyte BERT stands in for BASE_MODEL so training runs offline in seconds.
+    base_dir = tmp_path / "base"
+    base_dir.mkdir()
+    vocab_file = base_dir / "vocab.txt"
+    vocab_file.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS + [str(i) for i in range(10)]))
+    transformers.BertTokenizer(str(vocab_file)).save_pretrained(str(base_dir))
+    config = transformers.BertConfig(vocab_size=len(WORDS) + 15, hidden_size=16, num_hidden_layers=1,
+                                     num_attention_heads=2, intermediate_size=32, max_position_embeddings=300)
+    transformers.BertModel(config).save_pretrained(str(base_dir))
+    monkeypatch.setattr(ai_model, "BASE_MODEL", str(base_dir))
+    monkeypatch.chdir(tmp_path)
+    return base_dir
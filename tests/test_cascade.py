@@ -0,0 +1,76 @@
+import os, sys, copy
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DEFAULT_CONFIG
+from file_sorter import FileSorter
+from utils import KeywordIndex
+
+ASSOCIATIONS = {"Physics": {"associations": ["physics", "mechanics"]}, "Maths": {"associations": ["maths", "algebra"]}}
+
+class CountingModel:
+    """Predicts one fixed label and counts the texts it was asked about."""
+    is_trained = True
+
+    def __init__(self, label="Maths", confidence=0.9):
+        self.label = label
+        self.confidence = confidence
+        self.texts = []
+
+    def predict_batch(self, texts):
+        self.texts += texts
+        return [(self.label, self.confidence) for _ in texts]
+
+    def predict(self, text):
+        return self.predict_batch([text])[0]
+
+class FixedIndex:
+    """Ranks the same folders for every query."""
+    def __init__(self, hit):
+        self.hit = hit
+
+    def query(self, texts, top_k=1):
+        return [self.hit[:top_k] for _ in texts]
+
+def make_sorter(tmp_path, model=None, **settings):
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    # Rule scores average every term/keyword pair, so short names need a lower threshold to be confident.
+    config.update({"dest_heads": [str(tmp_path / "dst")], "ai_backend": "tfidf", "decision_mode": "cascade",
+                   "score_threshold": 20, **settings})
+    sorter = FileSorter(config)
+    sorter.associations = ASSOCIATIONS
+    sorter.keyword_index = KeywordIndex(ASSOCIATIONS)
+    sorter.ai_model = model or CountingModel()
+    return sorter
+
+def decide(sorter, name, text):
+    return sorter.classify([(name, text)], explain=True)[0]
+
+def test_confident_file_name_stops_at_the_rule_tier(tmp_path):
+    sorter = make_sorter(tmp_path)
+    result = decide(sorter, "physics_mechanics_notes.txt", None)
+    assert (result["folder"], result["method"]) == ("Physics", "rule")
+    assert sorter.ai_model.texts == []
+
+def test_confident_embedding_settles_an_unhelpful_name(tmp_path):
+    sorter = make_sorter(tmp_path)
+    sorter.embedding_index = FixedIndex([("Physics", 0.95), ("Maths", 0.2)])
+    result = decide(sorter, "scan_0042.txt", "")
+    assert (result["folder"], result["method"]) == ("Physics", "embedding")
+    assert sorter.ai_model.texts == []
+
+def test_pdf_text_settles_what_the_name_cannot(tmp_path):
+    sorter = make_sorter(tmp_path)
+    result = decide(sorter, "scan_0042.pdf", "maths algebra")
+    assert (result["folder"], result["method"]) == ("Maths", "rule+pdf")
+    assert sorter.ai_model.texts == []
+
+def test_ai_tier_runs_only_when_the_cheaper_tiers_are_unsure(tmp_path):
+    sorter = make_sorter(tmp_path)
+    result = decide(sorter, "scan_0042.txt", "")
+    assert (result["folder"], result["method"]) == ("Maths", "AI")
+    assert len(sorter.ai_model.texts) == 1
+
+def test_no_confident_tier_falls_back_to_the_weighted_choice(tmp_path):
+    sorter = make_sorter(tmp_path, model=CountingModel("Physics", confidence=0.3))
+    result = decide(sorter, "scan_0042.txt", "")
+    assert (result["folder"], result["method"]) == ("Physics", "weighted")
+    assert any("No confident tier" in step or "Tier 'AI'" in step for step in result["steps"])
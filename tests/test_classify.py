@@ -0,0 +1,56 @@
+import os, sys, copy
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DEFAULT_CONFIG
+from file_sorter import FileSorter
+from utils import KeywordIndex
+
+ASSOCIATIONS = {"Physics": {"associations": ["physics", "mechanics"]}, "Maths": {"associations": ["maths", "algebra"]}}
+
+class RecordingModel:
+    """Predicts from keywords in the text and records the size of every batch it is given."""
+    is_trained = True
+
+    def __init__(self):
+        self.batches = []
+
+    def predict_batch(self, texts):
+        self.batches.append(len(texts))
+        return [("Physics" if "physics" in text else "Maths", 0.9) for text in texts]
+
+    def predict(self, text):
+        return self.predict_batch([text])[0]
+
+def make_sorter(tmp_path, **settings):
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    config.update({"dest_heads": [str(tmp_path / "dst")], "ai_backend": "tfidf", **settings})
+    sorter = FileSorter(config)
+    sorter.associations = ASSOCIATIONS
+    sorter.keyword_index = KeywordIndex(ASSOCIATIONS)
+    sorter.ai_model = RecordingModel()
+    return sorter
+
+def test_classify_decides_without_side_effects(tmp_path):
+    sorter = make_sorter(tmp_path)
+    results = sorter.classify([("physics_mechanics_notes.txt", None), ("maths_algebra_sheet.txt", "")], explain=True)
+    assert [result["file"] for result in results] == ["physics_mechanics_notes.txt", "maths_algebra_sheet.txt"]
+    assert [result["folder"] for result in results] == ["Physics", "Maths"]
+    assert all(result["steps"] for result in results)
+    assert not (tmp_path / "dst").exists()
+
+def test_classify_runs_the_model_in_configured_batches(tmp_path):
+    sorter = make_sorter(tmp_path, ai_inference=dict(DEFAULT_CONFIG["ai_inference"], batch_size=16))
+    records = [(f"physics_notes_{i}.txt" if i % 2 else f"maths_sheet_{i}.txt", None) for i in range(100)]
+    results = sorter.classify(records)
+    assert len(results) == 100
+    assert max(sorter.ai_model.batches) <= 16
+    assert sum(sorter.ai_model.batches) == 100
+    assert [result["folder"] for result in results[:2]] == ["Maths", "Physics"]
+
+def test_classify_bounds_the_match_cache(tmp_path, monkeypatch):
+    import file_sorter
+    monkeypatch.setattr(file_sorter, "CLASSIFY_TERM_LIMIT", 50)
+    sorter = make_sorter(tmp_path)
+    words = iter(a + b + c for a in "abcdef" for b in "ghijkl" for c in "mnopqr")
+    for batch in range(5):
+        sorter.classify([(f"physics_{next(words)}.txt", None) for _ in range(20)])
+        assert 0 < len(sorter.terms._matches) <= 50
@@ -0,0 +1,31 @@
+import os, sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import cluster_files
+
+WORDS = ("alpha bravo charlie delta echo foxtrot golf hotel india juliet kilo lima mike november "
+         "oscar papa quebec romeo sierra tango").split()
+
+def files(names):
+    return [(f"/src/{name}", name) for name in names]
+
+def test_near_matching_names_share_a_cluster():
+    names = ["physics_mechanics_lecture_notes.pdf", "physics_mechanic_lecture_notes.pdf", "organic_chemistry_reactions.pdf"]
+    clusters = cluster_files(files(names), threshold=1, similarity=0.8)
+    grouped = [sorted(name for _, name in members) for members in clusters.values()]
+    assert sorted(names[:2]) in grouped
+    assert [names[2]] in grouped
+
+def test_chain_of_near_matches_does_not_collapse():
+    # Each name shares five of six words with the next, but the two ends share none.
+    names = ["_".join(WORDS[k:k + 6]) + ".pdf" for k in range(14)]
+    clusters = cluster_files(files(names), threshold=1, similarity=0.6)
+    assert max(len(members) for members in clusters.values()) <= 3
+    for members in clusters.values():
+        member_names = {name for _, name in members}
+        assert not {names[0], names[-1]} <= member_names
+
+def test_exact_term_families_and_threshold():
+    names = ["week_physics_notes.pdf", "notes_physics_week.pdf", "lonely_geography_file.pdf"]
+    clusters = cluster_files(files(names), threshold=2)
+    sizes = sorted(len(members) for members in clusters.values())
+    assert sizes == [1, 2]
@@ -0,0 +1,74 @@
+import os, sys, copy, json
+import pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DEFAULT_CONFIG
+from file_sorter import FileSorter
+
+ASSOCIATIONS = {"Physics": {"associations": ["physics", "mechanics"]}, "Maths": {"associations": ["maths", "algebra"]}}
+
+def run_sort(tmp_path, monkeypatch, sources, existing=(), **duplicate_handling):
+    """Sorts {relative path: content} from tmp_path/src into tmp_path/dst, which already holds `existing`."""
+    monkeypatch.chdir(tmp_path)  # sort_files writes its log to the working directory.
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    for rel, content in sources.items():
+        (src / rel).parent.mkdir(parents=True, exist_ok=True)
+        (src / rel).write_text(content)
+    dst.mkdir()
+    for rel in existing:
+        (dst / rel).parent.mkdir(parents=True, exist_ok=True)
+        (dst / rel).write_text("already there")
+    associations_file = tmp_path / "associations.json"
+    associations_file.write_text(json.dumps(ASSOCIATIONS))
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    config.update({"source_dirs": [str(src)], "dest_heads": [str(dst)], "ai_backend": "tfidf", "score_threshold": 10,
+                   "duplicate_handling": dict(config["duplicate_handling"], **duplicate_handling)})
+    sorter = FileSorter(config)
+    sorter.load_associations(str(associations_file))
+    return sorter.sort_files(), dst
+
+# Same content under the same name in two source folders.
+DUPLICATES = {"a/physics_mechanics_notes.txt": "physics notes", "b/physics_mechanics_notes.txt": "physics notes"}
+
+def test_skip_duplicates_on_leaves_the_copy(tmp_path, monkeypatch):
+    log, dst = run_sort(tmp_path, monkeypatch, DUPLICATES, skip_duplicates=True, rename_duplicates=True)
+    assert len(log["Sorted"]) == 1
+    assert len(log["Duplicates"]) == 1
+    assert os.listdir(dst / "Physics") == ["physics_mechanics_notes.txt"]
+
+def test_skip_duplicates_off_sorts_the_copy_under_the_collision_policy(tmp_path, monkeypatch):
+    log, dst = run_sort(tmp_path, monkeypatch, DUPLICATES, skip_duplicates=False, rename_duplicates=True)
+    assert len(log["Sorted"]) == 2
+    assert not log["Duplicates"]
+    assert sorted(os.listdir(dst / "Physics")) == ["physics_mechanics_notes (1).txt", "physics_mechanics_notes.txt"]
+
+def test_skip_duplicates_off_without_rename_skips_the_colliding_copy(tmp_path, monkeypatch):
+    log, dst = run_sort(tmp_path, monkeypatch, DUPLICATES, skip_duplicates=False, rename_duplicates=False)
+    assert len(log["Sorted"]) == 1
+    assert [entry["reason"] for entry in log["Unsorted"]] == ["A file with this name already exists at the destination"]
+    assert os.listdir(dst / "Physics") == ["physics_mechanics_notes.txt"]
+
+@pytest.mark.parametrize("policy, expected, kept", [
+    ({}, ["physics_mechanics_notes.txt"], "already there"),
+    ({"rename_duplicates": True}, ["physics_mechanics_notes (1).txt", "physics_mechanics_notes.txt"], "already there"),
+    ({"overwrite_existing": True}, ["physics_mechanics_notes.txt"], "new notes"),
+])
+def test_existing_destination_file(tmp_path, monkeypatch, policy, expected, kept):
+    log, dst = run_sort(tmp_path, monkeypatch, {"physics_mechanics_notes.txt": "new notes"},
+                        existing=["Physics/physics_mechanics_notes.txt"], **policy)
+    assert sorted(os.listdir(dst / "Physics")) == expected
+    assert (dst / "Physics" / "physics_mechanics_notes.txt").read_text() == kept
+
+def test_source_files_are_stat_once_during_the_walk(tmp_path, monkeypatch):
+    src = str(tmp_path / "src")
+    stat_calls = []
+    real_stat = os.stat
+    def counting_stat(path, *args, **kwargs):
+        if str(path).startswith(src) and str(path).endswith(".txt"):
+            stat_calls.append(path)
+        return real_stat(path, *args, **kwargs)
+    monkeypatch.setattr(os, "stat", counting_stat)
+    sources = {f"physics_mechanics_week{i}.txt": f"physics {i}" for i in range(5)}
+    sources.update({f"maths_algebra_sheet{i}.txt": f"maths {i}" for i in range(5)})
+    log, _ = run_sort(tmp_path, monkeypatch, sources)
+    assert len(log["Sorted"]) == 10
+    assert stat_calls == []  # Sizes and devices come from the walk's DirEntry stats.
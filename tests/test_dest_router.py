@@ -0,0 +1,95 @@
+import os, sys, copy, json, threading
+import pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DEFAULT_CONFIG
+from dest_router import DestinationRouter, VolumeMover, MB
+from file_sorter import FileSorter
+
+def make_heads(tmp_path, *names):
+    heads = []
+    for name in names:
+        (tmp_path / name).mkdir()
+        heads.append(str(tmp_path / name))
+    return heads
+
+def two_volumes(router, heads, free_mb):
+    # Every tmp_path head is on one device; give each its own simulated volume.
+    router.volumes = {head: i for i, head in enumerate(heads)}
+    router.free = {i: mb * MB for i, mb in enumerate(free_mb)}
+
+class QueuedMover:
+    """Stands in for a busy VolumeMover."""
+    def __init__(self, pending_bytes):
+        self.pending = 1
+        self.pending_bytes = pending_bytes
+
+def test_head_that_has_the_folder_wins(tmp_path):
+    a, b = make_heads(tmp_path, "a", "b")
+    os.mkdir(os.path.join(b, "Physics"))
+    router = DestinationRouter([a, b], reserve_mb=0)
+    two_volumes(router, [a, b], [1000, 10])
+    assert router.route("Physics") == b
+    assert router.route("Maths") == a
+    assert router.has_folder(a, "Maths")
+
+def test_heads_below_the_reserve_are_a_last_resort(tmp_path):
+    a, b = make_heads(tmp_path, "a", "b")
+    router = DestinationRouter([a, b], reserve_mb=100)
+    two_volumes(router, [a, b], [150, 170])
+    router.movers[1] = QueuedMover(200 * MB)  # b is far busier, but a would end up below the reserve.
+    assert router.route("Physics", size=60 * MB) == b
+    two_volumes(router, [a, b], [50, 20])
+    assert router.route("Maths", size=MB) == a
+
+def test_queued_bytes_steer_new_folders_to_the_idle_volume(tmp_path):
+    a, b = make_heads(tmp_path, "a", "b")
+    router = DestinationRouter([a, b], reserve_mb=0)
+    two_volumes(router, [a, b], [1000, 500])
+    router.movers[0] = QueuedMover(900 * MB)
+    assert router.route("Physics", size=MB) == b
+
+def test_cross_volume_moves_reserve_space_and_renames_do_not(tmp_path):
+    a, b = make_heads(tmp_path, "a", "b")
+    router = DestinationRouter([a, b], reserve_mb=0)
+    two_volumes(router, [a, b], [1000, 1000])
+    router.movers = {0: QueuedMover(0), 1: QueuedMover(0)}
+    router.movers[0].submit = router.movers[1].submit = lambda *args: None
+    router.move(a, "src", "dst", 10 * MB, None, src_device=0)
+    router.move(b, "src", "dst", 10 * MB, None, src_device=0)
+    assert router.free == {0: 1000 * MB, 1: 990 * MB}
+
+def test_no_usable_heads(tmp_path):
+    router = DestinationRouter([str(tmp_path / "missing")])
+    with pytest.raises(ValueError):
+        router.route("Physics")
+
+def test_volume_mover_moves_and_reports_each_file(tmp_path):
+    (tmp_path / "dst").mkdir()
+    done, lock = [], threading.Lock()
+    def on_done(src, dst, size, error):
+        with lock:
+            done.append((os.path.basename(src), error is None))
+    mover = VolumeMover(threads=2)
+    for i in range(5):
+        (tmp_path / f"f{i}.txt").write_text("x" * i)
+        mover.submit(str(tmp_path / f"f{i}.txt"), str(tmp_path / "dst" / f"f{i}.txt"), i, on_done)
+    mover.submit(str(tmp_path / "missing.txt"), str(tmp_path / "dst" / "missing.txt"), 7, on_done)
+    mover.close()
+    assert sorted(done) == [(f"f{i}.txt", True) for i in range(5)] + [("missing.txt", False)]
+    assert sorted(os.listdir(tmp_path / "dst")) == [f"f{i}.txt" for i in range(5)]
+    assert (mover.pending, mover.pending_bytes) == (0, 0)
+
+def test_sort_files_moves_into_the_head_that_has_the_folder(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # sort_files writes its log to the working directory.
+    a, b = make_heads(tmp_path, "a", "b")
+    os.mkdir(os.path.join(b, "Physics"))
+    (tmp_path / "src").mkdir()
+    (tmp_path / "src" / "physics_mechanics_notes.txt").write_text("physics notes")
+    (tmp_path / "associations.json").write_text(json.dumps({"Physics": {"associations": ["physics", "mechanics"]}}))
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    config.update({"source_dirs": [str(tmp_path / "src")], "dest_heads": [a, b], "ai_backend": "tfidf", "score_threshold": 10})
+    sorter = FileSorter(config)
+    sorter.load_associations(str(tmp_path / "associations.json"))
+    sorter.sort_files()
+    assert os.listdir(os.path.join(b, "Physics")) == ["physics_mechanics_notes.txt"]
+    assert os.listdir(a) == []
@@ -0,0 +1,53 @@
+import os, sys, copy, json
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import DEFAULT_CONFIG
+from file_sorter import FileSorter
+from utils import KeywordIndex
+
+ASSOCIATIONS = {"Physics": {"associations": ["physics", "mechanics"]}, "Maths": {"associations": ["maths", "algebra"]}}
+
+class FakeIndex:
+    """Answers every query with one fixed folder, or raises like an index whose model failed."""
+    def __init__(self, folder="Maths", fail=False):
+        self.folder = folder
+        self.fail = fail
+        self.queries = 0
+
+    def query(self, texts, top_k=1):
+        self.queries += 1
+        if self.fail:
+            raise RuntimeError("embedding model unavailable")
+        return [[(self.folder, 0.95)] for _ in texts]
+
+def sort_with_index(tmp_path, monkeypatch, index, **settings):
+    monkeypatch.chdir(tmp_path)
+    src, dst = tmp_path / "src", tmp_path / "dst"
+    src.mkdir()
+    dst.mkdir()
+    for name in ("physics_mechanics_notes.txt", "maths_algebra_sheet.txt", "random_words_file.txt"):
+        (src / name).write_text(name)
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    config.update({"source_dirs": [str(src)], "dest_heads": [str(dst)], "ai_backend": "tfidf", "cluster_threshold": 1,
+                   "score_threshold": 10, **settings})
+    sorter = FileSorter(config)
+    sorter.associations = ASSOCIATIONS
+    sorter.keyword_index = KeywordIndex(ASSOCIATIONS)
+    sorter.embedding_index = index
+    return sorter.sort_files()
+
+def test_embedding_hits_are_scored(tmp_path, monkeypatch):
+    index = FakeIndex("Maths")
+    log = sort_with_index(tmp_path, monkeypatch, index, decision_mode="cascade",
+                          method_strengths=dict(DEFAULT_CONFIG["method_strengths"], embedding=1.0))
+    assert index.queries == 1  # One batched query for the whole run.
+    assert not log["Errors"]
+    by_file = {entry["file"]: entry for entry in log["Sorted"]}
+    assert by_file["random_words_file.txt"]["method"] == "embedding"
+    assert os.path.exists(tmp_path / "dst" / "Maths" / "random_words_file.txt")
+
+def test_failed_query_skips_embedding_scoring_for_the_run(tmp_path, monkeypatch):
+    index = FakeIndex(fail=True)
+    log = sort_with_index(tmp_path, monkeypatch, index)
+    assert index.queries == 1
+    assert [list(error) for error in log["Errors"]] == [["embedding_error", "trace"]]
+    assert len(log["Sorted"]) == 2
@@ -0,0 +1,36 @@
+import os, sys, shutil
+import pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+pytest.importorskip("onnxruntime")
+import ai_model
+
+def train(output_dir, labels):
+    texts = [f"{label.lower()} notes week {i}" for label in labels for i in range(4)]
+    model = ai_model.TransformerAIModel()
+    model.train(texts, [label for label in labels for _ in range(4)], output_dir=str(output_dir), epochs=1,
+                batch_size=4, bf16=False, early_stopping_patience=0)
+    return model
+
+def test_retraining_drops_the_stale_export(tiny_base_model, tmp_path, caplog):
+    model_dir = tmp_path / "model"
+    model = train(model_dir, ["Maths", "Physics"])
+    model.export(str(model_dir), backend="onnx", quantize=True, sample_texts=["maths notes"], min_agreement=0.0)
+    stale = {name: (model_dir / name).read_bytes() for name in os.listdir(model_dir)
+             if name in ai_model.EXPORT_FILES or name == ai_model.EXPORT_INFO_FILE}
+    assert ai_model.EXPORT_INFO_FILE in stale
+
+    train(model_dir, ["Chemistry", "Maths", "Physics"])
+    assert not any((model_dir / name).exists() for name in stale)
+    loaded = ai_model.TransformerAIModel(inference_backend="onnx")
+    assert loaded.load(str(model_dir))
+    assert loaded.inference_backend == "eager"
+    assert len(loaded._logits(["maths notes"])[0]) == 3
+
+    # An export put back by hand (or left by an older version) is rejected by its output width.
+    for name, data in stale.items():
+        (model_dir / name).write_bytes(data)
+    loaded = ai_model.TransformerAIModel(inference_backend="onnx")
+    assert loaded.load(str(model_dir))
+    assert loaded.inference_backend == "eager"
+    assert "has 2 outputs but the model has 3 labels" in caplog.text
+    assert loaded.predict("physics notes")[0] in ("Chemistry", "Maths", "Physics")
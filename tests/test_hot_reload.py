@@ -0,0 +1,114 @@
+import os, sys, json
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from config import Config
+from file_sorter import FileSorter
+
+ASSOCIATIONS = {"Physics": {"associations": ["physics", "mechanics"]}, "Maths": {"associations": ["maths", "algebra"]}}
+
+def make_sorter(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)  # sort_files writes its log to the working directory.
+    associations_file = tmp_path / "associations.json"
+    associations_file.write_text(json.dumps(ASSOCIATIONS))
+    config_file = tmp_path / "config.json"
+    config_file.write_text(json.dumps({"source_dirs": ["/saved/old/source"], "dest_heads": ["/saved/old/head"],
+                                       "associations_file": str(associations_file), "ai_backend": "tfidf",
+                                       "ai_model_path": str(tmp_path / "no_model"), "score_threshold": 10,
+                                       "hot_reload": {"enabled": True, "interval": 3600}}))
+    sorter = FileSorter(Config(str(config_file)))
+    return sorter, associations_file
+
+def test_runtime_dirs_survive_first_pin(tmp_path, monkeypatch):
+    sorter, associations_file = make_sorter(tmp_path, monkeypatch)
+    try:
+        src, dst = tmp_path / "src", tmp_path / "dst"
+        src.mkdir()
+        dst.mkdir()
+        for name in ("physics_mechanics_notes.txt", "maths_algebra_sheet.txt"):
+            (src / name).write_text(name)
+        # What MainWindow.start_sorting does before starting a run.
+        sorter.source_dirs = [str(src)]
+        sorter.dest_heads = [str(dst)]
+        sorter.load_associations(str(associations_file))
+        loaded = sorter.associations
+        log = sorter.sort_files()
+        assert sorter.source_dirs == [str(src)]
+        assert sorter.dest_heads == [str(dst)]
+        assert sorter.associations is loaded
+        assert len(log["Sorted"]) == 2
+        assert (dst / "Physics" / "physics_mechanics_notes.txt").exists()
+    finally:
+        sorter.snapshots.stop()
+
+def test_newer_snapshot_replaces_associations(tmp_path, monkeypatch):
+    sorter, associations_file = make_sorter(tmp_path, monkeypatch)
+    try:
+        sorter.load_associations(str(associations_file))
+        sorter.pin_snapshot()
+        assert "Chemistry" not in sorter.associations
+        associations_file.write_text(json.dumps(dict(ASSOCIATIONS, Chemistry={"associations": ["chemistry"]})))
+        os.utime(associations_file, ns=(0, 10**18))  # A distinct stamp even on coarse-mtime filesystems.
+        assert sorter.snapshots.poll()
+        sorter.pin_snapshot()
+        assert "Chemistry" in sorter.associations
+        assert sorter.dest_heads == ["/saved/old/head"]
+    finally:
+        sorter.snapshots.stop()
+
+def test_model_retrained_into_default_directory_is_reloaded(tmp_path, monkeypatch):
+    from ai_model import TfidfAIModel
+    sorter, _ = make_sorter(tmp_path, monkeypatch)
+    try:
+        config = json.loads((tmp_path / "config.json").read_text())
+        del config["ai_model_path"]  # The model goes to the backend's default directory, tfidf_model/.
+        (tmp_path / "config.json").write_text(json.dumps(config))
+        os.utime(tmp_path / "config.json", ns=(0, 10**18))
+        assert sorter.snapshots.poll()
+        assert not sorter.snapshots.current.ai_model.is_trained
+        TfidfAIModel().train(["physics notes", "mechanics notes", "maths sheet", "algebra sheet"],
+                             ["Physics", "Physics", "Maths", "Maths"], output_dir=TfidfAIModel.model_dir)
+        assert sorter.snapshots.poll()
+        assert sorter.snapshots.current.ai_model.is_trained
+    finally:
+        sorter.snapshots.stop()
+
+def test_config_edits_apply_at_the_next_run_boundary(tmp_path, monkeypatch):
+    sorter, associations_file = make_sorter(tmp_path, monkeypatch)
+    try:
+        sorter.config.set("profile", True)  # What the CLI's --profile does.
+        sorter.dest_heads = [str(tmp_path / "dst")]
+        sorter.pin_snapshot()
+        config = json.loads((tmp_path / "config.json").read_text())
+        config.update({"score_threshold": 55, "decision_mode": "cascade",
+                       "duplicate_handling": {"skip_duplicates": True, "rename_duplicates": True}})
+        (tmp_path / "config.json").write_text(json.dumps(config))
+        os.utime(tmp_path / "config.json", ns=(0, 10**18))
+        assert sorter.snapshots.poll()
+        assert sorter.score_threshold == 10  # Nothing changes mid-run...
+        sorter.pin_snapshot()  # ...only when the next run starts.
+        assert sorter.score_threshold == 55
+        assert sorter.decision_mode == "cascade"
+        assert sorter.name_collisions == "rename"
+        assert sorter.dest_heads == [str(tmp_path / "dst")]
+        assert sorter.config.get("profile") is True
+    finally:
+        sorter.snapshots.stop()
+
+def test_load_ai_model_shares_the_snapshot_model(tmp_path, monkeypatch):
+    from ai_model import TfidfAIModel
+    monkeypatch.chdir(tmp_path)
+    TfidfAIModel().train(["physics notes", "mechanics notes", "maths sheet", "algebra sheet"],
+                         ["Physics", "Physics", "Maths", "Maths"], output_dir=str(tmp_path / "model"))
+    sorter, associations_file = make_sorter(tmp_path, monkeypatch)
+    try:
+        sorter.config.set("ai_model_path", str(tmp_path / "model"))
+        config = json.loads((tmp_path / "config.json").read_text())
+        config["ai_model_path"] = str(tmp_path / "model")
+        (tmp_path / "config.json").write_text(json.dumps(config))
+        os.utime(tmp_path / "config.json", ns=(0, 10**18))
+        assert sorter.snapshots.poll()
+        assert sorter.load_ai_model()
+        assert sorter.ai_model is sorter.snapshots.current.ai_model
+        sorter.pin_snapshot()
+        assert sorter.ai_model is sorter.snapshots.current.ai_model
+    finally:
+        sorter.snapshots.stop()
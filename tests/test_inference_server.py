@@ -0,0 +1,48 @@
+import os, sys, threading, tempfile
+import pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import associations
+from inference_server import MicroBatcher, InferenceServer
+
+class ParaphraseService:
+    """Stands in for InferenceService: answers pings and echoes prompts back as paraphrases."""
+    def __init__(self):
+        self.prompts = []
+
+    def handle(self, request):
+        if request["op"] == "ping":
+            return {}
+        self.prompts += request["prompts"]
+        count = request["options"].get("num_return_sequences", 1)
+        return [[f"{prompt} #{i}" for i in range(count)] for prompt in request["prompts"]]
+
+def test_short_handler_result_fails_the_unanswered_requests():
+    batcher = MicroBatcher(lambda items: items[:1], max_batch=3, max_wait=0.5)
+    try:
+        futures = [batcher.submit(item) for item in ("a", "b", "c")]
+        assert futures[0].result(timeout=5) == "a"
+        for future in futures[1:]:
+            with pytest.raises(RuntimeError, match="returned 1 results for 3 requests"):
+                future.result(timeout=5)
+    finally:
+        batcher.close()
+
+def test_synonyms_come_from_the_inference_server_when_enabled(monkeypatch):
+    socket_path = os.path.join(tempfile.mkdtemp(), "inference.sock")
+    service = ParaphraseService()
+    server = InferenceServer(socket_path, service)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    monkeypatch.setattr(associations, "get_best_device", lambda: pytest.fail("loaded the local paraphraser"))
+    try:
+        assert associations.use_inference_server({"enabled": True, "socket": socket_path, "timeout": 5})
+        synonyms = associations.generate_synonyms("Physics", max_synonyms=2)
+        assert synonyms == [f"{service.prompts[0]} #0", f"{service.prompts[0]} #1"]
+        assert service.prompts[0].startswith("paraphrase: Physics")
+    finally:
+        associations.use_inference_server(None)
+        server.shutdown()
+        server.server_close()
+
+def test_unreachable_server_leaves_paraphrasing_local():
+    assert not associations.use_inference_server({"enabled": True, "socket": os.path.join(tempfile.mkdtemp(), "none.sock"), "timeout": 1})
+    assert associations.INFERENCE_CLIENT is None
@@ -0,0 +1,67 @@
+import os, sys, time, threading
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from io_scheduler import IOScheduler, is_rotational
+
+def make_files(tmp_path):
+    # Created in an order that differs from both name and directory order.
+    paths = []
+    for rel in ("b/2.txt", "a/9.txt", "b/1.txt", "a/3.txt"):
+        (tmp_path / rel).parent.mkdir(exist_ok=True)
+        (tmp_path / rel).write_text(rel)
+        paths.append(str(tmp_path / rel))
+    return paths
+
+def scheduler_for(tmp_path, rotational, **limits):
+    scheduler = IOScheduler(**limits)
+    scheduler._rotational[os.stat(tmp_path).st_dev] = rotational
+    return scheduler
+
+def in_inode_order(paths):
+    return sorted(paths, key=lambda path: (os.path.dirname(path), os.stat(path).st_ino))
+
+def test_spinning_disk_requests_are_issued_in_directory_and_inode_order(tmp_path):
+    paths = make_files(tmp_path)
+    scheduler = scheduler_for(tmp_path, True)
+    issued = []
+    scheduler.map(issued.append, paths)
+    scheduler.close()
+    assert issued == in_inode_order(paths)
+
+def test_ssd_requests_keep_their_order_and_missing_files_get_their_own_group(tmp_path):
+    paths = make_files(tmp_path)
+    missing = str(tmp_path / "missing.txt")
+    groups = scheduler_for(tmp_path, False).group(paths + [missing])
+    assert groups == {os.stat(tmp_path).st_dev: paths, None: [missing]}
+
+def peak_concurrency(scheduler, paths):
+    running, peak, lock = [0], [0], threading.Lock()
+    def read(path):
+        with lock:
+            running[0] += 1
+            peak[0] = max(peak[0], running[0])
+        time.sleep(0.02)
+        with lock:
+            running[0] -= 1
+    scheduler.map(read, paths)
+    scheduler.close()
+    return peak[0]
+
+def test_each_device_type_gets_its_own_concurrency(tmp_path):
+    paths = make_files(tmp_path)
+    assert peak_concurrency(scheduler_for(tmp_path, True, hdd_concurrency=1, ssd_concurrency=4), paths) == 1
+    assert peak_concurrency(scheduler_for(tmp_path, False, hdd_concurrency=1, ssd_concurrency=4), paths) > 1
+    assert scheduler_for(tmp_path, None, default_concurrency=0).concurrency(os.stat(tmp_path).st_dev) == 1
+
+def test_map_reports_failures_as_none(tmp_path):
+    paths = make_files(tmp_path)
+    def read(path):
+        if path.endswith("9.txt"):
+            raise OSError("unreadable")
+        return open(path).read()
+    scheduler = scheduler_for(tmp_path, None)
+    results = scheduler.map(read, paths)
+    scheduler.close()
+    assert results == {path: (None if path.endswith("9.txt") else open(path).read()) for path in paths}
+
+def test_unknown_devices_are_not_rotational():
+    assert is_rotational(None) is None
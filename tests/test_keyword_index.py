@@ -0,0 +1,50 @@
+import os, sys, copy, subprocess
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from utils import KeywordIndex
+
+def folders(count, keyword):
+    return {f"Folder{chr(65 + i // 26)}{chr(65 + i % 26)}": {"associations": [keyword]} for i in range(count)}
+
+def test_candidates_favour_keyword_hits():
+    associations = {"Maths": {"associations": ["algebra", "geometry"]}, "Physics": {"associations": ["mechanics"]},
+                    "History": {"associations": ["empires"]}}
+    index = KeywordIndex(associations)
+    assert index.candidates(["mechanics", "notes"], top_k=1) == ["Physics"]
+    assert set(index.candidates(["algebra", "mechanics"], top_k=5)) == {"Maths", "Physics"}
+
+def test_ties_follow_associations_order():
+    associations = folders(60, "physics")
+    index = KeywordIndex(associations)
+    assert index.candidates(["physics"], top_k=50) == list(associations)[:50]
+
+def test_ties_do_not_depend_on_the_hash_seed():
+    # String hashing (and so set order) changes between interpreter runs; candidates must not.
+    code = ("import sys; sys.path.insert(0, sys.argv[1]); from utils import KeywordIndex; "
+            "a = {n: {'associations': ['physics', n.lower()]} for n in ['Zulu', 'Alpha', 'Mike', 'Beta', 'Kilo']}; "
+            "print(KeywordIndex(a).candidates(['physics'], top_k=3))")
+    root = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    outputs = {subprocess.run([sys.executable, "-c", code, root], capture_output=True, text=True, check=True,
+                              env=dict(os.environ, PYTHONHASHSEED=str(seed))).stdout for seed in range(4)}
+    assert outputs == {"['Zulu', 'Alpha', 'Mike']\n"}
+
+def test_rule_based_ranking_breaks_ties_by_associations_order():
+    from config import DEFAULT_CONFIG
+    from file_sorter import FileSorter
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    config["rule_candidate_top_k"] = 5
+    sorter = FileSorter(config)
+    sorter.associations = dict(folders(20, "geology"), Beta={"associations": ["physics"]}, Alpha={"associations": ["physics"]})
+    sorter.keyword_index = KeywordIndex(sorter.associations)
+    dest, score, _ = sorter.score_rule_based([("/src/physics_notes.pdf", "physics_notes.pdf")])
+    assert dest == "Beta"
+    assert score > 0
+
+def test_store_index_breaks_ties_like_the_in_memory_index(tmp_path):
+    from associations_store import write_store, AssociationsStore
+    associations = folders(60, "physics")
+    write_store(associations, str(tmp_path / "associations.sqlite"))
+    store = AssociationsStore(str(tmp_path / "associations.sqlite"))
+    try:
+        assert store.keyword_index().candidates(["physics"], top_k=50) == KeywordIndex(associations).candidates(["physics"], top_k=50)
+    finally:
+        store.close()
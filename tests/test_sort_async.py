@@ -0,0 +1,91 @@
+import os, sys, copy, json, time, shutil, asyncio, contextlib, threading
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import dest_router
+from config import DEFAULT_CONFIG
+from dest_router import VolumeMover
+from file_sorter import FileSorter, SORT_LOG_FILE
+
+ASSOCIATIONS = {"Physics": {"associations": ["physics", "mechanics"]}, "Maths": {"associations": ["maths", "algebra"]}}
+
+def make_tree(root):
+    for i in range(12):
+        (root / "src" / f"batch{i % 3}").mkdir(parents=True, exist_ok=True)
+        (root / "src" / f"batch{i % 3}" / f"physics_mechanics_{i}.txt").write_text(f"physics {i}")
+        (root / "src" / f"batch{i % 3}" / f"maths_algebra_{i}.txt").write_text(f"maths {i}")
+    (root / "src" / "zzqx.txt").write_text("nothing to go on")
+    (root / "src" / "batch0" / "copy_physics_mechanics.txt").write_text("physics 0")
+    (root / "dst").mkdir()
+    (root / "associations.json").write_text(json.dumps(ASSOCIATIONS))
+
+def make_sorter(root):
+    config = copy.deepcopy(DEFAULT_CONFIG)
+    config.update({"source_dirs": [str(root / "src")], "dest_heads": [str(root / "dst")], "ai_backend": "tfidf",
+                   "score_threshold": 10, "min_free_space_mb": 0})
+    sorter = FileSorter(config)
+    sorter.load_associations(str(root / "associations.json"))
+    return sorter
+
+def files_under(root):
+    return sorted(os.path.relpath(os.path.join(dirpath, name), root) for dirpath, _, names in os.walk(root) for name in names)
+
+async def collect(sorter, **options):
+    return [event async for event in sorter.sort_async(**options)]
+
+def test_sort_async_sorts_like_sort_files(tmp_path, monkeypatch):
+    for name in ("sync", "async"):
+        make_tree(tmp_path / name)
+    monkeypatch.chdir(tmp_path / "sync")
+    expected = make_sorter(tmp_path / "sync").sort_files()
+    monkeypatch.chdir(tmp_path / "async")
+    events = asyncio.run(collect(make_sorter(tmp_path / "async"), max_in_flight=4))
+
+    assert files_under(tmp_path / "async" / "dst") == files_under(tmp_path / "sync" / "dst")
+    assert files_under(tmp_path / "async" / "src") == files_under(tmp_path / "sync" / "src")
+    assert [event["event"] for event in events][-1] == "done"
+    log = events[-1]["log"]
+    for key in ("Sorted", "Unsorted", "Duplicates"):
+        assert len(log[key]) == len(expected[key])
+    moves = [event for event in events if event["event"] == "move"]
+    assert sorted(event["source"] for event in moves) == sorted(entry["source"] for entry in log["Sorted"])
+    decided = set()
+    for event in events:
+        if event["event"] == "decision":
+            decided.update(event["files"])
+        elif event["event"] == "move":
+            assert event["source"] in decided and event["error"] is None
+    assert not os.path.exists(SORT_LOG_FILE)
+
+def slow_moves(monkeypatch, delay):
+    move = shutil.move
+    monkeypatch.setattr(dest_router.shutil, "move", lambda src, dst: time.sleep(delay) or move(src, dst))
+
+def test_queued_moves_stay_within_max_in_flight(tmp_path, monkeypatch):
+    make_tree(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    slow_moves(monkeypatch, 0.005)
+    peak = [0]
+    submit = VolumeMover.submit
+    def counting_submit(self, *args):
+        submit(self, *args)
+        peak[0] = max(peak[0], self.pending)
+    monkeypatch.setattr(VolumeMover, "submit", counting_submit)
+    events = asyncio.run(collect(make_sorter(tmp_path), max_in_flight=2))
+    assert len(events[-1]["log"]["Sorted"]) > 2
+    assert peak[0] <= 2
+
+def test_leaving_the_loop_early_drops_queued_moves(tmp_path, monkeypatch):
+    make_tree(tmp_path)
+    monkeypatch.chdir(tmp_path)
+    slow_moves(monkeypatch, 0.05)
+    async def first_move():
+        async with contextlib.aclosing(make_sorter(tmp_path).sort_async(max_in_flight=8)) as events:
+            async for event in events:
+                if event["event"] == "move":
+                    return
+    asyncio.run(first_move())
+    time.sleep(0.3)  # Moves already under way finish; nothing else should.
+    moved = files_under(tmp_path / "dst")
+    time.sleep(0.3)
+    assert files_under(tmp_path / "dst") == moved
+    assert 0 < len(moved) < 24
+    assert not [thread.name for thread in threading.enumerate() if thread.name.startswith(("mover-", "sort-async"))]
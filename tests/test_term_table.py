@@ -0,0 +1,37 @@
+import os, sys
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+import utils
+from utils import TermTable, cluster_files, improved_score, normalize
+
+def test_each_filename_is_normalized_once(monkeypatch):
+    calls = []
+    monkeypatch.setattr(utils, "normalize", lambda name: calls.append(name) or normalize(name))
+    terms = TermTable()
+    cluster = [("a/physics_notes.txt", "physics_notes.txt"), ("b/physics_notes.txt", "physics_notes.txt")]
+    assert terms.cluster_terms(cluster) == ["physics", "notes", "txt"] * 2
+    assert terms.split("physics_notes.txt") == ("physics", "notes", "txt")
+    assert calls == ["physics_notes.txt"]
+    assert len(terms) == 1
+
+def test_equal_terms_of_different_names_share_one_string():
+    terms = TermTable()
+    first = terms.split("".join(["opt", "ics_draft.txt"]))
+    second = terms.split("".join(["opt", "ics_final.pdf"]))
+    assert first[0] == second[0] and first[0] is second[0]
+
+def test_match_scores_are_memoized_and_unchanged(monkeypatch):
+    calls = []
+    monkeypatch.setattr(utils, "term_match_score", lambda term, kw: calls.append((term, kw)) or 100.0 * (term == kw))
+    terms = TermTable()
+    file_terms = terms.split("mechanics_notes.txt")
+    first = improved_score(file_terms, ["mechanics", "optics"], terms.match_score)
+    compared = len(calls)
+    assert improved_score(file_terms, ["mechanics", "optics"], terms.match_score) == first
+    assert len(calls) == compared
+
+def test_cluster_files_reuses_the_run_table():
+    terms = TermTable()
+    files = [(f"src/{name}", name) for name in ("waves_notes_1.txt", "waves_notes_2.txt", "optics.txt")]
+    clusters = cluster_files(files, threshold=2, terms=terms)
+    assert clusters[("notes", "waves")] == files[:2]
+    assert len(terms) == 3
@@ -0,0 +1,37 @@
+import os, sys
+import numpy as np
+import pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from ai_model import TfidfAIModel
+
+EXAMPLES = {
+    "Physics": ["mechanics notes", "optics lab report", "thermodynamics worksheet", "kinematics problems"],
+    "Maths": ["algebra homework", "calculus revision", "geometry proofs", "probability sheet"],
+    "History": ["ancient empires essay", "medieval wars", "colonial history notes", "revolution timeline"],
+}
+QUERIES = ["optics revision notes", "calculus homework v2", "medieval empires", "zzzz", ""]
+
+def trained(tmp_path, labels):
+    texts = [text for label in labels for text in EXAMPLES[label]]
+    model = TfidfAIModel()
+    model.train(texts, [label for label in labels for _ in EXAMPLES[label]], output_dir=str(tmp_path / "tfidf"))
+    return model
+
+def sklearn_predictions(model, texts):
+    probs = model.classifier.predict_proba(model.vectorizer.transform(texts))
+    return [(model.classifier.classes_[i], row[i]) for row, i in zip(probs, probs.argmax(axis=1))]
+
+@pytest.mark.parametrize("labels", [["Physics", "Maths", "History"], ["Physics", "Maths"]])
+def test_fast_path_matches_sklearn(tmp_path, labels):
+    model = trained(tmp_path, labels)
+    for (label, confidence), (expected_label, expected) in zip(model.predict_batch(QUERIES), sklearn_predictions(model, QUERIES)):
+        assert label == expected_label
+        assert confidence == pytest.approx(expected, rel=1e-4)
+
+def test_fast_path_is_rebuilt_after_load(tmp_path):
+    model = trained(tmp_path, ["Physics", "Maths", "History"])
+    model.predict("optics")
+    other = trained(tmp_path / "other", ["Physics", "Maths"])
+    assert model.load(str(tmp_path / "other" / "tfidf"))
+    assert model.predict_batch(QUERIES) == other.predict_batch(QUERIES)
+    assert np.array_equal(model._fast[3], np.ascontiguousarray(other.classifier.coef_.T, dtype=np.float32))
@@ -0,0 +1,39 @@
+import os, sys, json
+import pytest
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+transformers = pytest.importorskip("transformers")
+import ai_model
+
+def examples(subject, words, count):
+    return [(f"{words} week {i}", subject) for i in range(count)]
+
+def train(model, data, output_dir, messages, **kwargs):
+    texts, labels = zip(*data)
+    model.train(list(texts), list(labels), output_dir=str(output_dir), epochs=1, batch_size=4, bf16=False,
+                checkpoint_steps=1, early_stopping_patience=0, log_callback=messages.append, **kwargs)
+
+def test_interrupted_incremental_run_resumes(tiny_base_model, tmp_path):
+    output_dir = tmp_path / "model"
+    first = examples("Physics", "physics mechanics", 6) + examples("Maths", "maths algebra", 6)
+    train(ai_model.TransformerAIModel(), first, output_dir, [])
+    assert not (output_dir / ai_model.CHECKPOINTS_DIR).exists()
+
+    # The time budget runs out after the first step; the model is saved but the run is not recorded.
+    both = first + examples("Chemistry", "chemistry organic", 6)
+    messages = []
+    train(ai_model.TransformerAIModel(), both, output_dir, messages, mode="incremental", time_budget_minutes=1e-6)
+    assert any("Time budget" in message for message in messages)
+    with open(output_dir / ai_model.TRAINING_EXAMPLES_FILE, "r", encoding="utf-8") as f:
+        assert [tuple(example) for example in json.load(f)] == first
+    checkpoints = os.listdir(output_dir / ai_model.CHECKPOINTS_DIR)
+    assert len(checkpoints) == 1
+
+    # Training again on the same examples finds that run's checkpoint and finishes it.
+    messages = []
+    train(ai_model.TransformerAIModel(), both, output_dir, messages, mode="incremental")
+    assert any(message.startswith("Resuming training from") and checkpoints[0] in message for message in messages)
+    assert not (output_dir / ai_model.CHECKPOINTS_DIR).exists()
+    with open(output_dir / ai_model.TRAINING_EXAMPLES_FILE, "r", encoding="utf-8") as f:
+        assert [tuple(example) for example in json.load(f)] == both
+    with open(output_dir / ai_model.LABELS_FILE, "r", encoding="utf-8") as f:
+        assert json.load(f) == ["Maths", "Physics", "Chemistry"]
@@ -0,0 +1,92 @@
+import os, json, shutil, hashlib, logging
+
+CACHE_FORMAT_VERSION = 1
+EXAMPLES_FILE = "examples.json"
+
+def directory_signature(root_dir):
+    """Sorted relative paths of every folder under root_dir: all that training examples take from the tree."""
+    folders = []
+    stack = [root_dir]
+    while stack:
+        current = stack.pop()
+        try:
+            with os.scandir(current) as entries:
+                for entry in entries:
+                    if entry.is_dir():
+                        folders.append(os.path.relpath(entry.path, root_dir).replace(os.sep, "/"))
+                        stack.append(entry.path)
+        except OSError as e:
+            logging.error(f"Error scanning directory {current}: {e}")
+    return sorted(folders)
+
+def fingerprint(*parts):
+    payload = json.dumps([CACHE_FORMAT_VERSION, *parts], sort_keys=True, ensure_ascii=False, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+def tokenizer_signature(tokenizer):
+    return {"name": getattr(tokenizer, "name_or_path", ""), "class": type(tokenizer).__name__, "vocab_size": len(tokenizer)}
+
+class TrainingCache:
+    """
+    On-disk cache for training inputs, keyed by content fingerprints:
+     - examples/<key>.json: texts and labels built from the guidebook, dictionary and destination tree.
+     - tokenized/<key>/: the tokenized Arrow dataset for a set of examples and a tokenizer.
+    """
+    def __init__(self, cache_dir, max_entries=5):
+        self.cache_dir = cache_dir
+        self.max_entries = max_entries
+
+    def _path(self, kind, key):
+        return os.path.join(self.cache_dir, kind, key)
+
+    def load_examples(self, key):
+        path = self._path("examples", key) + ".json"
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                data = json.load(f)
+            return data["texts"], data["labels"]
+        except Exception as e:
+            logging.error(f"Error reading cached training examples {path}: {e}")
+            return None
+
+    def save_examples(self, key, texts, labels):
+        path = self._path("examples", key) + ".json"
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump({"texts": texts, "labels": labels}, f, ensure_ascii=False)
+        os.replace(tmp_path, path)
+        self._prune("examples")
+
+    def load_dataset(self, key):
+        path = self._path("tokenized", key)
+        if not os.path.isdir(path):
+            return None
+        try:
+            from datasets import load_from_disk
+            return load_from_disk(path)
+        except Exception as e:
+            logging.error(f"Error loading cached tokenized dataset {path}: {e}")
+            return None
+
+    def save_dataset(self, key, dataset):
+        path = self._path("tokenized", key)
+        tmp_path = path + ".tmp"
+        shutil.rmtree(tmp_path, ignore_errors=True)
+        dataset.save_to_disk(tmp_path)
+        shutil.rmtree(path, ignore_errors=True)
+        os.replace(tmp_path, path)
+        self._prune("tokenized")
+
+    def _prune(self, kind):
+        # Keep only the most recently written entries of each kind.
+        root = os.path.join(self.cache_dir, kind)
+        entries = [os.path.join(root, name) for name in os.listdir(root) if not name.endswith(".tmp")]
+        entries.sort(key=os.path.getmtime, reverse=True)
+        for path in entries[self.max_entries:]:
+            if os.path.isdir(path):
+                shutil.rmtree(path, ignore_errors=True)
+            else:
+                os.remove(path)
@@ -1,4 +1,5 @@
-import os, re, hashlib, PyPDF2, ctypes, sys, logging
+import os, re, hashlib, heapq, PyPDF2, ctypes, sys, logging, zlib, itertools, time, contextlib
+import numpy as np
 from collections import defaultdict
 from fuzzywuzzy import fuzz
 
@@ -12,22 +13,30 @@ def allow_sleep():
     if sys.platform == "win32":
         ctypes.windll.kernel32.SetThreadExecutionState(0x80000000)
 
+SEPARATOR_PATTERN = re.compile(r'[/-_.\s]+')
+CHAPTER_PATTERN = re.compile(r'\b(ls|chapter|ch)\s*\d*\b')
+
 def normalize(text):
-    text = re.sub(r'[/-_.\s]+', ' ', text.lower()).strip()
-    text = re.sub(r'\b(ls|chapter|ch)\s*\d*\b', '', text)
+    text = SEPARATOR_PATTERN.sub(' ', text.lower()).strip()
+    text = CHAPTER_PATTERN.sub('', text)
     return text.split()
 
-def improved_score(file_terms, keyword_terms):
+def term_match_score(term, kw):
+    # Fuzzy match of one term against one keyword: the better ratio if either clears 85, else 0.
+    r = fuzz.ratio(term, kw)
+    pr = fuzz.partial_ratio(term, kw)
+    return max(r, pr) if r > 85 or pr > 85 else 0
+
+def improved_score(file_terms, keyword_terms, match_score=term_match_score):
     if not file_terms or not keyword_terms:
         return 0
     total_comparisons = len(file_terms) * len(keyword_terms)
     match_scores = []
     for term in file_terms:
         for kw in keyword_terms:
-            r = fuzz.ratio(term, kw)
-            pr = fuzz.partial_ratio(term, kw)
-            if r > 85 or pr > 85:
-                match_scores.append(max(r, pr))
+            score = match_score(term, kw)
+            if score:
+                match_scores.append(score)
     if not match_scores:
         return 0
     avg_match = sum(match_scores) / len(match_scores)
@@ -47,14 +56,177 @@ def extract_pdf_text(filepath):
             return ""
     return ""
 
-def cluster_files(files):
-    clusters = defaultdict(list)
+MINHASH_PRIME = (1 << 31) - 1
+
+def _min_by_group(values, groups, chunk_size=10000):
+    # Row-wise minimum of values[ids] for each list of ids in groups.
+    out = np.empty((len(groups), values.shape[1]), dtype=values.dtype)
+    for start in range(0, len(groups), chunk_size):
+        chunk = groups[start:start + chunk_size]
+        lengths = np.array([len(g) for g in chunk])
+        flat = np.fromiter(itertools.chain.from_iterable(chunk), dtype=np.int64, count=int(lengths.sum()))
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        out[start:start + len(chunk)] = np.minimum.reduceat(values[flat], offsets, axis=0)
+    return out
+
+def minhash_signatures(shingle_sets, num_perm=64, seed=1):
+    """MinHash signature (one row of num_perm values) for each non-empty set of string shingles."""
+    vocab = {}
+    ids = [[vocab.setdefault(s, len(vocab)) for s in shingles] for shingles in shingle_sets]
+    hashes = np.array([zlib.crc32(s.encode("utf-8")) for s in vocab], dtype=np.uint64) % MINHASH_PRIME
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, MINHASH_PRIME, num_perm, dtype=np.uint64)
+    b = rng.integers(0, MINHASH_PRIME, num_perm, dtype=np.uint64)
+    return _min_by_group((hashes[:, None] * a + b) % MINHASH_PRIME, ids)
+
+def _lsh_shape(num_perm, similarity):
+    # (bands, rows) whose LSH threshold (1/b)^(1/r) is closest below the target; candidates are verified anyway.
+    shapes = [(b, num_perm // b) for b in range(1, num_perm + 1) if num_perm % b == 0]
+    below = [s for s in shapes if (1 / s[0]) ** (1 / s[1]) <= similarity]
+    return max(below, key=lambda s: (1 / s[0]) ** (1 / s[1])) if below else shapes[-1]
+
+def near_duplicate_groups(signatures, similarity, shingles_of):
+    """
+    Returns a group id per signature row. Rows sharing an LSH band bucket join a group when the Jaccard
+    similarity of their shingle sets (shingles_of(row)) with the group's representative (its first row)
+    is at least `similarity`. Groups only grow one row at a time and never merge with each other, so a
+    chain of near matches cannot pull unrelated names into one group.
+    """
+    parent = list(range(len(signatures)))
+    size = [1] * len(signatures)
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+    def join(i, other):
+        # True once i and other share a group (or may not: both already belong to larger groups).
+        root_i, root_other = find(i), find(other)
+        if root_i == root_other:
+            return True
+        if size[root_i] > 1 and size[root_other] > 1:
+            return False
+        if size[root_i] > 1:
+            root_i, root_other = root_other, root_i
+        a, b = shingles_of(root_i), shingles_of(root_other)
+        if len(a & b) / len(a | b) < similarity:
+            return False
+        parent[root_i] = root_other
+        size[root_other] += 1
+        return True
+    bands, rows = _lsh_shape(signatures.shape[1], similarity)
+    for band in range(bands):
+        chunk = np.ascontiguousarray(signatures[:, band * rows:(band + 1) * rows])
+        _, buckets = np.unique(chunk.view(np.dtype((np.void, chunk.itemsize * rows))).ravel(), return_inverse=True)
+        order = np.argsort(buckets, kind="stable")
+        sorted_buckets = buckets[order]
+        starts = np.flatnonzero(np.r_[True, sorted_buckets[1:] != sorted_buckets[:-1]])
+        ends = np.r_[starts[1:], len(order)]
+        for s in np.flatnonzero(ends - starts > 1):
+            members = order[starts[s]:ends[s]].tolist()
+            for prev, i in zip(members, members[1:]):
+                for other in (members[0], prev):
+                    if join(i, other):
+                        break
+    return [find(i) for i in range(len(signatures))]
+
+class StageTimer:
+    """Call counts and latency percentiles per pipeline stage for one run."""
+    def __init__(self):
+        self.samples = defaultdict(list)
+
+    @contextlib.contextmanager
+    def time(self, stage):
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.samples[stage].append(time.perf_counter() - start)
+
+    def summary(self):
+        summary = {}
+        for stage, samples in self.samples.items():
+            ordered = sorted(samples)
+            pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+            summary[stage] = {"count": len(ordered), "total_s": round(sum(ordered), 6),
+                              "p50_ms": round(pick(0.50) * 1000, 3), "p95_ms": round(pick(0.95) * 1000, 3),
+                              "max_ms": round(ordered[-1] * 1000, 3)}
+        return summary
+
+class TermTable:
+    """
+    Per-run tokenization cache shared by clustering and scoring. Each distinct filename is normalized
+    once into a tuple of interned term strings, and fuzzy term/keyword match scores are memoized.
+    """
+    def __init__(self, max_matches=None):
+        self._names = {}
+        self._matches = {}
+        self.max_matches = max_matches  # Memoized match scores kept before the cache is cleared; None: no bound.
+
+    def __len__(self):
+        return len(self._names)
+
+    def split(self, name):
+        terms = self._names.get(name)
+        if terms is None:
+            terms = self._names[name] = tuple(sys.intern(term) for term in normalize(name))
+        return terms
+
+    def cluster_terms(self, cluster):
+        return [term for _, filename in cluster for term in self.split(filename)]
+
+    def match_score(self, term, kw):
+        key = (term, kw)
+        score = self._matches.get(key)
+        if score is None:
+            if self.max_matches is not None and len(self._matches) >= self.max_matches:
+                self._matches.clear()
+            score = self._matches[key] = term_match_score(term, kw)
+        return score
+
+    def clear_matches(self):
+        self._matches.clear()
+
+def cluster_files(files, threshold=1, similarity=1.0, terms=None):
+    """
+    Groups files into naming families; every file ends up in exactly one cluster.
+    Names with the same long terms always share a cluster. With similarity < 1, a family also joins a
+    near-match group when its term trigrams have a Jaccard similarity of at least `similarity` with the
+    group's first family (MinHash + LSH).
+    Clusters smaller than threshold are split back into single-file clusters.
+    Pass the run's TermTable as terms to reuse its normalized filenames.
+    """
+    terms = terms if terms is not None else TermTable()
+    exact = defaultdict(list)
+    clusters = {}
     for filepath, filename in files:
-        terms = normalize(filename)
-        key = tuple(sorted(t for t in terms if len(t) > 3))
-        clusters[key].append((filepath, filename))
-    # Adjust threshold: clusters with 3 or more files, or singletons.
-    return {k: v for k, v in clusters.items() if len(v) >= 3 or len(v) == 1}
+        terms_of_name = terms.split(filename)
+        key = tuple(sorted(t for t in terms_of_name if len(t) > 3))
+        if key:
+            exact[key].append((filepath, filename))
+        else:
+            clusters[("", filepath)] = [(filepath, filename)]  # Nothing to group on.
+    keys = list(exact)
+    if similarity < 1 and len(keys) > 1:
+        # A name's signature is the element-wise min of its terms' signatures, so each distinct term is hashed once.
+        term_ids = {}
+        key_terms = [[term_ids.setdefault(t, len(term_ids)) for t in key] for key in keys]
+        term_shingles = [char_trigrams(f" {t} ") for t in term_ids]
+        signatures = _min_by_group(minhash_signatures(term_shingles), key_terms)
+        roots = near_duplicate_groups(signatures, similarity,
+                                      lambda i: set().union(*(term_shingles[t] for t in key_terms[i])))
+    else:
+        roots = range(len(keys))
+    families = defaultdict(list)
+    for key, root in zip(keys, roots):
+        families[keys[root]].extend(exact[key])
+    for key, members in families.items():
+        if len(members) >= threshold:
+            clusters[key] = members
+        else:
+            for filepath, filename in members:
+                clusters[("", filepath)] = [(filepath, filename)]
+    return clusters
 
 def compute_file_hash(filepath, algorithm="md5"):
     hash_func = hashlib.new(algorithm)
@@ -67,8 +239,10 @@ def compute_file_hash(filepath, algorithm="md5"):
         logging.error(f"Error computing hash for {filepath}: {e}")
         return None
 
-def is_duplicate(filepath, hash_cache):
-    file_hash = compute_file_hash(filepath)
+def is_duplicate(filepath, hash_cache, file_hash=None):
+    # file_hash may be computed ahead of time (see IOScheduler); it is recomputed when missing.
+    if file_hash is None:
+        file_hash = compute_file_hash(filepath)
     if file_hash is None:
         return False, None
     if file_hash in hash_cache:
@@ -77,6 +251,54 @@ def is_duplicate(filepath, hash_cache):
         hash_cache[file_hash] = filepath
         return False, None
 
+def char_trigrams(term):
+    if len(term) < 3:
+        return {term} if term else set()
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+class KeywordIndex:
+    """Token and character-trigram postings from association keywords to folders."""
+    def __init__(self, associations=None, max_posting_fraction=0.2):
+        self.max_posting_fraction = max_posting_fraction
+        self.token_postings = defaultdict(set)
+        self.trigram_postings = defaultdict(set)
+        self.num_folders = 0
+        self.positions = {}  # folder -> position in associations; breaks ties the way a full scan would.
+        if associations:
+            self.build(associations)
+
+    def build(self, associations):
+        self.token_postings.clear()
+        self.trigram_postings.clear()
+        self.num_folders = len(associations)
+        self.positions = {folder: i for i, folder in enumerate(associations)}
+        for folder, info in associations.items():
+            for kw in info.get("associations", []):
+                kw = str(kw).lower()
+                for token in set(normalize(kw)) | {kw}:
+                    self.token_postings[token].add(folder)
+                for gram in char_trigrams(kw):
+                    self.trigram_postings[gram].add(folder)
+        return self
+
+    def candidates(self, terms, top_k=50):
+        # Very common trigrams ("ing", "the") match most folders and carry no signal.
+        max_postings = max(top_k, int(self.num_folders * self.max_posting_fraction))
+        hits = defaultdict(int)
+        for term in set(terms):
+            for folder in self.token_postings.get(term, ()):
+                hits[folder] += 3
+            for gram in char_trigrams(term):
+                postings = self.trigram_postings.get(gram, ())
+                if len(postings) > max_postings:
+                    continue
+                for folder in postings:
+                    hits[folder] += 1
+        # Ordered by associations position, not set iteration order, so ties do not depend on hashing.
+        position = self.positions.get
+        top = heapq.nlargest(top_k, hits, key=lambda folder: (hits[folder], -position(folder, 0)))
+        return sorted(top, key=position)
+
 if __name__ == "__main__":
     logging.info("Normalization test: " + str(normalize("CLASS_XII_Chemistry_Ch_14-Polymerization.pdf")))
     file_terms = normalize("Maths_Stand.pdf")